@@ -2,34 +2,56 @@ import streamlit as st
 # Must come first
 st.set_page_config(page_title="🏠 Beer Diary", page_icon="🍺", layout="wide")
 
+import os
+import importlib
+import threading
+
 from theme_utils import get_app_theme
+from images import gallery_images
+from instrumentation import begin_rerun, end_rerun
 
+# Imported in the background once the welcome page is up, so the first visit
+# to any other page after a restart doesn't wait on them
+WARM_UP_MODULES = ["pandas", "plotly.express", "pydeck", "pyarrow", "catalog", "catalog_cache",
+                   "style_stats", "breweries", "analytics", "recommender"]
+WARM_UP = os.environ.get("BEER_DIARY_WARM_UP", "1") != "0"
 
-from PIL import Image
-from pathlib import Path
-import os
+def preload_modules():
+    for name in WARM_UP_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"⚠️ Warm-up import of {name} failed: {e}")
+
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    # Once per process; a daemon thread never holds up shutdown
+    thread = threading.Thread(target=preload_modules, name="beer-diary-warm-up", daemon=True)
+    thread.start()
+    return thread
 
 # Apply theme
 base, text_color, bg_color, card_color, plotly_template = get_app_theme()
 
 st.markdown(f"<style>body {{ background-color: {bg_color}; color: {text_color}; }}</style>", unsafe_allow_html=True)
 
+# Hidden diagnostics view, opened with /?diagnostics
+if "diagnostics" in st.query_params:
+    from diagnostics import show_diagnostics
+    show_diagnostics()
+    st.stop()
+
+begin_rerun("Home")
 
 # UI content
 st.markdown(f"<h1>🏠 Welcome to Beer Diary</h1>", unsafe_allow_html=True)
 st.markdown(f"<p>Welcome to your personalized craft beer tasting journal! Use the navigation panel to explore beers, styles, breweries, and keep track of your tasting notes. This app is designed to make your craft beer discovery more enjoyable, organized, and fun.</p>", unsafe_allow_html=True)
 
-# Load and show images from static/images folder
-image_folder = os.path.join("static", "images")
-image_files = [os.path.join(image_folder, f) for f in os.listdir(image_folder) if f.endswith((".png", ".jpg", ".jpeg"))]
-image_files.sort()  # Optional, ensures ordered display
-
-# Show images in 2x2 grid
-cols = st.columns(len(image_files))
-for i, path in enumerate(image_files):
-    with open(path, "rb") as img_file:
-        image = Image.open(img_file)
-        cols[i].image(image, width=250)  # Smaller fixed width
+# Show thumbnails of the static/images folder, served from the image cache
+images = gallery_images()
+cols = st.columns(len(images))
+for i, image in enumerate(images):
+    cols[i].image(image, width=250)  # Smaller fixed width
 
 
 st.markdown(f"""
@@ -39,8 +61,14 @@ st.markdown(f"""
 - 📊 Style Explorer
 - 🗺️ Brewery Locator
 - 📜 My Favorite Breweries
+- 📈 Tasting Analytics
 """, unsafe_allow_html=True)
 
 # Instructions
 st.sidebar.markdown("### 🧭 Navigation")
-st.sidebar.info("Use the sidebar to explore beers, log tastings, and find breweries.")
\ No newline at end of file
+st.sidebar.info("Use the sidebar to explore beers, log tastings, and find breweries.")
+
+if WARM_UP:
+    start_warm_up()
+
+end_rerun()
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+from storage import get_storage
+from catalog import fetch_style_names, fetch_beer_labels
+from instrumentation import timed
+
+SCORE_COLUMNS = ["look", "smell", "taste", "feel", "overall"]
+SCORE_DIMENSIONS = SCORE_COLUMNS + ["average_rating"]
+ROLLING_WINDOW = 5          # entries in the rolling average
+RECENT_ENTRIES = 60         # entries the rolling chart looks back over
+TREND_MONTHS = 3            # months in the rolling ABV/rating trend
+PROFILE_PRIOR = 2           # pseudo-entries pulling small styles toward the user's mean
+
+# ------------------------------
+# Running sums
+# ------------------------------
+# Three rollup tables are kept current by triggers on tasting_journal: sums per
+# (user, style_id), per (user, month) and score counts per (user, dimension,
+# half-point score). Each write adjusts a handful of rows, so nothing here
+# rereads a user's history. The statements run unchanged as SQLite trigger
+# bodies and inside the Postgres trigger function in storage_postgres.py.
+def rollup_statements(row, sign):
+    user = f"COALESCE({row}.user_id, '')"
+    has_abv = f"CASE WHEN {row}.abv IS NULL THEN 0 ELSE 1 END"
+    style_sums = ", ".join(f"{sign} * COALESCE({row}.{column}, 0)" for column in SCORE_COLUMNS)
+    style_updates = ", ".join(
+        f"{column}_sum = journal_style_stats.{column}_sum + excluded.{column}_sum" for column in SCORE_COLUMNS
+    )
+    dimensions = " UNION ALL ".join(f"SELECT '{column}' AS dimension, {row}.{column} AS score" for column in SCORE_DIMENSIONS)
+    return [
+        f'''
+        INSERT INTO journal_style_stats (
+            user_id, style_id, entry_count, {", ".join(f"{column}_sum" for column in SCORE_COLUMNS)},
+            rating_sum, rating_sq_sum, abv_sum, abv_count
+        ) VALUES (
+            {user}, {row}.style_id, {sign}, {style_sums},
+            {sign} * COALESCE({row}.average_rating, 0), {sign} * COALESCE({row}.average_rating, 0) * COALESCE({row}.average_rating, 0),
+            {sign} * COALESCE({row}.abv, 0), {sign} * {has_abv}
+        )
+        ON CONFLICT (user_id, style_id) DO UPDATE SET
+            entry_count = journal_style_stats.entry_count + excluded.entry_count, {style_updates},
+            rating_sum = journal_style_stats.rating_sum + excluded.rating_sum,
+            rating_sq_sum = journal_style_stats.rating_sq_sum + excluded.rating_sq_sum,
+            abv_sum = journal_style_stats.abv_sum + excluded.abv_sum,
+            abv_count = journal_style_stats.abv_count + excluded.abv_count
+        ''',
+        f'''
+        INSERT INTO journal_monthly_stats (user_id, month, entry_count, rating_sum, abv_sum, abv_count)
+        VALUES (
+            {user}, COALESCE(substr({row}.tasted_on, 1, 7), ''), {sign},
+            {sign} * COALESCE({row}.average_rating, 0), {sign} * COALESCE({row}.abv, 0), {sign} * {has_abv}
+        )
+        ON CONFLICT (user_id, month) DO UPDATE SET
+            entry_count = journal_monthly_stats.entry_count + excluded.entry_count,
+            rating_sum = journal_monthly_stats.rating_sum + excluded.rating_sum,
+            abv_sum = journal_monthly_stats.abv_sum + excluded.abv_sum,
+            abv_count = journal_monthly_stats.abv_count + excluded.abv_count
+        ''',
+        f'''
+        INSERT INTO journal_score_counts (user_id, dimension, score, entry_count)
+        SELECT {user}, dimension, ROUND(score * 2) / 2.0, {sign}
+        FROM ({dimensions}) AS scores
+        WHERE score IS NOT NULL
+        ON CONFLICT (user_id, dimension, score) DO UPDATE SET
+            entry_count = journal_score_counts.entry_count + excluded.entry_count
+        ''',
+    ]
+
+def create_journal_rollup_triggers(conn):
+    events = {
+        "insert": ("INSERT", [("new", 1)]),
+        "update": ("UPDATE", [("old", -1), ("new", 1)]),
+        "delete": ("DELETE", [("old", -1)]),
+    }
+    for name, (event, changes) in events.items():
+        body = ";\n".join(statement for row, sign in changes for statement in rollup_statements(row, sign))
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS tasting_journal_rollup_{name} AFTER {event} ON tasting_journal BEGIN
+            {body};
+            END
+        ''')
+
+# ------------------------------
+# Dashboard queries
+# ------------------------------
+# Every query reads the rollups or a fixed-size slice of the newest entries,
+# so their cost follows the number of styles and months, not journal length.
+@timed(kind="loader")
+def load_style_profile(user_id, prior=PROFILE_PRIOR):
+    columns, rows = get_storage().rows(
+        "SELECT * FROM journal_style_stats WHERE user_id = ? AND entry_count > 0", (user_id,)
+    )
+    stats = pd.DataFrame(rows, columns=columns)
+    if stats.empty:
+        return stats
+    counts = stats["entry_count"].to_numpy(dtype=float)
+    for column in SCORE_COLUMNS:
+        stats[column] = stats[f"{column}_sum"].to_numpy() / counts
+    stats["average_rating"] = stats["rating_sum"].to_numpy() / counts
+    variance = stats["rating_sq_sum"].to_numpy() / counts - stats["average_rating"].to_numpy() ** 2
+    stats["rating_std"] = np.sqrt(np.clip(variance, 0, None))
+    abv_counts = stats["abv_count"].to_numpy(dtype=float)
+    stats["abv"] = np.divide(stats["abv_sum"].to_numpy(), abv_counts, out=np.full(len(stats), np.nan), where=abv_counts > 0)
+    # Shrink styles with few tastings toward the user's overall mean so one
+    # lucky beer doesn't top the profile
+    user_mean = stats["rating_sum"].sum() / counts.sum()
+    stats["preference"] = (stats["rating_sum"].to_numpy() + prior * user_mean) / (counts + prior)
+    # Style names come from the local catalog, wherever the journal lives
+    stats["style"] = stats["style_id"].map(fetch_style_names()).fillna("Unknown")
+    columns = ["style", "entry_count", *SCORE_COLUMNS, "average_rating", "rating_std", "abv", "preference"]
+    return stats[columns].sort_values("preference", ascending=False, ignore_index=True)
+
+def summarize_profile(profile):
+    if profile.empty:
+        return {"entries": 0, "styles": 0, "average_rating": 0.0, "top_style": None}
+    entries = int(profile["entry_count"].sum())
+    return {
+        "entries": entries,
+        "styles": len(profile),
+        "average_rating": float((profile["average_rating"] * profile["entry_count"]).sum() / entries),
+        "top_style": profile["style"].iloc[0],
+    }
+
+@timed(kind="loader")
+def load_monthly_trends(user_id, window=TREND_MONTHS):
+    columns, rows = get_storage().rows(f'''
+        SELECT month, entry_count,
+               rating_sum / entry_count AS average_rating,
+               CASE WHEN abv_count > 0 THEN abv_sum / abv_count END AS average_abv,
+               SUM(rating_sum) OVER recent / SUM(entry_count) OVER recent AS rolling_rating,
+               SUM(abv_sum) OVER recent / NULLIF(SUM(abv_count) OVER recent, 0) AS rolling_abv
+        FROM journal_monthly_stats
+        WHERE user_id = ? AND entry_count > 0 AND month != ''
+        WINDOW recent AS (ORDER BY month ROWS BETWEEN {window - 1} PRECEDING AND CURRENT ROW)
+        ORDER BY month
+    ''', (user_id,))
+    return pd.DataFrame(rows, columns=columns)
+
+@timed(kind="loader")
+def load_recent_rolling(user_id, entries=RECENT_ENTRIES, window=ROLLING_WINDOW):
+    # The newest entries come off idx_tasting_journal_user_tasted_on, then the
+    # rolling mean runs over just that slice
+    columns, rows = get_storage().rows(f'''
+        SELECT tasted_on, beer_id, average_rating,
+               AVG(average_rating) OVER (
+                   ORDER BY tasted_on, journal_id ROWS BETWEEN {window - 1} PRECEDING AND CURRENT ROW
+               ) AS rolling_rating
+        FROM (
+            SELECT journal_id, tasted_on, beer_id, average_rating
+            FROM tasting_journal
+            WHERE user_id = ?
+            ORDER BY tasted_on DESC, journal_id DESC
+            LIMIT ?
+        ) AS recent
+        ORDER BY tasted_on, journal_id
+    ''', (user_id, entries))
+    recent = pd.DataFrame(rows, columns=columns)
+    labels = fetch_beer_labels(recent["beer_id"].unique())
+    recent["beer_name"] = recent["beer_id"].map(lambda beer_id: labels.get(beer_id, ("",))[0])
+    return recent
+
+@timed(kind="loader")
+def load_score_distribution(user_id):
+    columns, rows = get_storage().rows(
+        "SELECT dimension, score, entry_count FROM journal_score_counts WHERE user_id = ? AND entry_count > 0",
+        (user_id,),
+    )
+    counts = pd.DataFrame(rows, columns=columns)
+    return counts.sort_values(["dimension", "score"], ignore_index=True)
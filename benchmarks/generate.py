@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import argparse
+
+import pandas as pd
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+USER_ID = "guest"       # the pages read the guest user's journal and favorites
+STATES = ["Oregon", "California", "Colorado", "Michigan", "New York", "Texas", "Vermont", "Washington"]
+BREWERY_TYPES = ["micro", "brewpub", "regional", "nano", "large", "planning", "contract"]
+FLAVOR_WORDS = ["malty", "hoppy", "roasted", "citrus", "caramel", "chocolate", "coffee", "piney",
+                "tropical", "biscuit", "toffee", "floral", "resinous", "bready", "smoky", "tart"]
+
+# ------------------------------
+# Row generators
+# ------------------------------
+# Rows are produced inside SQLite by recursive CTEs, so generating millions of
+# rows never materializes them in Python. Each row carries one random number
+# r that the lookups slice different bits from; the sequence number keeps
+# every unique key unique.
+def sequence(count):
+    return f"""WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i + 1 < {int(count)}),
+               rows AS (SELECT i, abs(random()) AS r FROM seq)"""
+
+def pick(table, count, shift=0):
+    # Correlated on r, so SQLite evaluates it per row rather than once
+    return f"(SELECT value FROM {table} WHERE id = (r >> {shift}) % {count})"
+
+def generate_catalog(conn, beers, styles):
+    conn.executemany("INSERT INTO styles (style_id, style) VALUES (?, ?)", enumerate(styles, start=1))
+    conn.execute("CREATE TEMP TABLE bench_words (id INTEGER PRIMARY KEY, value TEXT)")
+    conn.executemany("INSERT INTO bench_words VALUES (?, ?)", enumerate(FLAVOR_WORDS))
+    breweries = max(beers // 20, 1)
+    words = len(FLAVOR_WORDS)
+    flavors = ", ".join("abs(random()) % 150" for _ in range(11))
+    conn.execute(f"""
+        {sequence(breweries)}
+        INSERT INTO catalog_breweries (brewery_id, brewery_name)
+        SELECT i + 1, 'Synthetic Brewery ' || i FROM rows
+    """)
+    conn.execute(f"""
+        {sequence(beers)}
+        INSERT INTO beers_catalog (
+            beer_id, beer_name, brewery_id, style_id, abv, ibu, description, ave_rating,
+            astringency, body, alcohol, bitter, sweet, sour, salty, fruits, hoppy, spices, malty
+        )
+        SELECT i + 1, 'Synthetic Beer ' || i, 1 + i % {breweries}, 1 + r % {len(styles)},
+               round(3 + (abs(random()) % 900) / 100.0, 1), 10 + abs(random()) % 90,
+               'A ' || {pick('bench_words', words, 8)} || ' beer with ' || {pick('bench_words', words, 16)}
+                   || ' and ' || {pick('bench_words', words, 24)} || ' notes.',
+               round(3 + (abs(random()) % 200) / 100.0, 2), {flavors}
+        FROM rows
+    """)
+
+def generate_journal(conn, entries, beers):
+    # (beer, day) pairs never repeat
+    conn.execute(f"""
+        {sequence(entries)}
+        INSERT INTO tasting_journal (
+            user_id, beer_id, style_id, abv, look, smell, taste, feel, overall,
+            average_rating, user_notes, tasted_on
+        )
+        SELECT '{USER_ID}', beer_id, style_id, abv, look, smell, taste, feel, overall,
+               (look + smell + taste + feel + overall) / 5, 'Synthetic tasting note ' || i,
+               date('2015-01-01', '+' || (i / {beers} + i % {beers} % 3650) || ' days')
+        FROM (
+            SELECT i, (abs(random()) % 11) / 2.0 AS look, (abs(random()) % 11) / 2.0 AS smell,
+                   (abs(random()) % 11) / 2.0 AS taste, (abs(random()) % 11) / 2.0 AS feel,
+                   (abs(random()) % 11) / 2.0 AS overall
+            FROM rows
+        )
+        JOIN beers_catalog b ON b.beer_id = 1 + i % {beers}
+        WHERE true
+        ON CONFLICT DO NOTHING
+    """)
+
+def generate_breweries(conn, breweries, per_page=200):
+    conn.execute("CREATE TEMP TABLE bench_states (id INTEGER PRIMARY KEY, value TEXT)")
+    conn.executemany("INSERT INTO bench_states VALUES (?, ?)", enumerate(STATES))
+    conn.execute("CREATE TEMP TABLE bench_types (id INTEGER PRIMARY KEY, value TEXT)")
+    conn.executemany("INSERT INTO bench_types VALUES (?, ?)", enumerate(BREWERY_TYPES))
+    now = time.time()
+    conn.execute(f"""
+        {sequence(breweries)}
+        INSERT INTO breweries (
+            id, name, brewery_type, city, state, country, latitude, longitude, website_url, sync_page, synced_at
+        )
+        SELECT 'synthetic-' || i, 'Synthetic Brewery ' || i, {pick('bench_types', len(BREWERY_TYPES))},
+               'City ' || (i % 500), {pick('bench_states', len(STATES), 8)}, 'United States',
+               25 + (abs(random()) % 2400) / 100.0, -124 + (abs(random()) % 5700) / 100.0,
+               'https://example.com/' || i, 1 + i / {per_page}, {now}
+        FROM rows
+    """)
+    # Marks every page fresh so the locator doesn't start a network sync
+    conn.execute(f"""
+        {sequence(-(-breweries // per_page))}
+        INSERT INTO brewery_sync_pages (page, per_page, etag, fetched_at)
+        SELECT i + 1, {per_page}, NULL, {now} FROM rows
+    """)
+
+def generate_favorites(conn, favorites):
+    conn.execute(f"""
+        {sequence(favorites)}
+        INSERT INTO favorite_breweries (brewery_name, city, state, country, website_url, user_id)
+        SELECT 'Synthetic Brewery ' || i, 'City ' || (i % 500), 'Oregon', 'United States',
+               'https://example.com/' || i, '{USER_ID}'
+        FROM rows
+    """)
+
+# ------------------------------
+# Database
+# ------------------------------
+def generate_database(db_path, beers, journal, favorites, breweries, cache_dir):
+    # Imported here: both modules read their paths from the environment
+    os.environ["BEER_DIARY_DB"] = db_path
+    os.environ["BEER_DIARY_CACHE_DIR"] = cache_dir
+    from db_utils import transaction, get_meta, set_meta
+    from migrations import apply_migrations
+    from style_stats import refresh_style_stats
+    from catalog_cache import export_catalog
+    from recommender import build_flavor_index
+    from catalog_ingest import file_sha256, CSV_PATH
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    apply_migrations(db_path)
+    styles = sorted(pd.read_csv(CSV_PATH, usecols=["Style"])["Style"].dropna().unique())
+
+    steps = [
+        ("catalog", lambda conn: generate_catalog(conn, beers, styles)),
+        ("journal", lambda conn: generate_journal(conn, journal, beers)),
+        ("breweries", lambda conn: generate_breweries(conn, breweries)),
+        ("favorites", lambda conn: generate_favorites(conn, favorites)),
+        ("style stats", refresh_style_stats),
+    ]
+    for name, step in steps:
+        started = time.time()
+        with transaction(db_path) as conn:
+            step(conn)
+        print(f"  {name}: {time.time() - started:.1f}s")
+
+    with transaction(db_path) as conn:
+        cursor = conn.cursor()
+        # Recorded so running init_db against this file doesn't load the real CSV into it
+        set_meta(cursor, 'csv_sha256', file_sha256(CSV_PATH))
+        set_meta(cursor, 'catalog_version', int(get_meta(cursor, 'catalog_version', 0)) + 1)
+        version = int(get_meta(cursor, 'catalog_version'))
+        conn.execute("ANALYZE")
+    with transaction(db_path) as conn:
+        export_catalog(conn, version, db_path)
+        build_flavor_index(conn, version, db_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Beer Diary database for benchmarks.")
+    parser.add_argument("--scale", choices=SCALES, default="10k", help="rows per table unless overridden")
+    parser.add_argument("--db", help="output database (default .bench/<scale>.db)")
+    parser.add_argument("--beers", type=int)
+    parser.add_argument("--journal", type=int)
+    parser.add_argument("--favorites", type=int)
+    parser.add_argument("--breweries", type=int)
+    args = parser.parse_args(argv)
+
+    rows = SCALES[args.scale]
+    db_path = args.db or os.path.join(".bench", f"{args.scale}.db")
+    print(f"🛠️ Generating {db_path}")
+    generate_database(
+        db_path,
+        beers=args.beers or rows,
+        journal=args.journal or rows,
+        favorites=args.favorites or rows,
+        breweries=args.breweries or rows,
+        cache_dir=os.path.join(os.path.dirname(db_path) or ".", f"{os.path.basename(db_path)}.cache"),
+    )
+    print(f"✅ Wrote {db_path}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import subprocess
+
+# Import time a page may add on the first run after a worker restart, on top
+# of Streamlit itself. Keyed by page file prefix, like the benchmark scenarios.
+IMPORT_BUDGETS_MS = {
+    "Home.py": 250,     # st.image brings in numpy
+    "1_": 700,
+    "2_": 100,
+    "3_": 800,
+    "4_": 1000,
+    "5_": 100,
+    "6_": 700,
+}
+# Heavy modules a page must not pull in before its first paint
+MUST_NOT_IMPORT = {
+    "Home.py": ["pandas", "pyarrow", "pydeck", "requests"],
+    "2_": ["pandas", "pyarrow", "pydeck"],
+}
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "plotly", "pydeck", "PIL", "requests"]
+MARKER = "--- page import start ---"
+WARM_UP_SCRIPT = "import streamlit as st\nst.set_page_config(page_icon='🍺')\nst.write('')\n"
+
+def lookup(table, path, default=None):
+    name = os.path.basename(path)
+    return next((value for prefix, value in table.items() if name.startswith(prefix)), default)
+
+# ------------------------------
+# Child process
+# ------------------------------
+def run_child(path):
+    # Home.py's background warm-up would be counted against Home
+    os.environ["BEER_DIARY_WARM_UP"] = "0"
+    from streamlit.testing.v1 import AppTest
+
+    # Streamlit's own lazy imports happen on a throwaway script first
+    AppTest.from_string(WARM_UP_SCRIPT).run()
+    print(MARKER, file=sys.stderr, flush=True)
+    started = time.perf_counter()
+    at = AppTest.from_file(os.path.abspath(path), default_timeout=300).run()
+    result = {
+        "first_run_ms": (time.perf_counter() - started) * 1000,
+        "heavy": [name for name in HEAVY_MODULES if name in sys.modules],
+        "exception": at.exception[0].message if at.exception else None,
+    }
+    print(json.dumps(result))
+
+# ------------------------------
+# Parent process
+# ------------------------------
+def import_time_ms(stderr):
+    # -X importtime writes "import time: self | cumulative | name"; top-level
+    # imports are the unindented names after the marker
+    total_us = 0
+    for line in stderr.split(MARKER, 1)[-1].splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    return total_us / 1000
+
+def measure_page(path):
+    # A fresh interpreter per page: that's what a worker restart costs
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "benchmarks.imports", "--child", path],
+        capture_output=True, text=True, check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["import_ms"] = import_time_ms(completed.stderr)
+    return result
+
+def check_budget(path, result, scale=1.0):
+    problems = []
+    budget = lookup(IMPORT_BUDGETS_MS, path)
+    if budget is not None and result["import_ms"] > budget * scale:
+        problems.append(f"imports took {result['import_ms']:.0f}ms, budget {budget * scale:.0f}ms")
+    for name in lookup(MUST_NOT_IMPORT, path, []):
+        if name in result["heavy"]:
+            problems.append(f"imported {name}")
+    if result["exception"]:
+        problems.append(f"raised {result['exception']}")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time per page.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--pages", default="", help="comma-separated substrings of page files to run")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget, for slower machines")
+    args = parser.parse_args(argv)
+    if args.child:
+        run_child(args.child)
+        return 0
+
+    pages = ["Home.py"] + sorted(glob.glob(os.path.join("pages", "*.py")))
+    wanted = [p for p in args.pages.split(",") if p]
+    failures = 0
+    print(f"{'page':<40} {'imports':>9} {'first run':>10}  heavy modules")
+    for path in pages:
+        if wanted and not any(w in path for w in wanted):
+            continue
+        result = measure_page(path)
+        print(f"{path:<40} {result['import_ms']:>7.0f}ms {result['first_run_ms']:>8.0f}ms  {', '.join(result['heavy'])}")
+        for problem in check_budget(path, result, args.scale):
+            failures += 1
+            print(f"❌ {path}: {problem}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
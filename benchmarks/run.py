@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import glob
+import time
+import platform
+import argparse
+import statistics
+import tracemalloc
+import subprocess
+
+from benchmarks.generate import SCALES
+from instrumentation import TimedConnection, reset_sql, sql_totals
+
+BASELINE_PATH = os.path.join("benchmarks", "baseline.json")
+TOLERANCE = 0.25        # allowed slowdown over the baseline median
+MIN_DELTA_MS = 5.0      # ignore regressions smaller than this
+PAGE_TIMEOUT = 300
+
+# ------------------------------
+# Measurements
+# ------------------------------
+def measure(action, repeats):
+    # Returns latency and SQL time medians in ms over `repeats` calls
+    latencies, sql_times, statements = [], [], []
+    for _ in range(repeats):
+        reset_sql()
+        started = time.perf_counter()
+        action()
+        latencies.append((time.perf_counter() - started) * 1000)
+        sql_times.append(sql_totals["seconds"] * 1000)
+        statements.append(sql_totals["statements"])
+    return {
+        "median_ms": statistics.median(latencies),
+        "max_ms": max(latencies),
+        "sql_ms": statistics.median(sql_times),
+        "statements": int(statistics.median(statements)),
+    }
+
+def peak_memory(action):
+    # Separate pass: tracemalloc slows everything it watches
+    tracemalloc.start()
+    try:
+        action()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+def check(at):
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+# ------------------------------
+# Scenarios
+# ------------------------------
+def labelled(widgets, label):
+    # The sidebar theme toggle comes first on every page, so widgets are
+    # picked by label rather than position
+    return next(widget for widget in widgets if widget.label == label)
+
+# Interactions rerun after the page's first render, keyed by page file prefix
+SCENARIOS = {
+    "1_": [
+        ("search", lambda at: at.text_input[0].set_value("chocolate malty").run()),
+        ("next page", lambda at: at.number_input(key="explorer_page").set_value(2).run()),
+    ],
+    "2_": [
+        ("older page", lambda at: [b for b in at.button if "Older" in b.label][0].click().run()),
+    ],
+    "3_": [
+        ("pie chart", lambda at: labelled(at.radio, "Choose Chart Type:").set_value("Pie Chart").run()),
+    ],
+    "4_": [
+        ("near a point", lambda at: labelled(at.sidebar.radio, "Show breweries").set_value("Near a point").run()),
+    ],
+    "5_": [
+        ("search", lambda at: at.text_input[0].set_value("Brewery 12").run()),
+    ],
+}
+
+def page_scenarios(path):
+    name = os.path.basename(path)
+    return next((scenarios for prefix, scenarios in SCENARIOS.items() if name.startswith(prefix)), [])
+
+def bench_page(path, repeats):
+    from streamlit.testing.v1 import AppTest
+
+    name = os.path.basename(path)
+    results = {}
+    at = AppTest.from_file(os.path.abspath(path), default_timeout=PAGE_TIMEOUT)
+    results[f"{name} | first run"] = measure(lambda: check(at.run()), 1)
+    results[f"{name} | rerun"] = measure(lambda: check(at.run()), repeats)
+    results[f"{name} | rerun"]["peak_mb"] = peak_memory(lambda: check(at.run()))
+    for scenario, action in page_scenarios(path):
+        fresh = check(AppTest.from_file(os.path.abspath(path), default_timeout=PAGE_TIMEOUT).run())
+        # An interaction changes session state, so it is timed once on a fresh session
+        results[f"{name} | {scenario}"] = measure(lambda: check(action(fresh)), 1)
+        results[f"{name} | {scenario}"]["peak_mb"] = peak_memory(lambda: check(fresh.run()))
+    return results
+
+def hot_paths():
+    # Module-level functions behind each page, timed without Streamlit
+    import catalog, style_stats, catalog_cache, journal, breweries, analytics, recommender
+    from db_utils import connection, COUNT_FAVORITES, SELECT_FAVORITES
+
+    styles, abv_min, abv_max = catalog.get_filter_options()
+    narrowed = (abv_min + 1, abv_max - 1)
+
+    def load_favorites():
+        with connection() as conn:
+            conn.execute(COUNT_FAVORITES, ("guest", "%")).fetchone()
+            return conn.execute(SELECT_FAVORITES, ("guest", "%", 5, 0)).fetchall()
+
+    return [
+        ("catalog.count_beers search", lambda: catalog.count_beers(styles[:15], (abv_min, abv_max), "chocolate")),
+        ("catalog.fetch_beer_page", lambda: catalog.fetch_beer_page(styles[:15], (abv_min, abv_max), "", 25, 0)),
+        ("catalog_cache.filter_catalog", lambda: catalog_cache.filter_catalog(
+            catalog_cache.load_catalog_table(), styles[:15], narrowed, catalog.LIST_COLUMNS)),
+        ("style_stats.load_style_stats full", lambda: style_stats.load_style_stats(styles[:15], (abv_min, abv_max))),
+        ("style_stats.load_style_stats narrowed", lambda: style_stats.load_style_stats(styles[:15], narrowed)),
+        ("journal.fetch_journal_page", lambda: journal.fetch_journal_page("guest", None, 20)),
+        ("analytics.load_style_profile", lambda: analytics.load_style_profile("guest")),
+        ("analytics.load_monthly_trends", lambda: analytics.load_monthly_trends("guest")),
+        ("recommender.recommend_for_user", lambda: recommender.recommend_for_user("guest")),
+        ("breweries.count_breweries viewport", lambda: breweries.count_breweries(
+            bbox=breweries.viewport_bounds(39.5, -98.35, 4))),
+        ("breweries.cluster_breweries", lambda: breweries.cluster_breweries(
+            breweries.cluster_cell_degrees(4), bbox=breweries.viewport_bounds(39.5, -98.35, 4))),
+        ("load favorites", load_favorites),
+    ]
+
+# ------------------------------
+# Baseline comparison
+# ------------------------------
+def compare(results, baseline, tolerance=TOLERANCE):
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        limit = base["median_ms"] * (1 + tolerance)
+        if result["median_ms"] > limit and result["median_ms"] - base["median_ms"] > MIN_DELTA_MS:
+            regressions.append((key, base["median_ms"], result["median_ms"]))
+    return regressions
+
+def print_results(results, baseline):
+    print(f"{'benchmark':<58} {'median':>9} {'max':>9} {'sql':>9} {'stmts':>6} {'peak MB':>8} {'vs base':>8}")
+    for key, r in results.items():
+        base = baseline.get(key)
+        change = f"{(r['median_ms'] / base['median_ms'] - 1) * 100:+.0f}%" if base and base["median_ms"] else ""
+        peak = f"{r['peak_mb']:.1f}" if "peak_mb" in r else ""
+        print(f"{key:<58} {r['median_ms']:>7.1f}ms {r['max_ms']:>7.1f}ms {r['sql_ms']:>7.1f}ms "
+              f"{r['statements']:>6} {peak:>8} {change:>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Beer Diary pages and hot paths.")
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--db", help="benchmark database (default .bench/<scale>.db, generated if missing)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--pages", default="", help="comma-separated substrings of page files to run")
+    parser.add_argument("--skip-pages", action="store_true", help="only time the hot paths")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    db_path = args.db or os.path.join(".bench", f"{args.scale}.db")
+    if not os.path.exists(db_path):
+        # Own process, so no connection is pooled before the timing factory is set
+        subprocess.run([sys.executable, "-m", "benchmarks.generate", "--scale", args.scale, "--db", db_path], check=True)
+
+    # Must be set before any app module is imported
+    os.environ["BEER_DIARY_DB"] = db_path
+    os.environ["BEER_DIARY_CACHE_DIR"] = f"{db_path}.cache"
+    os.environ.setdefault("OPENBREWERYDB_URL", "http://127.0.0.1:9/v1")
+    # Background imports from Home.py would land inside other timings
+    os.environ["BEER_DIARY_WARM_UP"] = "0"
+    import db_utils
+    db_utils.CONNECTION_FACTORY = TimedConnection
+
+    results = {}
+    if not args.skip_pages:
+        pages = ["Home.py"] + sorted(glob.glob(os.path.join("pages", "*.py")))
+        wanted = [p for p in args.pages.split(",") if p]
+        for path in pages:
+            if wanted and not any(w in path for w in wanted):
+                continue
+            print(f"⏱️ {path}", file=sys.stderr)
+            results.update(bench_page(path, args.repeats))
+    for name, action in hot_paths():
+        action()    # warm caches and the page cache
+        results[f"hot path | {name}"] = measure(action, args.repeats)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get(os.path.basename(db_path), {})
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"db": db_path, "python": platform.python_version(), "results": results}, f, indent=2)
+    if args.save_baseline:
+        # One baseline per database file, so scales don't overwrite each other
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f)
+        stored[os.path.basename(db_path)] = results
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+        print(f"💾 Saved baseline to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for key, before, after in regressions:
+        print(f"❌ Regression: {key}: {before:.1f}ms -> {after:.1f}ms")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import math
+import numpy as np
+import pandas as pd
+
+from db_utils import connection
+from instrumentation import timed
+
+BREWERY_COLUMNS = ["id", "name", "city", "state", "country", "latitude", "longitude", "website_url", "brewery_type"]
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+MAX_MAP_POINTS = 2000
+CLUSTER_GRID = 48       # clusters per viewport width at low zoom
+
+# ------------------------------
+# Viewport helpers
+# ------------------------------
+def bounds_around(latitude, longitude, lat_delta, lon_delta):
+    # (south, west, north, east); west > east when the box crosses the antimeridian
+    south, north = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    if lon_delta >= 180:
+        return south, -180.0, north, 180.0
+    west = (longitude - lon_delta + 180) % 360 - 180
+    east = (longitude + lon_delta + 180) % 360 - 180
+    return south, west, north, east
+
+def viewport_bounds(latitude, longitude, zoom, width_px=1000, height_px=500):
+    # Web-mercator approximation of what a pydeck map of this size shows
+    degrees_per_px = 360 / (256 * 2 ** zoom)
+    lat_delta = height_px / 2 * degrees_per_px * math.cos(math.radians(latitude))
+    return bounds_around(latitude, longitude, lat_delta, width_px / 2 * degrees_per_px)
+
+def cluster_cell_degrees(zoom, width_px=1000):
+    # Grid cell that splits the viewport width into CLUSTER_GRID columns
+    return 360 / (256 * 2 ** zoom) * width_px / CLUSTER_GRID
+
+def radius_bounds(latitude, longitude, radius_km):
+    lat_delta = radius_km / KM_PER_DEGREE
+    lon_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+    return bounds_around(latitude, longitude, lat_delta, lon_delta)
+
+# ------------------------------
+# Filter builder
+# ------------------------------
+def build_brewery_filter(bbox=None, states=None, cities=None, types=None):
+    clauses, params = ["b.latitude IS NOT NULL", "b.longitude IS NOT NULL"], []
+    source = "breweries b"
+    if bbox:
+        # The R*Tree narrows the candidates before any brewery row is read
+        south, west, north, east = bbox
+        source = "breweries_rtree r JOIN breweries b ON b.brewery_key = r.brewery_key"
+        clauses += ["r.max_lat >= ?", "r.min_lat <= ?"]
+        params += [south, north]
+        if west <= east:
+            clauses += ["r.max_lon >= ?", "r.min_lon <= ?"]
+        else:
+            # Viewport crosses the antimeridian
+            clauses.append("(r.max_lon >= ? OR r.min_lon <= ?)")
+        params += [west, east]
+    for column, values in (("state", states), ("city", cities), ("brewery_type", types)):
+        if values:
+            clauses.append(f"b.{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    return source, f"WHERE {' AND '.join(clauses)}", params
+
+# ------------------------------
+# Local brewery queries
+# ------------------------------
+# Everything here reads the breweries table kept up to date by brewery_sync,
+# so no request ever waits on OpenBreweryDB.
+@timed(kind="loader")
+def list_brewery_options(column, states=None):
+    query = f"SELECT DISTINCT {column} FROM breweries WHERE {column} IS NOT NULL"
+    params = []
+    if states:
+        query += f" AND state IN ({', '.join('?' * len(states))})"
+        params = list(states)
+    with connection() as conn:
+        return [row[0] for row in conn.execute(query + f" ORDER BY {column}", params)]
+
+@timed(kind="loader")
+def count_breweries(**filters):
+    source, where, params = build_brewery_filter(**filters)
+    with connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {source} {where}", params).fetchone()[0]
+
+@timed(kind="loader")
+def fetch_brewery_page(page=1, per_page=100, **filters):
+    source, where, params = build_brewery_filter(**filters)
+    query = f"""
+        SELECT {', '.join(f'b.{column}' for column in BREWERY_COLUMNS)}
+        FROM {source} {where}
+        ORDER BY b.name, b.brewery_key
+        LIMIT ? OFFSET ?
+    """
+    with connection() as conn:
+        return pd.read_sql_query(query, conn, params=(*params, per_page, (page - 1) * per_page))
+
+@timed(kind="loader")
+def fetch_map_points(limit=MAX_MAP_POINTS, **filters):
+    source, where, params = build_brewery_filter(**filters)
+    query = f"""
+        SELECT b.id, b.name, b.city, b.state, b.latitude, b.longitude, 1 AS count
+        FROM {source} {where}
+        LIMIT ?
+    """
+    with connection() as conn:
+        return pd.read_sql_query(query, conn, params=(*params, limit))
+
+@timed(kind="loader")
+def cluster_breweries(cell_degrees, **filters):
+    # Grid clustering in SQL: one row per occupied cell, positioned at the
+    # mean of its breweries, so the payload is bounded by the grid size.
+    source, where, params = build_brewery_filter(**filters)
+    query = f"""
+        SELECT COUNT(*) AS count, AVG(b.latitude) AS latitude, AVG(b.longitude) AS longitude,
+               MIN(b.name) AS name
+        FROM {source} {where}
+        GROUP BY CAST((b.latitude + 90) / ? AS INTEGER), CAST((b.longitude + 180) / ? AS INTEGER)
+    """
+    with connection() as conn:
+        return pd.read_sql_query(query, conn, params=(*params, cell_degrees, cell_degrees))
+
+@timed(kind="loader")
+def breweries_near(latitude, longitude, radius_km, **filters):
+    # Bounding-box prefilter through the R*Tree, then exact great-circle
+    # distance. Every match, nearest first; the caller caps what it maps.
+    source, where, params = build_brewery_filter(bbox=radius_bounds(latitude, longitude, radius_km), **filters)
+    query = f"SELECT {', '.join(f'b.{column}' for column in BREWERY_COLUMNS)} FROM {source} {where}"
+    with connection() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(df["latitude"].to_numpy()), np.radians(df["longitude"].to_numpy())
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    df["distance_km"] = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+    return df[df["distance_km"] <= radius_km].sort_values("distance_km", kind="stable")
+
+@timed(kind="loader")
+def brewery_facets(top_cities=10, **filters):
+    source, where, params = build_brewery_filter(**filters)
+    with connection() as conn:
+        type_counts = pd.read_sql_query(
+            f"SELECT b.brewery_type AS type, COUNT(*) AS count FROM {source} {where} "
+            f"AND b.brewery_type IS NOT NULL GROUP BY b.brewery_type ORDER BY count DESC",
+            conn, params=params,
+        )
+        city_counts = pd.read_sql_query(
+            f"SELECT b.city AS city, COUNT(*) AS count FROM {source} {where} "
+            f"AND b.city IS NOT NULL GROUP BY b.city ORDER BY count DESC LIMIT ?",
+            conn, params=(*params, top_cities),
+        )
+    return type_counts, city_counts
@@ -0,0 +1,204 @@
+import os
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from db_utils import connection, transaction
+from instrumentation import timed
+
+API_URL = os.environ.get("OPENBREWERYDB_URL", "https://api.openbrewerydb.org/v1")
+PER_PAGE = 200          # API maximum
+MAX_WORKERS = 8
+MAX_RETRIES = 4
+BACKOFF_SECONDS = 0.5
+REQUEST_TIMEOUT = 10
+REFRESH_TTL = 24 * 60 * 60
+
+UPSERT_BREWERY = """
+    INSERT INTO breweries (
+        id, name, brewery_type, city, state, country,
+        latitude, longitude, website_url, sync_page, synced_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        name = excluded.name,
+        brewery_type = excluded.brewery_type,
+        city = excluded.city,
+        state = excluded.state,
+        country = excluded.country,
+        latitude = excluded.latitude,
+        longitude = excluded.longitude,
+        website_url = excluded.website_url,
+        sync_page = excluded.sync_page,
+        synced_at = excluded.synced_at
+"""
+
+_status = {"running": False, "last_synced": None, "last_error": None, "pages": 0}
+_status_lock = threading.Lock()
+
+# ------------------------------
+# HTTP
+# ------------------------------
+# requests is imported by the sync thread, not by the locator page
+def make_session(max_workers=MAX_WORKERS):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    # One keep-alive connection per worker, reused across pages
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_with_retries(session, url, headers=None):
+    import requests
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            if response.status_code != 429 and response.status_code < 500:
+                response.raise_for_status()
+                return response
+            retry_after = response.headers.get("Retry-After")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else BACKOFF_SECONDS * 2 ** attempt
+            error = requests.HTTPError(f"{response.status_code} from {url}", response=response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            delay = BACKOFF_SECONDS * 2 ** attempt
+            error = e
+        if attempt == MAX_RETRIES:
+            raise error
+        time.sleep(delay)
+
+def fetch_total(session, base_url):
+    response = get_with_retries(session, f"{base_url}/breweries/meta")
+    return int(response.json()["total"])
+
+@timed(kind="sync")
+def fetch_page(session, base_url, page, per_page=PER_PAGE, etag=None):
+    # Returns (page, breweries or None when unchanged, etag)
+    headers = {"If-None-Match": etag} if etag else None
+    response = get_with_retries(session, f"{base_url}/breweries?per_page={per_page}&page={page}", headers)
+    if response.status_code == 304:
+        return page, None, etag
+    breweries = response.json()
+    if not isinstance(breweries, list):
+        raise ValueError("Unexpected format from OpenBreweryDB.")
+    return page, breweries, response.headers.get("ETag")
+
+# ------------------------------
+# Persistence
+# ------------------------------
+def to_row(brewery, page, synced_at):
+    def coordinate(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return (
+        brewery["id"], brewery.get("name"), brewery.get("brewery_type"), brewery.get("city"),
+        brewery.get("state") or brewery.get("state_province"), brewery.get("country"),
+        coordinate(brewery.get("latitude")), coordinate(brewery.get("longitude")),
+        brewery.get("website_url"), page, synced_at,
+    )
+
+@timed(kind="sync")
+def save_page(page, per_page, breweries, etag, synced_at, db_path=None):
+    with transaction(db_path) as conn:
+        if breweries is None:
+            # 304: keep the rows, just mark them fresh
+            conn.execute("UPDATE breweries SET synced_at = ? WHERE sync_page = ?", (synced_at, page))
+        else:
+            conn.executemany(UPSERT_BREWERY, [to_row(b, page, synced_at) for b in breweries if b.get("id")])
+        conn.execute("""
+            INSERT INTO brewery_sync_pages (page, per_page, etag, fetched_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(page) DO UPDATE SET
+                per_page = excluded.per_page, etag = excluded.etag, fetched_at = excluded.fetched_at
+        """, (page, per_page, etag, synced_at))
+
+def load_sync_state(per_page, db_path=None):
+    with connection(db_path) as conn:
+        rows = conn.execute(
+            "SELECT page, etag, fetched_at FROM brewery_sync_pages WHERE per_page = ?", (per_page,)
+        ).fetchall()
+    return {page: (etag, fetched_at) for page, etag, fetched_at in rows}
+
+def is_stale(ttl=REFRESH_TTL, db_path=None):
+    with connection(db_path) as conn:
+        oldest = conn.execute("SELECT MIN(fetched_at) FROM brewery_sync_pages").fetchone()[0]
+    return oldest is None or time.time() - oldest > ttl
+
+# ------------------------------
+# Sync
+# ------------------------------
+def sync_breweries(base_url=API_URL, per_page=PER_PAGE, max_workers=MAX_WORKERS,
+                   ttl=REFRESH_TTL, force=False, db_path=None):
+    started_at = time.time()
+    state = load_sync_state(per_page, db_path)
+    session = make_session(max_workers)
+    try:
+        total_pages = math.ceil(fetch_total(session, base_url) / per_page)
+        due = [
+            page for page in range(1, total_pages + 1)
+            if force or page not in state or started_at - state[page][1] > ttl
+        ]
+        # Fetch concurrently; writes happen here, one short transaction per page
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(fetch_page, session, base_url, page, per_page, state.get(page, (None,))[0])
+                for page in due
+            ]
+            for future in as_completed(futures):
+                page, breweries, etag = future.result()
+                save_page(page, per_page, breweries, etag, time.time(), db_path)
+    finally:
+        session.close()
+
+    with transaction(db_path) as conn:
+        # Pages past the end and breweries the API no longer lists
+        conn.execute("DELETE FROM brewery_sync_pages WHERE page > ? OR per_page != ?", (total_pages, per_page))
+        if len(due) == total_pages:
+            conn.execute("DELETE FROM breweries WHERE synced_at < ?", (started_at,))
+    return len(due)
+
+def run_sync(**kwargs):
+    with _status_lock:
+        if _status["running"]:
+            return
+        _status["running"] = True
+    try:
+        pages = sync_breweries(**kwargs)
+        with _status_lock:
+            _status.update(last_synced=time.time(), last_error=None, pages=pages)
+    except Exception as e:
+        with _status_lock:
+            _status["last_error"] = str(e)
+    finally:
+        with _status_lock:
+            _status["running"] = False
+
+def start_background_sync(force=False, **kwargs):
+    # Keeps the network off the Streamlit script thread
+    if not force and not is_stale(kwargs.get("ttl", REFRESH_TTL), kwargs.get("db_path")):
+        return None
+    thread = threading.Thread(target=run_sync, kwargs=dict(force=force, **kwargs), daemon=True, name="brewery-sync")
+    thread.start()
+    return thread
+
+def sync_status():
+    with _status_lock:
+        return dict(_status)
+
+if __name__ == "__main__":
+    import argparse
+    from migrations import apply_migrations
+
+    parser = argparse.ArgumentParser(description="Sync OpenBreweryDB into the local breweries table.")
+    parser.add_argument("--base-url", default=API_URL)
+    parser.add_argument("--per-page", type=int, default=PER_PAGE)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    apply_migrations()
+    fetched = sync_breweries(args.base_url, args.per_page, args.workers, force=args.force)
+    print(f"✅ Synced {fetched} page(s) of breweries.")
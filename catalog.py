@@ -0,0 +1,170 @@
+import re
+from contextlib import contextmanager
+
+from db_utils import connection, get_meta
+from instrumentation import timed
+
+@contextmanager
+def catalog_connection(conn=None):
+    # A connection the caller already holds, or one from the pool. Callers
+    # inside a snapshot pass theirs, so they never wait on the pool for a
+    # second one.
+    if conn is not None:
+        yield conn
+        return
+    with connection() as conn:
+        yield conn
+
+# ------------------------------
+# Filter builder
+# ------------------------------
+# bm25 column weights follow the FTS column order:
+# beer_name, brewery_name, style, description
+RANK = "bm25(beers_fts, 10.0, 5.0, 3.0, 1.0)"
+SNIPPET = "snippet(beers_fts, 3, '**', '**', '…', 16)"
+
+def build_match_query(search_term):
+    # Every word must match as a prefix; quoting keeps FTS operators and
+    # punctuation in user input from being parsed as query syntax.
+    tokens = re.findall(r"\w+", search_term.lower())
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def build_beer_filter(styles=None, abv_range=None, search_term="", table="beers_catalog"):
+    # `table` is beer_details when the query needs style or brewery names;
+    # the filters themselves only compare integer ids and numbers
+    clauses, params = [], []
+    match_query = build_match_query(search_term) if search_term else ""
+    if match_query:
+        clauses.append("beers_fts MATCH ?")
+        params.append(match_query)
+    if styles:
+        clauses.append(f"b.style_id IN (SELECT style_id FROM styles WHERE style IN ({', '.join('?' * len(styles))}))")
+        params.extend(styles)
+    if abv_range:
+        clauses.append("b.abv BETWEEN ? AND ?")
+        params.extend(abv_range)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    # FTS drives the join when searching so bm25/snippet are available
+    source = f"beers_fts JOIN {table} b ON b.beer_id = beers_fts.rowid" if match_query else f"{table} b"
+    return source, where, params, bool(match_query)
+
+# ------------------------------
+# Queries
+# ------------------------------
+# Columns the list views need; description is fetched separately for the
+# rows actually shown.
+LIST_COLUMNS = ["beer_id", "beer_name", "brewery_name", "style_id", "style", "abv", "ibu"]
+
+def get_catalog_version(conn=None):
+    # Bumped by every catalog load; used to key caches derived from the catalog
+    with catalog_connection(conn) as conn:
+        return int(get_meta(conn.cursor(), 'catalog_version', 0))
+
+@timed(kind="loader")
+def get_filter_options():
+    with connection() as conn:
+        styles = [row[0] for row in conn.execute(
+            "SELECT style FROM styles WHERE style_id IN (SELECT style_id FROM beers_catalog) ORDER BY style"
+        )]
+        abv_min, abv_max = conn.execute("SELECT MIN(abv), MAX(abv) FROM beers_catalog").fetchone()
+    return styles, abv_min, abv_max
+
+@timed(kind="loader")
+def count_beers(styles=None, abv_range=None, search_term=""):
+    source, where, params, _ = build_beer_filter(styles, abv_range, search_term)
+    with connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {source} {where}", params).fetchone()[0]
+
+@timed(kind="loader")
+def fetch_beer_page(styles=None, abv_range=None, search_term="", limit=25, offset=0):
+    # pandas loads with the first page of results rather than with the module,
+    # which the journal page imports only for its filter options
+    import pandas as pd
+
+    source, where, params, searching = build_beer_filter(styles, abv_range, search_term, "beer_details")
+    select = ", ".join(f"b.{column}" for column in LIST_COLUMNS) + ", b.image_url"
+    if searching:
+        select += f", {SNIPPET} AS snippet"
+        order = f"ORDER BY {RANK}"
+    else:
+        select += ", NULL AS snippet"
+        order = "ORDER BY b.beer_id"
+    query = f"SELECT {select} FROM {source} {where} {order} LIMIT ? OFFSET ?"
+    with connection() as conn:
+        return pd.read_sql_query(query, conn, params=(*params, limit, offset))
+
+@timed(kind="loader")
+def fetch_descriptions(beer_ids, batch_size=500):
+    beer_ids = [int(beer_id) for beer_id in beer_ids]
+    descriptions = {}
+    with connection() as conn:
+        # Batched to stay under SQLite's bound-parameter limit
+        for start in range(0, len(beer_ids), batch_size):
+            batch = beer_ids[start:start + batch_size]
+            query = f"SELECT beer_id, description FROM beers_catalog WHERE beer_id IN ({', '.join('?' * len(batch))})"
+            descriptions.update(conn.execute(query, batch).fetchall())
+    return descriptions
+
+@timed(kind="loader")
+def fetch_beer_labels(beer_ids, batch_size=500, conn=None):
+    # {beer_id: (beer_name, brewery_name)} for linking to other beers
+    beer_ids = [int(beer_id) for beer_id in beer_ids]
+    labels = {}
+    with catalog_connection(conn) as conn:
+        for start in range(0, len(beer_ids), batch_size):
+            batch = beer_ids[start:start + batch_size]
+            query = f"SELECT beer_id, beer_name, brewery_name FROM beer_details WHERE beer_id IN ({', '.join('?' * len(batch))})"
+            labels.update((beer_id, (name, brewery)) for beer_id, name, brewery in conn.execute(query, batch))
+    return labels
+
+@timed(kind="loader")
+def fetch_style_names(conn=None):
+    # {style_id: style}; a hundred-odd rows
+    with catalog_connection(conn) as conn:
+        return dict(conn.execute("SELECT style_id, style FROM styles").fetchall())
+
+@timed(kind="loader")
+def resolve_beer_names(pairs, batch_size=250, db_path=None):
+    # {(beer_name, brewery_name): (beer_id, style_id)} for journals written
+    # before beers had integer ids. The first journal never stored a brewery;
+    # a ("name", "") pair resolves when only one beer has that name.
+    named = [pair for pair in pairs if pair[1]]
+    bare = [name for name, brewery in pairs if not brewery]
+    resolved = {}
+    with connection(db_path) as conn:
+        for start in range(0, len(named), batch_size):
+            batch = named[start:start + batch_size]
+            query = f"""
+                SELECT beer_name, brewery_name, MIN(beer_id), style_id FROM beer_details
+                WHERE (beer_name, brewery_name) IN (VALUES {', '.join(['(?, ?)'] * len(batch))})
+                GROUP BY beer_name, brewery_name
+            """
+            for name, brewery, beer_id, style_id in conn.execute(query, [value for pair in batch for value in pair]):
+                resolved[(name, brewery)] = (beer_id, style_id)
+        for start in range(0, len(bare), batch_size):
+            batch = bare[start:start + batch_size]
+            query = f"""
+                SELECT beer_name, MIN(beer_id), style_id FROM beer_details
+                WHERE beer_name IN ({', '.join('?' * len(batch))})
+                GROUP BY beer_name HAVING COUNT(*) = 1
+            """
+            for name, beer_id, style_id in conn.execute(query, batch):
+                resolved[(name, "")] = (beer_id, style_id)
+    return resolved
+
+def breweries_for_beer_names(names, batch_size=250, db_path=None):
+    # {beer_name: [brewery_name, ...]}, to show which brewery an old journal
+    # entry could mean
+    names = list(names)
+    breweries = {}
+    with connection(db_path) as conn:
+        for start in range(0, len(names), batch_size):
+            batch = names[start:start + batch_size]
+            query = f"""
+                SELECT DISTINCT beer_name, brewery_name FROM beer_details
+                WHERE beer_name IN ({', '.join('?' * len(batch))})
+                ORDER BY beer_name, brewery_name
+            """
+            for name, brewery in conn.execute(query, batch):
+                breweries.setdefault(name, []).append(brewery)
+    return breweries
@@ -0,0 +1,126 @@
+import os
+import glob
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+from db_utils import connection, database_id
+from paths import CACHE_DIR
+from catalog import get_catalog_version
+from instrumentation import timed
+
+CATEGORICAL_COLUMNS = ["style", "brewery_name"]
+EXPORT_CHUNK_SIZE = 50000
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+# ------------------------------
+# Export
+# ------------------------------
+def catalog_path(version, db_path=None):
+    # Named after the database as well as the version, so databases sharing
+    # a cache directory don't read or delete each other's copies
+    return os.path.join(CACHE_DIR, f"beers_catalog-{database_id(db_path)}-v{version}.arrow")
+
+def to_record_batch(df, dictionaries):
+    # Every batch is encoded against the same catalog-wide dictionary; the
+    # IPC file format can't replace a dictionary between batches.
+    arrays = []
+    for name in df.columns:
+        if name in dictionaries:
+            codes = pd.Categorical(df[name], categories=dictionaries[name]).codes
+            indices = pa.array(codes, pa.int32(), mask=codes < 0)
+            arrays.append(pa.DictionaryArray.from_arrays(indices, dictionaries[name]))
+        else:
+            arrays.append(pa.array(df[name]))
+    return pa.RecordBatch.from_arrays(arrays, names=list(df.columns))
+
+def export_catalog(conn, version, db_path=None):
+    # Uncompressed Arrow IPC so readers can memory-map it without decoding.
+    # Written under a temp name and renamed, so readers never see a partial file.
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = catalog_path(version, db_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    dictionaries = {
+        name: pa.array([row[0] for row in conn.execute(
+            f"SELECT DISTINCT {name} FROM beer_details WHERE {name} IS NOT NULL ORDER BY {name}"
+        )], pa.string())
+        for name in CATEGORICAL_COLUMNS
+    }
+    writer = None
+    try:
+        for chunk in pd.read_sql_query(
+            "SELECT * FROM beer_details ORDER BY beer_id", conn, chunksize=EXPORT_CHUNK_SIZE
+        ):
+            batch = to_record_batch(chunk, dictionaries)
+            if writer is None:
+                writer = ipc.new_file(tmp_path, batch.schema)
+            writer.write_batch(batch)
+        if writer is None:
+            return None
+        writer.close()
+        writer = None
+        os.replace(tmp_path, path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # This database's older versions, and copies from before the database
+    # was part of the name
+    stale_paths = glob.glob(os.path.join(CACHE_DIR, f"beers_catalog-{database_id(db_path)}-v*.arrow"))
+    for stale in stale_paths + glob.glob(os.path.join(CACHE_DIR, "beers_catalog-v*.arrow")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+# ------------------------------
+# Memory-mapped loading
+# ------------------------------
+@timed(kind="loader")
+def load_catalog_table(version=None):
+    # One mapped table per process, database and catalog version. Pages in
+    # every session share it, and other worker processes share the same pages
+    # through the OS page cache.
+    version = get_catalog_version() if version is None else version
+    path = catalog_path(version)
+    table = _tables.get(path)
+    if table is not None:
+        return table
+    with _tables_lock:
+        table = _tables.get(path)
+        if table is None:
+            if not os.path.exists(path):
+                with connection() as conn:
+                    path = export_catalog(conn, version)
+            if path is None:
+                return None
+            table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+            _tables.clear()
+            _tables[path] = table
+    return table
+
+def filter_catalog_table(table, styles=None, abv_range=None, columns=None):
+    mask = None
+    if styles:
+        mask = pc.is_in(table["style"].cast(pa.string()), value_set=pa.array(list(styles), pa.string()))
+    if abv_range:
+        in_range = pc.and_(pc.greater_equal(table["abv"], abv_range[0]), pc.less_equal(table["abv"], abv_range[1]))
+        mask = in_range if mask is None else pc.and_(mask, in_range)
+    if columns:
+        table = table.select(columns)
+    if mask is not None:
+        table = table.filter(mask)
+    return table
+
+@timed(kind="loader")
+def filter_catalog(table, styles=None, abv_range=None, columns=None):
+    # Only the filtered slice is materialized; dictionary columns come back categorical
+    return filter_catalog_table(table, styles, abv_range, columns).to_pandas()
@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+
+import pandas as pd
+
+from db_utils import connection, immediate, get_meta, set_meta
+from paths import APP_DIR
+from style_stats import refresh_style_stats
+from recommender import FLAVOR_COLUMNS
+
+CSV_PATH = os.path.join(APP_DIR, 'beer_data_set.csv')
+CHUNK_SIZE = 50_000
+
+# The CSV's `key` and `Style Key` become beer_id and style_id; breweries have no
+# key there and get one from catalog_breweries
+CSV_COLUMNS = ["beer_id", "beer_name", "brewery_name", "style_id", "style", "abv", "ibu", "description",
+               "ave_rating", *FLAVOR_COLUMNS]
+CATALOG_COLUMNS = ["beer_id", "beer_name", "brewery_id", "style_id", "abv", "ibu", "description", "ave_rating",
+                   *FLAVOR_COLUMNS, "row_hash"]
+FLAVOR_NAMES = {column.title(): column for column in FLAVOR_COLUMNS}
+# Fixed types rather than inferred ones: a chunk whose ABVs happen to be
+# whole numbers would otherwise parse as ints and hash differently
+SOURCE_TYPES = {
+    "key": "int64", "Name": "str", "Brewery": "str", "Style Key": "int64", "Style": "str",
+    "ABV": "float64", "Min IBU": "float64", "Max IBU": "float64", "Description": "str", "Ave Rating": "float64",
+    **{name: "float64" for name in FLAVOR_NAMES},
+}
+
+# ------------------------------
+# Reading the CSV
+# ------------------------------
+# The file is read a chunk at a time and each row gets a hash of everything
+# the catalog keeps from it, so a refresh only writes rows whose hash moved
+# and memory stays flat however long the file is.
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def prepare_chunk(df):
+    df = df.rename(columns={
+        "key": "beer_id",
+        "Name": "beer_name",
+        "Brewery": "brewery_name",
+        "Style Key": "style_id",
+        "Style": "style",
+        "ABV": "abv",
+        "Description": "description",
+        "Ave Rating": "ave_rating",
+        **FLAVOR_NAMES,
+    })
+    df['ibu'] = (df['Min IBU'].fillna(0) + df['Max IBU'].fillna(0)) / 2
+    df['abv'] = df['abv'].fillna(0)
+    df['description'] = df['description'].fillna('No description available.')
+    df['beer_name'] = df['beer_name'].fillna('')
+    # Breweries are keyed by name, so a missing one is the empty name
+    df['brewery_name'] = df['brewery_name'].fillna('')
+    # Last row wins if a key is ever listed twice
+    df = df.drop_duplicates(subset=["beer_id"], keep="last")[CSV_COLUMNS]
+    # Names are hashed too, so a renamed brewery or style reaches its beers
+    hashes = pd.util.hash_pandas_object(df[CSV_COLUMNS[1:]], index=False, categorize=False).to_numpy().view("int64")
+    return df.assign(row_hash=hashes)
+
+def read_catalog_chunks(csv_path=CSV_PATH, chunk_size=CHUNK_SIZE):
+    with pd.read_csv(csv_path, usecols=list(SOURCE_TYPES), dtype=SOURCE_TYPES, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield prepare_chunk(chunk)
+
+# ------------------------------
+# Writing changes
+# ------------------------------
+def load_styles(conn, df):
+    # Returns True when a known style was renamed
+    styles = list(df[["style_id", "style"]].drop_duplicates("style_id", keep="last").itertuples(index=False, name=None))
+    known = dict(conn.execute("SELECT style_id, style FROM styles").fetchall())
+    conn.executemany('''
+    INSERT INTO styles (style_id, style) VALUES (?, ?)
+    ON CONFLICT(style_id) DO UPDATE SET style = excluded.style
+    WHERE style IS NOT excluded.style
+    ''', styles)
+    return any(known.get(style_id, style) != style for style_id, style in styles)
+
+def load_breweries(conn, df):
+    # {brewery_name: brewery_id} for the chunk's breweries; ids are never
+    # reassigned, so journal rows and caches that hold one stay valid
+    names = df["brewery_name"].unique().tolist()
+    conn.executemany(
+        "INSERT INTO catalog_breweries (brewery_name) VALUES (?) ON CONFLICT(brewery_name) DO NOTHING",
+        ((name,) for name in names),
+    )
+    return dict(conn.execute(
+        "SELECT brewery_name, brewery_id FROM catalog_breweries WHERE brewery_name IN (SELECT value FROM json_each(?))",
+        (json.dumps(names),),
+    ).fetchall())
+
+def stored_rows(conn, beer_ids):
+    # {beer_id: (row_hash, style_id)} for the chunk; one bound parameter
+    # however big the chunk is
+    return {beer_id: (row_hash, style_id) for beer_id, row_hash, style_id in conn.execute(
+        "SELECT b.beer_id, b.row_hash, b.style_id FROM json_each(?) j JOIN beers_catalog b ON b.beer_id = j.value",
+        (json.dumps(beer_ids),),
+    )}
+
+def upsert_beers(conn, df):
+    beers = df.assign(brewery_id=df["brewery_name"].map(load_breweries(conn, df)))[CATALOG_COLUMNS]
+    updated = CATALOG_COLUMNS[1:]
+    conn.executemany(f'''
+    INSERT INTO beers_catalog ({', '.join(CATALOG_COLUMNS)})
+    VALUES ({', '.join('?' * len(CATALOG_COLUMNS))})
+    ON CONFLICT(beer_id) DO UPDATE SET
+        {', '.join(f'{column} = excluded.{column}' for column in updated)}
+    ''', beers.itertuples(index=False, name=None))
+
+def apply_chunk(conn, df, touched_styles):
+    # (inserted, updated, style renamed) for one chunk, in its own
+    # transaction. Adds the style_ids whose stats the chunk changes to
+    # touched_styles.
+    beer_ids = df["beer_id"].tolist()
+    with immediate(conn):
+        conn.execute("INSERT OR IGNORE INTO temp.ingest_seen (beer_id) SELECT value FROM json_each(?)",
+                     (json.dumps(beer_ids),))
+        known = stored_rows(conn, beer_ids)
+        changed = df[[known.get(b, (None,))[0] != h for b, h in zip(beer_ids, df["row_hash"].tolist())]]
+        if changed.empty:
+            return 0, 0, False
+        renamed = load_styles(conn, changed)
+        upsert_beers(conn, changed)
+    changed_ids = changed["beer_id"].tolist()
+    touched_styles.update(changed["style_id"].tolist())
+    touched_styles.update(known[b][1] for b in changed_ids if b in known)
+    inserted = sum(b not in known for b in changed_ids)
+    return inserted, len(changed) - inserted, renamed
+
+def delete_missing(conn, touched_styles):
+    # Beers the file no longer lists; returns how many were removed
+    missing = conn.execute(
+        "SELECT beer_id, style_id FROM beers_catalog WHERE beer_id NOT IN (SELECT beer_id FROM temp.ingest_seen)"
+    ).fetchall()
+    if missing:
+        conn.execute("DELETE FROM beers_catalog WHERE beer_id IN (SELECT value FROM json_each(?))",
+                     (json.dumps([beer_id for beer_id, _ in missing]),))
+        touched_styles.update(style_id for _, style_id in missing)
+    return len(missing)
+
+def touched_style_names(conn, style_ids):
+    return [style for (style,) in conn.execute(
+        "SELECT style FROM styles WHERE style_id IN (SELECT value FROM json_each(?))", (json.dumps(list(style_ids)),)
+    )]
+
+# ------------------------------
+# Refresh
+# ------------------------------
+def refresh_catalog(db_path=None, csv_path=CSV_PATH, chunk_size=CHUNK_SIZE):
+    # Brings beers_catalog in line with the CSV. Returns (catalog version,
+    # {"inserted", "updated", "deleted"}), or (version, None) when the file
+    # hasn't changed since the last refresh. The version is bumped only when
+    # rows changed, once the last batch has committed.
+    csv_hash = file_sha256(csv_path)
+    with connection(db_path) as conn:
+        cursor = conn.cursor()
+        if get_meta(cursor, 'csv_sha256') == csv_hash:
+            return int(get_meta(cursor, 'catalog_version', 0)), None
+
+        changes = {"inserted": 0, "updated": 0, "deleted": 0}
+        # A refresh that stopped part way committed some batches without
+        # recording which styles they touched, so this one redoes the stats,
+        # search index and version bump in full
+        interrupted = get_meta(cursor, 'catalog_refresh_pending') == '1'
+        renamed = interrupted
+        touched_styles = set()
+        with immediate(conn):
+            set_meta(cursor, 'catalog_refresh_pending', 1)
+        # Keys seen in the file, for the deletes at the end. Spilled to a
+        # temp file instead of memory for files with millions of beers.
+        conn.execute("PRAGMA temp_store = FILE")
+        conn.execute("CREATE TEMP TABLE ingest_seen (beer_id INTEGER PRIMARY KEY)")
+        try:
+            for chunk in read_catalog_chunks(csv_path, chunk_size):
+                inserted, updated, chunk_renamed = apply_chunk(conn, chunk, touched_styles)
+                changes["inserted"] += inserted
+                changes["updated"] += updated
+                renamed = renamed or chunk_renamed
+
+            with immediate(conn):
+                changes["deleted"] = delete_missing(conn, touched_styles)
+                if renamed:
+                    # The search index holds style names; the triggers only see beer rows
+                    conn.execute("INSERT INTO beers_fts (beers_fts) VALUES ('rebuild')")
+                if interrupted or any(changes.values()):
+                    # Stats are stored by style name, so a rename rebuilds them all
+                    refresh_style_stats(conn, None if renamed else touched_style_names(conn, touched_styles))
+                    set_meta(cursor, 'catalog_version', int(get_meta(cursor, 'catalog_version', 0)) + 1)
+                set_meta(cursor, 'csv_sha256', csv_hash)
+                set_meta(cursor, 'catalog_refresh_pending', 0)
+                version = int(get_meta(cursor, 'catalog_version', 0))
+        finally:
+            conn.execute("DROP TABLE IF EXISTS temp.ingest_seen")
+            conn.execute("PRAGMA temp_store = MEMORY")
+    return version, changes
+
+def describe_changes(changes):
+    return f"{changes['inserted']} new, {changes['updated']} updated, {changes['deleted']} removed"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply an updated beer CSV to the catalog.")
+    parser.add_argument("--csv", default=CSV_PATH, help="catalog CSV to load")
+    parser.add_argument("--db", default=None, help="database file (defaults to BEER_DIARY_DB)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows read and committed per batch")
+    args = parser.parse_args(argv)
+
+    version, changes = refresh_catalog(args.db, args.csv, args.chunk_size)
+    if changes is None:
+        print(f"✅ Catalog already matches {args.csv} (version {version}).")
+    else:
+        print(f"🔄 Catalog refreshed: {describe_changes(changes)} (version {version}).")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
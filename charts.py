@@ -0,0 +1,45 @@
+import json
+
+import pandas as pd
+import streamlit as st
+
+from result_cache import cached_scalar
+
+TOP_N = 20              # categories drawn before the rest are folded together
+
+# ------------------------------
+# Shaping chart data
+# ------------------------------
+# Charts get what they draw and no more: histograms arrive as bin counts, and
+# long-tailed categories are cut to the largest few, so the figure sent over
+# the websocket stays small however many styles or cities match.
+def top_categories(df, label, value, n=TOP_N, other="Other"):
+    # The n largest rows by value, plus one row adding up the rest
+    if len(df) <= n:
+        return df
+    df = df.sort_values(value, ascending=False, kind="stable")
+    rest = df.iloc[n:]
+    tail = pd.DataFrame({label: [f"{other} ({len(rest)})"], value: [rest[value].sum()]})
+    return pd.concat([df.iloc[:n][[label, value]], tail], ignore_index=True)
+
+def facet_key(df):
+    # Small facet frames key their figures by content, so a chart follows the
+    # data without tracking where it came from
+    return tuple(df.itertuples(index=False, name=None))
+
+# ------------------------------
+# Cached figures
+# ------------------------------
+# Building a figure with plotly express costs far more than the data behind
+# it, so the serialized figure is kept in the shared result cache, keyed by
+# chart, canonical filters and theme template. The catalog version flushes it
+# along with the data. Switching chart type or theme builds only the figure
+# that is missing.
+def figure_spec(key, build, template):
+    # build(template) returns a plotly Figure
+    return cached_scalar(("figure", *key, template), lambda: build(template).to_json())
+
+def plotly_chart(key, build, template, container=st, **kwargs):
+    # st.plotly_chart turns a figure into a dict before sending it anyway, so
+    # each caller gets its own dict of the cached JSON
+    container.plotly_chart(json.loads(figure_spec(key, build, template)), **kwargs)
@@ -0,0 +1,227 @@
+import os
+import hashlib
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from instrumentation import connection_factory, timed
+from paths import APP_DIR
+
+DB_PATH = os.environ.get("BEER_DIARY_DB", os.path.join(APP_DIR, "craft_beer.db"))
+POOL_SIZE = int(os.environ.get("BEER_DIARY_DB_POOL_SIZE", 8))
+# Seconds acquire() waits for a connection once all of them are in use
+POOL_TIMEOUT = float(os.environ.get("BEER_DIARY_DB_POOL_TIMEOUT", 30))
+BUSY_TIMEOUT_MS = 10000
+# Connection class for new pooled connections; the timing subclass when
+# BEER_DIARY_PROFILE is set, and always under the benchmarks
+CONNECTION_FACTORY = connection_factory()
+
+# Applied once per physical connection, not per query
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -32000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+)
+
+# ------------------------------
+# Hot queries
+# ------------------------------
+# sqlite3 keeps a per-connection cache of prepared statements keyed by SQL
+# text, so sharing these constants across pages lets pooled connections reuse
+# the compiled statement instead of re-parsing it on every rerun.
+
+# Keyset pages, newest first. (tasted_on, journal_id) is covered by
+# idx_tasting_journal_user_tasted_on, whose entries end in the rowid.
+JOURNAL_PAGE_COLUMNS = """
+    journal_id, beer_id, style_id, abv, look, smell, taste, feel, overall,
+    average_rating, user_notes, tasted_on
+"""
+
+SELECT_JOURNAL_FIRST_PAGE = f"""
+    SELECT {JOURNAL_PAGE_COLUMNS}
+    FROM tasting_journal
+    WHERE user_id = ?
+    ORDER BY tasted_on DESC, journal_id DESC
+    LIMIT ?
+"""
+
+SELECT_JOURNAL_PAGE_AFTER = f"""
+    SELECT {JOURNAL_PAGE_COLUMNS}
+    FROM tasting_journal
+    WHERE user_id = ? AND (tasted_on, journal_id) < (?, ?)
+    ORDER BY tasted_on DESC, journal_id DESC
+    LIMIT ?
+"""
+
+INSERT_JOURNAL_ENTRY = """
+    INSERT INTO tasting_journal (
+        user_id, beer_id, style_id, abv,
+        look, smell, taste, feel, overall, average_rating,
+        user_notes, tasted_on
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+
+DELETE_JOURNAL_ENTRY = """
+    DELETE FROM tasting_journal
+    WHERE user_id = ? AND beer_id = ? AND tasted_on = ?
+"""
+
+# Favorites are searched and paged in SQL. The name filter is a LIKE
+# pattern, '%' when nothing is being searched.
+COUNT_FAVORITES = """
+    SELECT COUNT(*)
+    FROM favorite_breweries
+    WHERE user_id = ? AND brewery_name LIKE ? ESCAPE '\\'
+"""
+
+SELECT_FAVORITES = """
+    SELECT fav_id, brewery_name, city, state, country, website_url
+    FROM favorite_breweries
+    WHERE user_id = ? AND brewery_name LIKE ? ESCAPE '\\'
+    ORDER BY fav_id
+    LIMIT ? OFFSET ?
+"""
+
+INSERT_FAVORITE = """
+    INSERT INTO favorite_breweries (brewery_name, city, state, country, website_url, user_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+
+DELETE_FAVORITE = "DELETE FROM favorite_breweries WHERE user_id = ? AND fav_id = ?"
+
+# ------------------------------
+# Connection pool
+# ------------------------------
+class PoolTimeout(RuntimeError):
+    pass
+
+class ConnectionPool:
+    def __init__(self, db_path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Autocommit mode: transactions are opened explicitly by transaction()
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256,
+            factory=CONNECTION_FACTORY,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @timed("db_utils.ConnectionPool.acquire", kind="db")
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        # Fails instead of waiting forever, so a thread that asks for a second
+        # connection while holding one can't hang the process
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(
+                f"No database connection was free after {self.timeout:g}s; all {self.size} are in use "
+                f"(BEER_DIARY_DB_POOL_SIZE)"
+            ) from None
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def database_id(db_path=None):
+    # Short name for a database file, for files derived from it that live in
+    # the shared cache directory
+    path = os.path.realpath(db_path or DB_PATH)
+    return hashlib.sha1(path.encode("utf-8")).hexdigest()[:12]
+
+def get_pool(db_path=None):
+    db_path = db_path or DB_PATH
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(db_path, ConnectionPool(db_path))
+    return pool
+
+# ------------------------------
+# Context managers used by the pages
+# ------------------------------
+@contextmanager
+def connection(db_path=None):
+    pool = get_pool(db_path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+@contextmanager
+def immediate(conn):
+    # BEGIN IMMEDIATE takes the write lock up front, so overlapping writers
+    # queue on busy_timeout instead of failing with "database is locked"
+    # when a read lock can't be upgraded.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+@contextmanager
+def transaction(db_path=None):
+    with connection(db_path) as conn:
+        with immediate(conn):
+            yield conn
+
+# ------------------------------
+# Catalog metadata
+# ------------------------------
+def get_meta(cursor, key, default=None):
+    cursor.execute('SELECT value FROM catalog_meta WHERE key = ?', (key,))
+    row = cursor.fetchone()
+    return row[0] if row else default
+
+def set_meta(cursor, key, value):
+    cursor.execute('''
+    INSERT INTO catalog_meta (key, value) VALUES (?, ?)
+    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    ''', (key, str(value)))
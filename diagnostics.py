@@ -0,0 +1,102 @@
+import datetime
+import streamlit as st
+import pandas as pd
+
+import instrumentation
+from instrumentation import snapshot, recent_reruns, metrics_text, write_metrics, METRICS_PATH
+
+RERUN_SPANS = 200       # spans listed for one rerun
+
+# ------------------------------
+# Hidden diagnostics view
+# ------------------------------
+# Rendered by Home.py when the URL carries ?diagnostics. Add &profile=1 (or
+# &profile=pyinstrument) to any page's URL to capture a profile of its reruns.
+def stats_frame(stats):
+    rows = [
+        {"kind": kind, "name": name, "count": count, "total_ms": total * 1000,
+         "mean_ms": total / count * 1000 if count else 0.0, "max_ms": slowest * 1000}
+        for (kind, name), (count, total, slowest) in stats.items()
+    ]
+    columns = ["kind", "name", "count", "total_ms", "mean_ms", "max_ms"]
+    return pd.DataFrame(rows, columns=columns).sort_values("total_ms", ascending=False, ignore_index=True)
+
+def rerun_frame(reruns):
+    rows = []
+    for rerun in reversed(reruns):
+        sql = [seconds for kind, _, seconds in rerun["spans"] if kind == "sql"]
+        rows.append({
+            "started": datetime.datetime.fromtimestamp(rerun["started_at"]).strftime("%H:%M:%S"),
+            "page": rerun["page"],
+            "total_ms": rerun["seconds"] * 1000,
+            "sql_ms": sum(sql) * 1000,
+            "sql_calls": len(sql),
+            "stopped early": rerun["stopped"],
+            "profiled": rerun["profile"] is not None,
+        })
+    return pd.DataFrame(rows)
+
+def show_result_cache():
+    from result_cache import get_result_cache
+
+    stats = get_result_cache().stats()
+    st.markdown("### 🗃️ Shared Result Cache")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Entries", stats["entries"])
+    col2.metric("Size (MB)", f"{stats['bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f}")
+    lookups = stats["hits"] + stats["misses"]
+    col3.metric("Hit rate", f"{stats['hits'] / lookups:.0%}" if lookups else "—")
+    col4.metric("Evictions", stats["evictions"])
+    st.caption(f"Catalog version {stats['version']}; {stats['waits']} lookups waited on another session's query.")
+
+def show_image_cache():
+    from images import memory_usage, MEMORY_BUDGET_BYTES
+
+    entries, size = memory_usage()
+    st.markdown("### 🖼️ Thumbnail Memory Cache")
+    col1, col2 = st.columns(2)
+    col1.metric("Thumbnails", entries)
+    col2.metric("Size (MB)", f"{size / 2**20:.1f} / {MEMORY_BUDGET_BYTES / 2**20:.0f}")
+
+def show_diagnostics():
+    st.markdown("<h1>🩺 Diagnostics</h1>", unsafe_allow_html=True)
+    show_result_cache()
+    show_image_cache()
+    if not instrumentation.ENABLED:
+        st.info("ℹ️ Instrumentation is off. Start the app with BEER_DIARY_PROFILE=1 to collect timings.")
+        return
+
+    stats = snapshot()
+    reruns = recent_reruns()
+    col1, col2 = st.columns([4, 1])
+    col1.caption(f"Prometheus metrics are written to `{METRICS_PATH}` every {instrumentation.METRICS_INTERVAL}s.")
+    if col2.button("♻️ Reset"):
+        instrumentation.reset()
+        st.rerun()
+
+    st.markdown("### ⏱️ Recent Reruns")
+    if reruns:
+        st.dataframe(rerun_frame(reruns).round(1), use_container_width=True)
+        choices = list(range(len(reruns) - 1, -1, -1))
+        picked = st.selectbox(
+            "Inspect rerun", choices,
+            format_func=lambda i: f"{reruns[i]['page']} — {reruns[i]['seconds'] * 1000:.0f} ms",
+        )
+        rerun = reruns[picked]
+        spans = pd.DataFrame(rerun["spans"][:RERUN_SPANS], columns=["kind", "name", "seconds"])
+        spans["ms"] = spans.pop("seconds") * 1000
+        st.dataframe(spans.round(2), use_container_width=True)
+        if rerun["profile"]:
+            st.code(rerun["profile"], language="text")
+    else:
+        st.info("No page reruns recorded yet.")
+
+    st.markdown("### 📊 Totals Since Start")
+    frame = stats_frame(stats)
+    kinds = st.multiselect("Kinds", sorted(frame["kind"].unique()), default=sorted(frame["kind"].unique()))
+    st.dataframe(frame[frame["kind"].isin(kinds)].round(2), use_container_width=True)
+
+    with st.expander("📄 Prometheus metrics"):
+        text = metrics_text(stats)
+        st.code(text, language="text")
+        st.download_button("⬇️ Download metrics", text, "metrics.prom", "text/plain", on_click=write_metrics)
@@ -0,0 +1,206 @@
+import os
+import csv
+import glob
+import gzip
+import hashlib
+import json
+
+from storage import get_storage
+from paths import CACHE_DIR
+from catalog import fetch_beer_labels, fetch_style_names, get_catalog_version
+from instrumentation import timed
+
+EXPORT_DIR = os.path.join(CACHE_DIR, "exports")
+CHUNK_SIZE = 5000
+
+# (mime type, file extension)
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "csv.gz": ("application/gzip", "csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Columns read, columns written, table, and the columns the optional filters
+# apply to. Journal rows hold catalog ids; the names are added per chunk.
+DATASETS = {
+    "journal": {
+        "table": "tasting_journal",
+        "columns": ["beer_id", "style_id", "abv", "look", "smell", "taste", "feel", "overall",
+                    "average_rating", "user_notes", "tasted_on"],
+        "output": ["beer_id", "beer_name", "brewery_name", "style", "abv", "look", "smell", "taste", "feel",
+                   "overall", "average_rating", "user_notes", "tasted_on"],
+        "integer": ["beer_id"],
+        "numeric": ["abv", "look", "smell", "taste", "feel", "overall", "average_rating"],
+        "order": "tasted_on DESC, journal_id DESC",
+        "date_column": "tasted_on",
+        "style_column": "style_id",
+    },
+    "favorites": {
+        "table": "favorite_breweries",
+        "columns": ["brewery_name", "city", "state", "country", "website_url"],
+        "output": ["brewery_name", "city", "state", "country", "website_url"],
+        "integer": [],
+        "numeric": [],
+        "order": "fav_id",
+        "date_column": None,
+        "style_column": None,
+    },
+}
+
+# ------------------------------
+# Queries
+# ------------------------------
+def build_export_query(dataset, user_id, date_range=None, styles=None):
+    spec = DATASETS[dataset]
+    clauses, params = ["user_id = ?"], [user_id]
+    if date_range and spec["date_column"]:
+        clauses.append(f"{spec['date_column']} BETWEEN ? AND ?")
+        params.extend(str(day) for day in date_range)
+    if styles and spec["style_column"]:
+        # The filter offers style names; the journal stores their ids
+        style_ids = [style_id for style_id, style in fetch_style_names().items() if style in styles]
+        clauses.append(f"{spec['style_column']} IN ({', '.join('?' * len(style_ids)) or 'NULL'})")
+        params.extend(style_ids)
+    query = f"""
+        SELECT {', '.join(spec['columns'])}
+        FROM {spec['table']}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY {spec['order']}
+    """
+    return query, params
+
+def iter_chunks(cursor, chunk_size=CHUNK_SIZE):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+def describe_journal(rows, style_names, conn=None):
+    # (beer_id, style_id, ...) -> (beer_id, beer_name, brewery_name, style, ...)
+    labels = fetch_beer_labels({row[0] for row in rows}, conn=conn)
+    return [
+        (beer_id, *labels.get(beer_id, (None, None)), style_names.get(style_id), *values)
+        for beer_id, style_id, *values in rows
+    ]
+
+def output_chunks(cursor, dataset, catalog_conn=None):
+    # catalog_conn reads the names when the export's own connection holds the
+    # catalog too; otherwise they come from the pool
+    if dataset != "journal":
+        yield from iter_chunks(cursor)
+        return
+    style_names = fetch_style_names(catalog_conn)
+    for rows in iter_chunks(cursor):
+        yield describe_journal(rows, style_names, catalog_conn)
+
+# ------------------------------
+# Writers
+# ------------------------------
+# Each writer consumes the rows a chunk at a time, so memory stays flat
+# however many rows the export has.
+def write_csv(chunks, columns, f):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+
+def parquet_schema(spec):
+    # pyarrow loads only when a Parquet export is built, not with the pages.
+    # The schema is fixed up front so a chunk of all-NULL values can't change
+    # a column's type.
+    import pyarrow as pa
+
+    def column_type(name):
+        if name in spec["integer"]:
+            return pa.int64()
+        return pa.float64() if name in spec["numeric"] else pa.string()
+
+    return pa.schema([(name, column_type(name)) for name in spec["output"]])
+
+def write_parquet(chunks, schema, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            writer.write_batch(pa.RecordBatch.from_pydict(
+                {name: [row[i] for row in rows] for i, name in enumerate(schema.names)}, schema=schema
+            ))
+
+def write_export(chunks, spec, fmt, path):
+    columns = spec["output"]
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            write_csv(chunks, columns, f)
+    elif fmt == "csv.gz":
+        with gzip.open(path, "wt", newline="", encoding="utf-8") as f:
+            write_csv(chunks, columns, f)
+    elif fmt == "parquet":
+        write_parquet(chunks, parquet_schema(spec), path)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+# ------------------------------
+# Cached artifacts
+# ------------------------------
+def artifact_prefix(dataset, user_id):
+    user_key = hashlib.sha256(str(user_id).encode()).hexdigest()[:16]
+    return os.path.join(EXPORT_DIR, f"{dataset}-{user_key}")
+
+def artifact_tag(revision, catalog_version):
+    # Journal exports carry beer and style names, so a catalog refresh
+    # retires them just as a change to the user's data does
+    return f"-r{revision}-c{catalog_version}-"
+
+def artifact_path(dataset, user_id, fmt, revision, catalog_version, date_range=None, styles=None):
+    filters = json.dumps([[str(day) for day in date_range or []], sorted(styles or [])])
+    filter_key = hashlib.sha256(filters.encode()).hexdigest()[:16]
+    tag = artifact_tag(revision, catalog_version)
+    return f"{artifact_prefix(dataset, user_id)}{tag}{filter_key}.{FORMATS[fmt][1]}"
+
+@timed(kind="loader")
+def export_dataset(dataset, user_id, fmt="csv", date_range=None, styles=None):
+    # Returns the path of an export file, reusing the cached one while the
+    # user's data and the catalog are unchanged. Revision, catalog version
+    # and rows are read in one snapshot.
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    query, params = build_export_query(dataset, user_id, date_range, styles)
+    storage = get_storage()
+    with storage.snapshot() as conn:
+        # The catalog is read through the snapshot's connection when it can
+        # be, rather than a second one from the pool
+        catalog_conn = conn if storage.holds_catalog else None
+        catalog_version = get_catalog_version(catalog_conn)
+        revision = storage.data_revision(conn, user_id, dataset)
+        path = artifact_path(dataset, user_id, fmt, revision, catalog_version, date_range, styles)
+        if os.path.exists(path):
+            return path
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            cursor = conn.execute(storage.sql(query), params)
+            write_export(output_chunks(cursor, dataset, catalog_conn), DATASETS[dataset], fmt, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # Artifacts from older revisions or catalogs can't be served again
+    tag = artifact_tag(revision, catalog_version)
+    for stale in glob.glob(f"{artifact_prefix(dataset, user_id)}-r*"):
+        if tag not in stale and not stale.endswith(".tmp"):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+@timed(kind="loader")
+def read_export(dataset, user_id, fmt="csv", date_range=None, styles=None):
+    path = export_dataset(dataset, user_id, fmt, date_range, styles)
+    with open(path, "rb") as f:
+        return f.read()
+
+def export_file_name(dataset, fmt):
+    names = {"journal": "tasting_journal", "favorites": "favorite_breweries"}
+    return f"{names[dataset]}.{FORMATS[fmt][1]}"
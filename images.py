@@ -0,0 +1,202 @@
+import os
+import io
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import timed
+from paths import CACHE_DIR, IMAGE_DIR
+
+THUMBNAIL_DIR = os.path.join(CACHE_DIR, "thumbnails")
+PLACEHOLDER = os.path.join(IMAGE_DIR, "placeholder-1.png")
+
+THUMBNAIL_SIZE = (320, 320)
+MEMORY_BUDGET_BYTES = 32 * 1024 * 1024
+MAX_WORKERS = 8
+REQUEST_TIMEOUT = 5
+MAX_DOWNLOAD_BYTES = 10 * 1024 * 1024
+FAILURE_TTL = 10 * 60   # don't retry a broken URL on every rerun
+MAX_FAILURES = 4096
+
+_memory = OrderedDict()
+_memory_bytes = 0
+_memory_lock = threading.Lock()
+_failures = OrderedDict()   # key -> time of failure, oldest first
+_failures_lock = threading.Lock()
+_placeholders = {}
+_session = None
+_session_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+# ------------------------------
+# Memory cache
+# ------------------------------
+# Encoded thumbnails, most recently used last. st.image serves bytes as-is,
+# so nothing is decoded or re-encoded on a rerun.
+def memory_get(key):
+    with _memory_lock:
+        data = _memory.get(key)
+        if data is not None:
+            _memory.move_to_end(key)
+        return data
+
+def memory_put(key, data):
+    global _memory_bytes
+    with _memory_lock:
+        if key in _memory:
+            _memory_bytes -= len(_memory.pop(key))
+        _memory[key] = data
+        _memory_bytes += len(data)
+        while _memory_bytes > MEMORY_BUDGET_BYTES and len(_memory) > 1:
+            _, evicted = _memory.popitem(last=False)
+            _memory_bytes -= len(evicted)
+
+def memory_usage():
+    with _memory_lock:
+        return len(_memory), _memory_bytes
+
+# ------------------------------
+# Broken sources
+# ------------------------------
+# Remembered for FAILURE_TTL, and at most MAX_FAILURES of them, so a catalog
+# full of dead links can't grow the table without bound
+def failed_recently(key):
+    with _failures_lock:
+        failed_at = _failures.get(key)
+        return failed_at is not None and time.time() - failed_at < FAILURE_TTL
+
+def record_failure(key):
+    now = time.time()
+    with _failures_lock:
+        _failures.pop(key, None)
+        _failures[key] = now
+        while _failures and (len(_failures) > MAX_FAILURES or now - next(iter(_failures.values())) >= FAILURE_TTL):
+            _failures.popitem(last=False)
+
+# ------------------------------
+# Disk cache
+# ------------------------------
+def cache_key(source, size=THUMBNAIL_SIZE):
+    # Local files are keyed on their contents' identity (size and mtime), so an
+    # edited image gets a new thumbnail; URLs are keyed on the URL itself.
+    if os.path.exists(source):
+        stat = os.stat(source)
+        source = f"{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(f"{source}|{size[0]}x{size[1]}".encode()).hexdigest()
+
+def thumbnail_path(key):
+    return os.path.join(THUMBNAIL_DIR, key[:2], f"{key}.thumb")
+
+def make_thumbnail(raw, size=THUMBNAIL_SIZE):
+    # Pillow loads only on a cache miss; warm reruns serve stored bytes
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(raw) if isinstance(raw, bytes) else raw)
+    image.draft("RGB", size)    # lets JPEG decode at reduced scale
+    image.thumbnail(size)
+    out = io.BytesIO()
+    if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+        image.convert("RGBA").save(out, format="PNG", optimize=True)
+    else:
+        image.convert("RGB").save(out, format="JPEG", quality=85, optimize=True)
+    return out.getvalue()
+
+def write_thumbnail(key, data):
+    path = thumbnail_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def read_thumbnail(key):
+    try:
+        with open(thumbnail_path(key), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+# ------------------------------
+# Fetching
+# ------------------------------
+def get_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+def get_executor():
+    # One pool for every session and rerun, like the HTTP session
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="thumbnails")
+        return _executor
+
+def download(url):
+    with get_session().get(url, timeout=REQUEST_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        raw = response.raw.read(MAX_DOWNLOAD_BYTES + 1, decode_content=True)
+    if len(raw) > MAX_DOWNLOAD_BYTES:
+        raise ValueError(f"Image too large: {url}")
+    return raw
+
+@timed(kind="loader")
+def load_thumbnail(source, size=THUMBNAIL_SIZE):
+    # Memory, then disk, then the source. Returns None when the source is
+    # missing or broken.
+    if not source:
+        return None
+    key = cache_key(source, size)
+    data = memory_get(key)
+    if data is not None:
+        return data
+    if failed_recently(key):
+        return None
+    data = read_thumbnail(key)
+    if data is None:
+        try:
+            if os.path.exists(source):
+                with open(source, "rb") as f:
+                    data = make_thumbnail(f, size)
+            else:
+                data = make_thumbnail(download(source), size)
+        except Exception:
+            record_failure(key)
+            return None
+        write_thumbnail(key, data)
+    memory_put(key, data)
+    return data
+
+def placeholder(size=THUMBNAIL_SIZE):
+    # Built once, then pinned outside the LRU so it is always served from memory
+    data = _placeholders.get(size)
+    if data is None:
+        data = _placeholders[size] = load_thumbnail(PLACEHOLDER, size)
+    return data
+
+@timed(kind="loader")
+def prefetch_thumbnails(sources, size=THUMBNAIL_SIZE):
+    # Fetches a page worth of images concurrently; returns {source: bytes}
+    # with the placeholder standing in for anything missing or broken.
+    unique = list(dict.fromkeys(s for s in sources if s))
+    thumbnails = dict(zip(unique, get_executor().map(lambda s: load_thumbnail(s, size), unique)))
+    fallback = placeholder(size)
+    return {source: thumbnails.get(source) or fallback for source in sources}
+
+@timed(kind="loader")
+def gallery_images(folder=IMAGE_DIR, size=THUMBNAIL_SIZE):
+    files = sorted(
+        os.path.join(folder, f) for f in os.listdir(folder) if f.endswith((".png", ".jpg", ".jpeg"))
+    )
+    return list(prefetch_thumbnails(files, size).values())
@@ -1,83 +1,73 @@
 import os
-import sqlite3
-import pandas as pd
+from functools import partial
 
-def initialize_database_if_needed():
+from db_utils import connection
+from migrations import apply_migrations
+from storage import get_storage
+from catalog_ingest import CSV_PATH, file_sha256, refresh_catalog, describe_changes
+from catalog_cache import catalog_path, export_catalog
+from recommender import index_path, build_flavor_index
+from catalog import resolve_beer_names, breweries_for_beer_names
+
+def report_legacy_leftovers(storage, unmatched, db_path=None):
+    # Rows whose beer name is shared by several breweries (or no longer in
+    # the catalog) wait in tasting_journal_legacy until they name a brewery
+    leftovers = storage.legacy_journal_leftovers()
+    breweries = breweries_for_beer_names({name for name, _, _ in leftovers}, db_path=db_path)
+    print(f"⚠️ {unmatched} old journal entries were kept aside in tasting_journal_legacy:")
+    for name, brewery, entries in leftovers:
+        candidates = breweries.get(name)
+        if not candidates:
+            reason = "not in the catalog"
+        elif brewery:
+            reason = f"no '{brewery}' in the catalog; brewed by {', '.join(candidates)}"
+        else:
+            reason = f"brewed by {', '.join(candidates)}"
+        print(f"   • {name} ({entries}): {reason}")
+    print("   To import them, set brewery_name on those rows to the right brewery, e.g.")
+    print("     UPDATE tasting_journal_legacy SET brewery_name = '<brewery>' WHERE beer_id = '<beer name>';")
+    print("   then run python init_db.py again.")
+
+def initialize_database_if_needed(db_path=None, csv_path=CSV_PATH):
     # # Delete old db
     # if os.path.exists('craft_beer.db'):
     #     os.remove('craft_beer.db')
 
-    conn = sqlite3.connect('craft_beer.db')
-    cursor = conn.cursor()
-
-    # Create tables
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS beers_catalog (
-        beer_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        beer_name TEXT,
-        brewery_name TEXT,
-        style TEXT,
-        abv REAL,
-        ibu REAL,
-        description TEXT
-    )
-    ''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS tasting_journal (
-        journal_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id TEXT,
-        beer_id TEXT,
-        style TEXT,
-        brewery_name TEXT,
-        abv REAL,
-        look REAL,
-        smell REAL,
-        taste REAL,
-        feel REAL,
-        overall REAL,
-        average_rating REAL,
-        user_notes TEXT,
-        tasted_on DATE DEFAULT CURRENT_DATE
-    )
-    ''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS favorite_breweries (
-        fav_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        brewery_name TEXT,
-        city TEXT,
-        state TEXT,
-        country TEXT,
-        website_url TEXT,
-        user_id TEXT
-    )
-    ''')
+    for version, name in apply_migrations(db_path):
+        print(f"🛠️ Applied migration {version}: {name}")
+    # Journals and favorites live elsewhere when BEER_DIARY_STORAGE=postgres
+    storage = get_storage(db_path=db_path)
+    if storage.name != "sqlite":
+        for version, name in storage.ensure_schema():
+            print(f"🛠️ Applied {storage.name} migration {version}: {name}")
 
-    # Load beers from CSV
-    df = pd.read_csv('beer_data_set.csv')
-    df = df[["Name", "Brewery", "Style", "ABV", "Min IBU", "Max IBU", "Description"]]
-    df = df.rename(columns={
-        "Name": "beer_name",
-        "Brewery": "brewery_name",
-        "Style": "style",
-        "ABV": "abv",
-        "Description": "description"
-    })
-    df['ibu'] = (df['Min IBU'].fillna(0) + df['Max IBU'].fillna(0)) / 2
-    df = df.drop(columns=["Min IBU", "Max IBU"])
-    df['abv'] = df['abv'].fillna(0)
-    df['ibu'] = df['ibu'].fillna(0)
-    df['description'] = df['description'].fillna('No description available.')
+    # Only rows that changed since the last load are written; an unchanged
+    # CSV is skipped entirely
+    version, changes = refresh_catalog(db_path, csv_path)
+    if changes is not None:
+        print(f"🔄 Catalog: {describe_changes(changes)} (version {version})")
 
-    for _, row in df.iterrows():
-        cursor.execute('''
-        INSERT INTO beers_catalog (beer_name, brewery_name, style, abv, ibu, description)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ''', (row['beer_name'], row['brewery_name'], row['style'], row['abv'], row['ibu'], row['description']))
+    # Journal rows from before beers had ids, matched by name now the catalog
+    # is loaded
+    imported, unmatched = storage.import_legacy_journal(partial(resolve_beer_names, db_path=db_path))
+    if imported:
+        print(f"📓 Imported {imported} journal entries from the old schema")
+    if unmatched:
+        report_legacy_leftovers(storage, unmatched, db_path)
 
-    conn.commit()
-    conn.close()
+    # Columnar copy the pages memory-map; rebuilt once per catalog version
+    if not os.path.exists(catalog_path(version, db_path)):
+        with connection(db_path) as conn:
+            export_catalog(conn, version, db_path)
+    # Flavor similarity index for recommendations; also once per version
+    if not os.path.exists(index_path(version, db_path)):
+        with connection(db_path) as conn:
+            build_flavor_index(conn, version, db_path)
 
-    print("✅ Database initialized on startup.")
+    if changes is None:
+        print("✅ Database already up to date.")
+    else:
+        print("✅ Database initialized on startup.")
 
+if __name__ == "__main__":
+    initialize_database_if_needed()
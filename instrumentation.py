@@ -0,0 +1,294 @@
+import os
+import io
+import time
+import atexit
+import sqlite3
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+from paths import CACHE_DIR
+
+# Off unless BEER_DIARY_PROFILE is set. Decorators return the function
+# untouched and span() hands back a shared no-op context, so a disabled build
+# pays one attribute lookup per block at most.
+ENABLED = os.environ.get("BEER_DIARY_PROFILE", "") not in ("", "0", "false")
+METRICS_PATH = os.environ.get("BEER_DIARY_METRICS_FILE", os.path.join(CACHE_DIR, "metrics.prom"))
+METRICS_INTERVAL = 5        # seconds between metrics file rewrites
+RECENT_RERUNS = 50          # reruns kept for the diagnostics view
+PROFILE_LINES = 30          # functions shown per profiled rerun
+SQL_LABEL_LENGTH = 80
+
+_stats = {}                 # (kind, name) -> [count, total seconds, max seconds]
+_stats_lock = threading.Lock()
+_reruns = deque(maxlen=RECENT_RERUNS)
+_local = threading.local()
+_metrics_written = [0.0]
+_NOOP = nullcontext()
+
+# ------------------------------
+# Recording
+# ------------------------------
+def record(kind, name, seconds):
+    with _stats_lock:
+        entry = _stats.get((kind, name))
+        if entry is None:
+            _stats[(kind, name)] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun["spans"].append((kind, name, seconds))
+        rerun["last"] = time.perf_counter()
+
+@contextmanager
+def _timed_block(kind, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, name, time.perf_counter() - started)
+
+def span(name, kind="block"):
+    return _timed_block(kind, name) if ENABLED else _NOOP
+
+def timed(name=None, kind="function"):
+    def decorate(func):
+        if not ENABLED:
+            return func
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(kind, label, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def snapshot():
+    with _stats_lock:
+        return {key: tuple(value) for key, value in _stats.items()}
+
+def recent_reruns():
+    return list(_reruns)
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+        _reruns.clear()
+    reset_sql()
+
+# ------------------------------
+# SQL timing
+# ------------------------------
+# Pooled connections are created from db_utils.CONNECTION_FACTORY. These
+# subclasses time execute and fetch calls per statement; the trace callback
+# also counts statements SQLite runs on its own, such as trigger bodies.
+sql_totals = {"seconds": 0.0, "statements": 0}
+
+@functools.lru_cache(maxsize=512)
+def sql_label(sql):
+    return " ".join(sql.split())[:SQL_LABEL_LENGTH]
+
+def record_sql(started, sql, statement=False):
+    elapsed = time.perf_counter() - started
+    with _stats_lock:
+        sql_totals["seconds"] += elapsed
+        sql_totals["statements"] += statement
+    record("sql", sql_label(sql), elapsed)
+
+def reset_sql():
+    with _stats_lock:
+        sql_totals.update(seconds=0.0, statements=0)
+    return sql_totals
+
+def trace_statement(sql):
+    with _stats_lock:
+        entry = _stats.setdefault(("sqlite", "statements traced"), [0, 0.0, 0.0])
+        entry[0] += 1
+
+class TimedCursor(sqlite3.Cursor):
+    sql = ""
+
+    def execute(self, sql, *args):
+        self.sql = sql
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            record_sql(started, sql, True)
+
+    def executemany(self, sql, *args):
+        self.sql = sql
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            record_sql(started, sql, True)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            record_sql(started, self.sql)
+
+    def fetchmany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(*args)
+        finally:
+            record_sql(started, self.sql)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            record_sql(started, self.sql)
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            record_sql(started, self.sql)
+
+class TimedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(trace_statement)
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+def connection_factory():
+    return TimedConnection if ENABLED else sqlite3.Connection
+
+# ------------------------------
+# Per-rerun capture
+# ------------------------------
+# A page calls begin_rerun() at the top and end_rerun() at the bottom. A rerun
+# cut short by st.stop() never reaches end_rerun(), so it is closed at its last
+# recorded span when the same session starts its next rerun.
+def start_profiler(kind):
+    if kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            kind = "cprofile"
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return kind, profiler
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None     # another profiler owns this thread
+    return "cprofile", profiler
+
+def stop_profiler(profiler):
+    kind, profiler = profiler
+    if kind == "pyinstrument":
+        profiler.stop()
+        return profiler.output_text(unicode=True, color=False)
+    import pstats
+    profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return out.getvalue()
+
+def begin_rerun(page):
+    if not ENABLED:
+        return None
+    import streamlit as st
+
+    previous = st.session_state.get("_instrumentation_rerun")
+    if previous is not None and previous["seconds"] is None:
+        finish_rerun(previous, previous["last"], stopped=True)
+    profile = st.query_params.get("profile")
+    rerun = {
+        "page": page,
+        "started_at": time.time(),
+        "started": time.perf_counter(),
+        "last": time.perf_counter(),
+        "seconds": None,
+        "stopped": False,
+        "spans": [],
+        "profiler": start_profiler(profile) if profile else None,
+        "profile": None,
+    }
+    st.session_state["_instrumentation_rerun"] = rerun
+    _local.rerun = rerun
+    return rerun
+
+def finish_rerun(rerun, ended, stopped=False):
+    if rerun["profiler"] is not None:
+        try:
+            rerun["profile"] = stop_profiler(rerun["profiler"])
+        except Exception as e:
+            rerun["profile"] = f"Profiler failed: {e}"
+        rerun["profiler"] = None
+    rerun["seconds"] = ended - rerun["started"]
+    rerun["stopped"] = stopped
+    record("rerun", rerun["page"], rerun["seconds"])
+    _reruns.append(rerun)
+    if time.time() - _metrics_written[0] > METRICS_INTERVAL:
+        write_metrics()
+
+def end_rerun():
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return
+    _local.rerun = None
+    finish_rerun(rerun, time.perf_counter())
+
+# ------------------------------
+# Prometheus text format
+# ------------------------------
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def metrics_text(stats=None):
+    stats = snapshot() if stats is None else stats
+    series = [
+        ("beer_diary_span_count_total", "counter", "Completed spans.", 0),
+        ("beer_diary_span_seconds_total", "counter", "Seconds spent in spans.", 1),
+        ("beer_diary_span_seconds_max", "gauge", "Slowest single span in seconds.", 2),
+    ]
+    lines = []
+    for metric, kind, help_text, field in series:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for (span_kind, name), values in sorted(stats.items()):
+            lines.append(f'{metric}{{kind="{escape_label(span_kind)}",name="{escape_label(name)}"}} {values[field]:.6g}')
+    return "\n".join(lines) + "\n"
+
+def write_metrics(path=METRICS_PATH):
+    _metrics_written[0] = time.time()
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(metrics_text())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Could not write metrics to {path}: {e}")
+
+if ENABLED:
+    atexit.register(write_metrics)
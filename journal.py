@@ -0,0 +1,238 @@
+import queue
+import time
+import atexit
+import logging
+import threading
+
+from storage import get_storage
+from instrumentation import timed
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.25   # how long the writer waits to gather a batch
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 0.1
+
+_writer = None
+_writer_lock = threading.Lock()
+
+log = logging.getLogger(__name__)
+
+def journal_row(user_id, entry):
+    return (
+        user_id,
+        entry["beer_id"], entry["style_id"], entry["abv"],
+        entry["look"], entry["smell"], entry["taste"], entry["feel"], entry["overall"],
+        entry["average_rating"], entry["user_notes"], entry["tasted_on"],
+    )
+
+@timed(kind="loader")
+def write_journal_rows(rows, storage=None):
+    # Rows already on file are skipped, so re-syncing is harmless
+    return (storage or get_storage()).add_journal_rows(rows)
+
+# ------------------------------
+# Session journal
+# ------------------------------
+# What this browser session has saved, keyed by (beer_id, tasted_on) like the
+# table's unique index. Entries stay in `dirty` until the database is seen to
+# have them; after that only their key is kept, so a session holds at most
+# its unsynced entries however much it has logged.
+JOURNAL_FIELDS = (
+    "beer_id", "style_id", "abv", "look", "smell", "taste", "feel", "overall",
+    "average_rating", "user_notes", "tasted_on",
+)
+
+class JournalEntry:
+    __slots__ = JOURNAL_FIELDS
+
+    def __init__(self, values):
+        for field in JOURNAL_FIELDS:
+            setattr(self, field, values[field])
+
+    def __getitem__(self, field):
+        # Read like the dict rows that come back from the database
+        return getattr(self, field)
+
+    @property
+    def key(self):
+        return (self.beer_id, self.tasted_on)
+
+class SessionJournal:
+    def __init__(self):
+        self.dirty = {}         # key -> JournalEntry, not yet seen in the database
+        self.saved = set()      # keys the database is known to have
+
+    def __len__(self):
+        return len(self.dirty) + len(self.saved)
+
+    def __contains__(self, key):
+        return key in self.dirty or key in self.saved
+
+    def add(self, values):
+        # Returns the new entry, or None when that beer was already logged
+        # for that day
+        entry = JournalEntry(values)
+        if entry.key in self:
+            return None
+        self.dirty[entry.key] = entry
+        return entry
+
+    def discard(self, beer_id, tasted_on):
+        self.dirty.pop((beer_id, tasted_on), None)
+        self.saved.discard((beer_id, tasted_on))
+
+    def mark_saved(self, keys):
+        for key in keys:
+            if self.dirty.pop(key, None) is not None:
+                self.saved.add(key)
+
+    def rows(self, user_id):
+        return [journal_row(user_id, entry) for entry in self.dirty.values()]
+
+    @timed("journal.SessionJournal.refresh", kind="loader")
+    def refresh(self, user_id, storage=None):
+        # Drops entries the database now has and returns the rest; one lookup
+        # sized by the unsynced entries, not the journal
+        if not self.dirty:
+            return []
+        beer_ids = list({beer_id for beer_id, _ in self.dirty})
+        stored = (storage or get_storage()).stored_journal_keys(user_id, beer_ids)
+        self.mark_saved([key for key in self.dirty if key in stored])
+        return list(self.dirty.values())
+
+def get_session_journal(session_state):
+    # Kept under its own key; sessions from before this class held a list
+    # under "journal"
+    journal = session_state.get("session_journal")
+    if journal is None:
+        journal = session_state["session_journal"] = SessionJournal()
+    return journal
+
+# ------------------------------
+# Write-behind writer
+# ------------------------------
+# Saves are queued in-process and a single background thread drains them, so
+# a burst of saves from many sessions becomes a handful of commits instead of
+# one connection and commit per click.
+class JournalWriter:
+    def __init__(self, storage=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.written = 0
+        self.commits = 0
+        self.last_error = None
+        # user_id -> {(beer_id, tasted_on)} given up on after MAX_RETRIES;
+        # the entries are still dirty in their session journal
+        self.dropped = {}
+        self.dropped_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True, name="journal-writer")
+        self.thread.start()
+
+    def submit(self, user_id, entry):
+        self.queue.put(journal_row(user_id, entry))
+
+    @timed("journal.JournalWriter.flush", kind="db")
+    def flush(self, timeout=None):
+        # Blocks until everything submitted so far is committed (or dropped
+        # after repeated failures); returns False on timeout
+        deadline = None if timeout is None else time.time() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                for attempt in range(MAX_RETRIES + 1):
+                    try:
+                        self.written += write_journal_rows(batch, self.storage)
+                        self.commits += 1
+                        self.last_error = None
+                        break
+                    except Exception as e:
+                        self.last_error = str(e)
+                        if attempt == MAX_RETRIES:
+                            log.error("Dropped %d journal entries after %d attempts", len(batch), attempt + 1,
+                                      exc_info=True)
+                            self.record_dropped(batch)
+                        else:
+                            time.sleep(BACKOFF_SECONDS * 2 ** attempt)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def record_dropped(self, rows):
+        with self.dropped_lock:
+            for row in rows:
+                self.dropped.setdefault(row[0], set()).add((row[1], row[-1]))
+
+    def dropped_keys(self, user_id):
+        with self.dropped_lock:
+            return set(self.dropped.get(user_id, ()))
+
+    def forget_dropped(self, user_id, keys):
+        # Once the entries are saved by a re-sync, or found in the table
+        with self.dropped_lock:
+            remaining = self.dropped.get(user_id, set()) - set(keys)
+            if remaining:
+                self.dropped[user_id] = remaining
+            else:
+                self.dropped.pop(user_id, None)
+
+    def status(self):
+        return {
+            "pending": self.queue.unfinished_tasks,
+            "written": self.written,
+            "commits": self.commits,
+            "last_error": self.last_error,
+        }
+
+def get_journal_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = JournalWriter()
+            atexit.register(_writer.flush, timeout=10)
+        return _writer
+
+# ------------------------------
+# Reading the journal
+# ------------------------------
+@timed(kind="loader")
+def fetch_journal_page(user_id, after=None, limit=20, storage=None):
+    # Returns (rows, cursor of the next page or None). `after` is the
+    # (tasted_on, journal_id) of the last row on the previous page.
+    rows = (storage or get_storage()).journal_page(user_id, after, limit + 1)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1]["tasted_on"], rows[-1]["journal_id"])
+    return rows, None
+
+def merge_into_window(rows, pending, first_page, last_page):
+    # Places pending session entries on the page whose tasted_on range they
+    # fall into, newest first
+    newest = None if first_page or not rows else rows[0]["tasted_on"]
+    oldest = None if last_page or not rows else rows[-1]["tasted_on"]
+    visible = [
+        entry for entry in pending
+        if (newest is None or entry["tasted_on"] <= newest) and (oldest is None or entry["tasted_on"] > oldest)
+    ]
+    return sorted(rows + visible, key=lambda entry: entry["tasted_on"], reverse=True)
@@ -0,0 +1,727 @@
+import json
+
+import numpy as np
+
+from db_utils import connection, transaction, set_meta
+
+# Bumps the owner's revision in user_data_changes on every write to `table`
+def user_data_triggers(table, dataset):
+    return [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_changes_{event.lower()} AFTER {event} ON {table} BEGIN
+            INSERT INTO user_data_changes (user_id, dataset, revision, modified_at)
+            SELECT user_id, '{dataset}', 1, (julianday('now') - 2440587.5) * 86400.0
+            FROM (SELECT {row}.user_id AS user_id {"UNION SELECT new.user_id" if event == "UPDATE" else ""})
+            WHERE true
+            ON CONFLICT (user_id, dataset) DO UPDATE SET
+                revision = revision + 1, modified_at = excluded.modified_at;
+        END
+        '''
+        for event, row in (("INSERT", "new"), ("UPDATE", "old"), ("DELETE", "old"))
+    ]
+
+# ------------------------------
+# Steps frozen at their migration
+# ------------------------------
+# Steps that fill tables or create triggers keep their own copy of the code
+# as it was when the migration shipped, so a fresh database and an upgraded
+# one end up with the same schema whatever style_stats, analytics or storage
+# look like later. None of these may change.
+def refresh_style_stats_v6(conn):
+    # Per-style stats with a 200-bin ABV histogram and the first three
+    # breweries, as style_stats.refresh_style_stats wrote them
+    cursor = conn.cursor()
+    lo, hi = cursor.execute("SELECT MIN(abv), MAX(abv) FROM beers_catalog").fetchone()
+    lo, hi = lo or 0.0, hi or 0.0
+    if hi <= lo:
+        hi = lo + 1.0
+    edges = np.linspace(lo, hi, 201)
+    stats = cursor.execute('''
+        SELECT style, COUNT(*), SUM(abv), MIN(abv), MAX(abv), SUM(ibu), MIN(ibu), MAX(ibu)
+        FROM beers_catalog WHERE style IS NOT NULL
+        GROUP BY style ORDER BY style
+    ''').fetchall()
+    histograms = {row[0]: [0] * 200 for row in stats}
+    for style, bin_index, count in cursor.execute('''
+        SELECT style, MIN(MAX(CAST((abv - ?) / ? AS INTEGER), 0), ?) AS bin, COUNT(*)
+        FROM beers_catalog WHERE style IS NOT NULL
+        GROUP BY style, bin
+    ''', (float(edges[0]), float(edges[1] - edges[0]), 199)).fetchall():
+        histograms[style][bin_index] = count
+    breweries = {row[0]: [] for row in stats}
+    for style, brewery_name in cursor.execute('''
+        SELECT style, brewery_name FROM (
+            SELECT style, brewery_name,
+                   ROW_NUMBER() OVER (PARTITION BY style ORDER BY MIN(beer_id)) AS rank
+            FROM beers_catalog WHERE style IS NOT NULL AND brewery_name != ''
+            GROUP BY style, brewery_name
+        )
+        WHERE rank <= 3
+        ORDER BY style, rank
+    ''').fetchall():
+        breweries[style].append(brewery_name)
+    set_meta(cursor, 'abv_histogram_edges', json.dumps(edges.tolist()))
+    cursor.execute("DELETE FROM style_stats")
+    cursor.executemany(
+        "INSERT INTO style_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(*row, json.dumps(histograms[row[0]]), json.dumps(breweries[row[0]])) for row in stats],
+    )
+
+ROLLUP_SCORE_COLUMNS = ["look", "smell", "taste", "feel", "overall"]
+ROLLUP_SCORE_DIMENSIONS = ROLLUP_SCORE_COLUMNS + ["average_rating"]
+
+def journal_rollup_statements_v11(row, sign):
+    # analytics.rollup_statements while the journal rolled up by style name
+    user = f"COALESCE({row}.user_id, '')"
+    has_abv = f"CASE WHEN {row}.abv IS NULL THEN 0 ELSE 1 END"
+    style_sums = ", ".join(f"{sign} * COALESCE({row}.{column}, 0)" for column in ROLLUP_SCORE_COLUMNS)
+    style_updates = ", ".join(
+        f"{column}_sum = journal_style_stats.{column}_sum + excluded.{column}_sum" for column in ROLLUP_SCORE_COLUMNS
+    )
+    dimensions = " UNION ALL ".join(
+        f"SELECT '{column}' AS dimension, {row}.{column} AS score" for column in ROLLUP_SCORE_DIMENSIONS
+    )
+    return [
+        f'''
+        INSERT INTO journal_style_stats (
+            user_id, style, entry_count, {", ".join(f"{column}_sum" for column in ROLLUP_SCORE_COLUMNS)},
+            rating_sum, rating_sq_sum, abv_sum, abv_count
+        ) VALUES (
+            {user}, COALESCE({row}.style, ''), {sign}, {style_sums},
+            {sign} * COALESCE({row}.average_rating, 0), {sign} * COALESCE({row}.average_rating, 0) * COALESCE({row}.average_rating, 0),
+            {sign} * COALESCE({row}.abv, 0), {sign} * {has_abv}
+        )
+        ON CONFLICT (user_id, style) DO UPDATE SET
+            entry_count = journal_style_stats.entry_count + excluded.entry_count, {style_updates},
+            rating_sum = journal_style_stats.rating_sum + excluded.rating_sum,
+            rating_sq_sum = journal_style_stats.rating_sq_sum + excluded.rating_sq_sum,
+            abv_sum = journal_style_stats.abv_sum + excluded.abv_sum,
+            abv_count = journal_style_stats.abv_count + excluded.abv_count
+        ''',
+        f'''
+        INSERT INTO journal_monthly_stats (user_id, month, entry_count, rating_sum, abv_sum, abv_count)
+        VALUES (
+            {user}, COALESCE(substr({row}.tasted_on, 1, 7), ''), {sign},
+            {sign} * COALESCE({row}.average_rating, 0), {sign} * COALESCE({row}.abv, 0), {sign} * {has_abv}
+        )
+        ON CONFLICT (user_id, month) DO UPDATE SET
+            entry_count = journal_monthly_stats.entry_count + excluded.entry_count,
+            rating_sum = journal_monthly_stats.rating_sum + excluded.rating_sum,
+            abv_sum = journal_monthly_stats.abv_sum + excluded.abv_sum,
+            abv_count = journal_monthly_stats.abv_count + excluded.abv_count
+        ''',
+        f'''
+        INSERT INTO journal_score_counts (user_id, dimension, score, entry_count)
+        SELECT {user}, dimension, ROUND(score * 2) / 2.0, {sign}
+        FROM ({dimensions}) AS scores
+        WHERE score IS NOT NULL
+        ON CONFLICT (user_id, dimension, score) DO UPDATE SET
+            entry_count = journal_score_counts.entry_count + excluded.entry_count
+        ''',
+    ]
+
+def create_rollup_triggers(conn, statements):
+    # One trigger per write on tasting_journal running statements(row, sign)
+    events = {
+        "insert": ("INSERT", [("new", 1)]),
+        "update": ("UPDATE", [("old", -1), ("new", 1)]),
+        "delete": ("DELETE", [("old", -1)]),
+    }
+    for name, (event, changes) in events.items():
+        body = ";\n".join(statement for row, sign in changes for statement in statements(row, sign))
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS tasting_journal_rollup_{name} AFTER {event} ON tasting_journal BEGIN
+            {body};
+            END
+        ''')
+
+def create_journal_rollup_triggers_v11(conn):
+    # Dropped with the old tasting_journal by migration 13
+    create_rollup_triggers(conn, journal_rollup_statements_v11)
+
+def rebuild_journal_rollups_v11(conn):
+    # Full recompute for a journal that predates the rollup tables
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM journal_style_stats")
+    cursor.execute("DELETE FROM journal_monthly_stats")
+    cursor.execute("DELETE FROM journal_score_counts")
+    cursor.execute(f'''
+        INSERT INTO journal_style_stats
+        SELECT IFNULL(user_id, ''), IFNULL(style, ''), COUNT(*),
+               {", ".join(f"TOTAL({column})" for column in ROLLUP_SCORE_COLUMNS)},
+               TOTAL(average_rating), TOTAL(average_rating * average_rating), TOTAL(abv), COUNT(abv)
+        FROM tasting_journal
+        GROUP BY 1, 2
+    ''')
+    cursor.execute('''
+        INSERT INTO journal_monthly_stats
+        SELECT IFNULL(user_id, ''), IFNULL(substr(tasted_on, 1, 7), ''), COUNT(*),
+               TOTAL(average_rating), TOTAL(abv), COUNT(abv)
+        FROM tasting_journal
+        GROUP BY 1, 2
+    ''')
+    for column in ROLLUP_SCORE_DIMENSIONS:
+        cursor.execute(f'''
+            INSERT INTO journal_score_counts
+            SELECT IFNULL(user_id, ''), '{column}', ROUND({column} * 2) / 2.0, COUNT(*)
+            FROM tasting_journal
+            WHERE {column} IS NOT NULL
+            GROUP BY 1, 3
+        ''')
+
+def journal_rollup_statements_v13(row, sign):
+    # analytics.rollup_statements once the journal rolled up by style id
+    user = f"COALESCE({row}.user_id, '')"
+    has_abv = f"CASE WHEN {row}.abv IS NULL THEN 0 ELSE 1 END"
+    style_sums = ", ".join(f"{sign} * COALESCE({row}.{column}, 0)" for column in ROLLUP_SCORE_COLUMNS)
+    style_updates = ", ".join(
+        f"{column}_sum = journal_style_stats.{column}_sum + excluded.{column}_sum" for column in ROLLUP_SCORE_COLUMNS
+    )
+    dimensions = " UNION ALL ".join(
+        f"SELECT '{column}' AS dimension, {row}.{column} AS score" for column in ROLLUP_SCORE_DIMENSIONS
+    )
+    return [
+        f'''
+        INSERT INTO journal_style_stats (
+            user_id, style_id, entry_count, {", ".join(f"{column}_sum" for column in ROLLUP_SCORE_COLUMNS)},
+            rating_sum, rating_sq_sum, abv_sum, abv_count
+        ) VALUES (
+            {user}, {row}.style_id, {sign}, {style_sums},
+            {sign} * COALESCE({row}.average_rating, 0), {sign} * COALESCE({row}.average_rating, 0) * COALESCE({row}.average_rating, 0),
+            {sign} * COALESCE({row}.abv, 0), {sign} * {has_abv}
+        )
+        ON CONFLICT (user_id, style_id) DO UPDATE SET
+            entry_count = journal_style_stats.entry_count + excluded.entry_count, {style_updates},
+            rating_sum = journal_style_stats.rating_sum + excluded.rating_sum,
+            rating_sq_sum = journal_style_stats.rating_sq_sum + excluded.rating_sq_sum,
+            abv_sum = journal_style_stats.abv_sum + excluded.abv_sum,
+            abv_count = journal_style_stats.abv_count + excluded.abv_count
+        ''',
+        f'''
+        INSERT INTO journal_monthly_stats (user_id, month, entry_count, rating_sum, abv_sum, abv_count)
+        VALUES (
+            {user}, COALESCE(substr({row}.tasted_on, 1, 7), ''), {sign},
+            {sign} * COALESCE({row}.average_rating, 0), {sign} * COALESCE({row}.abv, 0), {sign} * {has_abv}
+        )
+        ON CONFLICT (user_id, month) DO UPDATE SET
+            entry_count = journal_monthly_stats.entry_count + excluded.entry_count,
+            rating_sum = journal_monthly_stats.rating_sum + excluded.rating_sum,
+            abv_sum = journal_monthly_stats.abv_sum + excluded.abv_sum,
+            abv_count = journal_monthly_stats.abv_count + excluded.abv_count
+        ''',
+        f'''
+        INSERT INTO journal_score_counts (user_id, dimension, score, entry_count)
+        SELECT {user}, dimension, ROUND(score * 2) / 2.0, {sign}
+        FROM ({dimensions}) AS scores
+        WHERE score IS NOT NULL
+        ON CONFLICT (user_id, dimension, score) DO UPDATE SET
+            entry_count = journal_score_counts.entry_count + excluded.entry_count
+        ''',
+    ]
+
+def create_journal_rollup_triggers_v13(conn):
+    create_rollup_triggers(conn, journal_rollup_statements_v13)
+
+def preserve_legacy_journal_v13(conn):
+    # Keeps a copy of a journal that still names its beers, so the table can
+    # be recreated with integer ids
+    if conn.execute("SELECT 1 FROM tasting_journal LIMIT 1").fetchone() is not None:
+        conn.execute("CREATE TABLE tasting_journal_legacy AS SELECT * FROM tasting_journal")
+
+# ------------------------------
+# Schema migrations
+# ------------------------------
+# Each entry is (version, name, statements). The applied version is kept in
+# SQLite's PRAGMA user_version, so every migration runs exactly once per
+# database. Append new migrations at the end; never edit an applied one.
+MIGRATIONS = [
+    (1, "baseline tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS beers_catalog (
+            beer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            beer_name TEXT,
+            brewery_name TEXT,
+            style TEXT,
+            abv REAL,
+            ibu REAL,
+            description TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tasting_journal (
+            journal_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            beer_id TEXT,
+            style TEXT,
+            brewery_name TEXT,
+            abv REAL,
+            look REAL,
+            smell REAL,
+            taste REAL,
+            feel REAL,
+            overall REAL,
+            average_rating REAL,
+            user_notes TEXT,
+            tasted_on DATE DEFAULT CURRENT_DATE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS favorite_breweries (
+            fav_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            brewery_name TEXT,
+            city TEXT,
+            state TEXT,
+            country TEXT,
+            website_url TEXT,
+            user_id TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''',
+    ]),
+    (2, "unique catalog key", [
+        # Older databases got a full copy of the CSV appended on every start
+        "UPDATE beers_catalog SET beer_name = '' WHERE beer_name IS NULL",
+        "UPDATE beers_catalog SET brewery_name = '' WHERE brewery_name IS NULL",
+        '''
+        DELETE FROM beers_catalog
+        WHERE beer_id NOT IN (
+            SELECT MIN(beer_id) FROM beers_catalog GROUP BY beer_name, brewery_name
+        )
+        ''',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_beers_catalog_name_brewery
+        ON beers_catalog (beer_name, brewery_name)
+        ''',
+    ]),
+    (3, "journal and favorites indexes", [
+        '''
+        DELETE FROM tasting_journal
+        WHERE journal_id NOT IN (
+            SELECT MIN(journal_id) FROM tasting_journal GROUP BY user_id, beer_id, tasted_on
+        )
+        ''',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_tasting_journal_user_beer_date
+        ON tasting_journal (user_id, beer_id, tasted_on)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_tasting_journal_user_tasted_on
+        ON tasting_journal (user_id, tasted_on)
+        ''',
+        '''
+        DELETE FROM favorite_breweries
+        WHERE fav_id NOT IN (
+            SELECT MIN(fav_id) FROM favorite_breweries GROUP BY user_id, brewery_name, IFNULL(city, '')
+        )
+        ''',
+        # Breweries without a city still count as one favorite per user
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_favorite_breweries_user_brewery_city
+        ON favorite_breweries (user_id, brewery_name, IFNULL(city, ''))
+        ''',
+    ]),
+    (4, "full-text search index", [
+        # External-content FTS5 table: the text lives once, in beers_catalog
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS beers_fts USING fts5(
+            beer_name, brewery_name, style, description,
+            content='beers_catalog', content_rowid='beer_id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS beers_catalog_fts_insert AFTER INSERT ON beers_catalog BEGIN
+            INSERT INTO beers_fts (rowid, beer_name, brewery_name, style, description)
+            VALUES (new.beer_id, new.beer_name, new.brewery_name, new.style, new.description);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS beers_catalog_fts_delete AFTER DELETE ON beers_catalog BEGIN
+            INSERT INTO beers_fts (beers_fts, rowid, beer_name, brewery_name, style, description)
+            VALUES ('delete', old.beer_id, old.beer_name, old.brewery_name, old.style, old.description);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS beers_catalog_fts_update AFTER UPDATE ON beers_catalog BEGIN
+            INSERT INTO beers_fts (beers_fts, rowid, beer_name, brewery_name, style, description)
+            VALUES ('delete', old.beer_id, old.beer_name, old.brewery_name, old.style, old.description);
+            INSERT INTO beers_fts (rowid, beer_name, brewery_name, style, description)
+            VALUES (new.beer_id, new.beer_name, new.brewery_name, new.style, new.description);
+        END
+        ''',
+        "INSERT INTO beers_fts (beers_fts) VALUES ('rebuild')",
+    ]),
+    (5, "catalog filter indexes", [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_beers_catalog_style_abv
+        ON beers_catalog (style, abv)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_beers_catalog_abv
+        ON beers_catalog (abv)
+        ''',
+        "ANALYZE",
+    ]),
+    (6, "materialized style aggregates", [
+        '''
+        CREATE TABLE IF NOT EXISTS style_stats (
+            style TEXT PRIMARY KEY,
+            beer_count INTEGER,
+            abv_sum REAL,
+            abv_min REAL,
+            abv_max REAL,
+            ibu_sum REAL,
+            ibu_min REAL,
+            ibu_max REAL,
+            abv_histogram TEXT,
+            sample_breweries TEXT
+        )
+        ''',
+        refresh_style_stats_v6,
+    ]),
+    (7, "local brewery store", [
+        # brewery_key is a stable integer rowid; id is OpenBreweryDB's UUID
+        '''
+        CREATE TABLE IF NOT EXISTS breweries (
+            brewery_key INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            name TEXT,
+            brewery_type TEXT,
+            city TEXT,
+            state TEXT,
+            country TEXT,
+            latitude REAL,
+            longitude REAL,
+            website_url TEXT,
+            sync_page INTEGER,
+            synced_at REAL
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_breweries_sync_page
+        ON breweries (sync_page)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_breweries_name
+        ON breweries (name)
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS brewery_sync_pages (
+            page INTEGER PRIMARY KEY,
+            per_page INTEGER,
+            etag TEXT,
+            fetched_at REAL
+        )
+        ''',
+    ]),
+    (8, "brewery spatial index", [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS breweries_rtree USING rtree(
+            brewery_key, min_lat, max_lat, min_lon, max_lon
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS breweries_rtree_insert AFTER INSERT ON breweries
+        WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+            INSERT OR REPLACE INTO breweries_rtree
+            VALUES (new.brewery_key, new.latitude, new.latitude, new.longitude, new.longitude);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS breweries_rtree_update AFTER UPDATE OF latitude, longitude ON breweries BEGIN
+            DELETE FROM breweries_rtree WHERE brewery_key = old.brewery_key;
+            INSERT INTO breweries_rtree
+            SELECT new.brewery_key, new.latitude, new.latitude, new.longitude, new.longitude
+            WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS breweries_rtree_delete AFTER DELETE ON breweries BEGIN
+            DELETE FROM breweries_rtree WHERE brewery_key = old.brewery_key;
+        END
+        ''',
+        '''
+        INSERT OR REPLACE INTO breweries_rtree
+        SELECT brewery_key, latitude, latitude, longitude, longitude FROM breweries
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_breweries_state_city
+        ON breweries (state, city)
+        ''',
+    ]),
+    (9, "beer image urls", [
+        "ALTER TABLE beers_catalog ADD COLUMN image_url TEXT",
+    ]),
+    # A per-user revision for each dataset, bumped by triggers on every write,
+    # so derived artifacts (exports) can be keyed on it without scanning rows
+    (10, "user data revisions", [
+        '''
+        CREATE TABLE IF NOT EXISTS user_data_changes (
+            user_id TEXT NOT NULL,
+            dataset TEXT NOT NULL,
+            revision INTEGER NOT NULL,
+            modified_at REAL NOT NULL,
+            PRIMARY KEY (user_id, dataset)
+        )
+        ''',
+        *user_data_triggers("tasting_journal", "journal"),
+        *user_data_triggers("favorite_breweries", "favorites"),
+        '''
+        INSERT OR IGNORE INTO user_data_changes (user_id, dataset, revision, modified_at)
+        SELECT user_id, 'journal', 1, (julianday('now') - 2440587.5) * 86400.0
+        FROM tasting_journal WHERE user_id IS NOT NULL GROUP BY user_id
+        ''',
+        '''
+        INSERT OR IGNORE INTO user_data_changes (user_id, dataset, revision, modified_at)
+        SELECT user_id, 'favorites', 1, (julianday('now') - 2440587.5) * 86400.0
+        FROM favorite_breweries WHERE user_id IS NOT NULL GROUP BY user_id
+        ''',
+    ]),
+    (11, "journal analytics rollups", [
+        '''
+        CREATE TABLE IF NOT EXISTS journal_style_stats (
+            user_id TEXT NOT NULL,
+            style TEXT NOT NULL,
+            entry_count INTEGER NOT NULL,
+            look_sum REAL NOT NULL,
+            smell_sum REAL NOT NULL,
+            taste_sum REAL NOT NULL,
+            feel_sum REAL NOT NULL,
+            overall_sum REAL NOT NULL,
+            rating_sum REAL NOT NULL,
+            rating_sq_sum REAL NOT NULL,
+            abv_sum REAL NOT NULL,
+            abv_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, style)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS journal_monthly_stats (
+            user_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            entry_count INTEGER NOT NULL,
+            rating_sum REAL NOT NULL,
+            abv_sum REAL NOT NULL,
+            abv_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, month)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS journal_score_counts (
+            user_id TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            score REAL NOT NULL,
+            entry_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, dimension, score)
+        )
+        ''',
+        create_journal_rollup_triggers_v11,
+        rebuild_journal_rollups_v11,
+    ]),
+    (12, "beer flavor profiles", [
+        *[
+            f"ALTER TABLE beers_catalog ADD COLUMN {column} REAL"
+            for column in ["ave_rating", "astringency", "body", "alcohol", "bitter", "sweet", "sour",
+                           "salty", "fruits", "hoppy", "spices", "malty"]
+        ],
+        # Forces the next startup to reload the CSV and fill the new columns
+        "DELETE FROM catalog_meta WHERE key = 'csv_sha256'",
+    ]),
+    # Beers are identified by the CSV's integer key instead of their name, and
+    # style and brewery names move to dimension tables (catalog_breweries,
+    # since `breweries` is the OpenBreweryDB store). The catalog is rebuilt
+    # from the CSV on the next load; journal entries are set aside and matched
+    # to the new ids by name afterwards (Storage.import_legacy_journal).
+    (13, "normalized catalog and journal", [
+        '''
+        CREATE TABLE IF NOT EXISTS styles (
+            style_id INTEGER PRIMARY KEY,
+            style TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS catalog_breweries (
+            brewery_id INTEGER PRIMARY KEY,
+            brewery_name TEXT NOT NULL UNIQUE
+        )
+        ''',
+        # Dropping the tables takes their triggers and indexes with them
+        "DROP TABLE IF EXISTS beers_fts",
+        "DROP TABLE beers_catalog",
+        '''
+        CREATE TABLE beers_catalog (
+            beer_id INTEGER PRIMARY KEY,
+            beer_name TEXT NOT NULL,
+            brewery_id INTEGER NOT NULL REFERENCES catalog_breweries (brewery_id),
+            style_id INTEGER NOT NULL REFERENCES styles (style_id),
+            abv REAL,
+            ibu REAL,
+            description TEXT,
+            image_url TEXT,
+            ave_rating REAL,
+            astringency REAL, body REAL, alcohol REAL, bitter REAL, sweet REAL, sour REAL,
+            salty REAL, fruits REAL, hoppy REAL, spices REAL, malty REAL
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_beers_catalog_style_abv
+        ON beers_catalog (style_id, abv)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_beers_catalog_abv
+        ON beers_catalog (abv)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_beers_catalog_brewery
+        ON beers_catalog (brewery_id)
+        ''',
+        # The catalog with its names joined back in, for listings and search
+        '''
+        CREATE VIEW IF NOT EXISTS beer_details AS
+        SELECT b.*, br.brewery_name, s.style
+        FROM beers_catalog b
+        JOIN catalog_breweries br ON br.brewery_id = b.brewery_id
+        JOIN styles s ON s.style_id = b.style_id
+        ''',
+        # FTS reads its text through the view; a renamed style is picked up by
+        # the 'rebuild' the catalog load runs in that case
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS beers_fts USING fts5(
+            beer_name, brewery_name, style, description,
+            content='beer_details', content_rowid='beer_id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS beers_catalog_fts_insert AFTER INSERT ON beers_catalog BEGIN
+            INSERT INTO beers_fts (rowid, beer_name, brewery_name, style, description)
+            SELECT beer_id, beer_name, brewery_name, style, description FROM beer_details WHERE beer_id = new.beer_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS beers_catalog_fts_delete AFTER DELETE ON beers_catalog BEGIN
+            INSERT INTO beers_fts (beers_fts, rowid, beer_name, brewery_name, style, description)
+            VALUES ('delete', old.beer_id, old.beer_name,
+                    (SELECT brewery_name FROM catalog_breweries WHERE brewery_id = old.brewery_id),
+                    (SELECT style FROM styles WHERE style_id = old.style_id), old.description);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS beers_catalog_fts_update AFTER UPDATE ON beers_catalog BEGIN
+            INSERT INTO beers_fts (beers_fts, rowid, beer_name, brewery_name, style, description)
+            VALUES ('delete', old.beer_id, old.beer_name,
+                    (SELECT brewery_name FROM catalog_breweries WHERE brewery_id = old.brewery_id),
+                    (SELECT style FROM styles WHERE style_id = old.style_id), old.description);
+            INSERT INTO beers_fts (rowid, beer_name, brewery_name, style, description)
+            SELECT beer_id, beer_name, brewery_name, style, description FROM beer_details WHERE beer_id = new.beer_id;
+        END
+        ''',
+        "DELETE FROM style_stats",
+        preserve_legacy_journal_v13,
+        "DROP TABLE tasting_journal",
+        '''
+        CREATE TABLE tasting_journal (
+            journal_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            beer_id INTEGER NOT NULL,
+            style_id INTEGER NOT NULL,
+            abv REAL,
+            look REAL,
+            smell REAL,
+            taste REAL,
+            feel REAL,
+            overall REAL,
+            average_rating REAL,
+            user_notes TEXT,
+            tasted_on DATE DEFAULT CURRENT_DATE
+        )
+        ''',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_tasting_journal_user_beer_date
+        ON tasting_journal (user_id, beer_id, tasted_on)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_tasting_journal_user_tasted_on
+        ON tasting_journal (user_id, tasted_on)
+        ''',
+        *user_data_triggers("tasting_journal", "journal"),
+        # Rollups start empty and fill up as the old entries are imported
+        "DROP TABLE journal_style_stats",
+        '''
+        CREATE TABLE journal_style_stats (
+            user_id TEXT NOT NULL,
+            style_id INTEGER NOT NULL,
+            entry_count INTEGER NOT NULL,
+            look_sum REAL NOT NULL,
+            smell_sum REAL NOT NULL,
+            taste_sum REAL NOT NULL,
+            feel_sum REAL NOT NULL,
+            overall_sum REAL NOT NULL,
+            rating_sum REAL NOT NULL,
+            rating_sq_sum REAL NOT NULL,
+            abv_sum REAL NOT NULL,
+            abv_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, style_id)
+        )
+        ''',
+        "DELETE FROM journal_monthly_stats",
+        "DELETE FROM journal_score_counts",
+        create_journal_rollup_triggers_v13,
+        "DELETE FROM catalog_meta WHERE key = 'csv_sha256'",
+    ]),
+    # Hash of each beer's CSV row, so a refresh only writes the rows that
+    # changed. Every row is written once more on the next load to fill it in.
+    # Edits to ABV, ratings or flavors no longer reindex the beer for search.
+    (14, "catalog row hashes", [
+        "ALTER TABLE beers_catalog ADD COLUMN row_hash INTEGER",
+        "DROP TRIGGER beers_catalog_fts_update",
+        '''
+        CREATE TRIGGER beers_catalog_fts_update AFTER UPDATE ON beers_catalog
+        WHEN old.beer_name IS NOT new.beer_name OR old.brewery_id IS NOT new.brewery_id
+            OR old.style_id IS NOT new.style_id OR old.description IS NOT new.description
+        BEGIN
+            INSERT INTO beers_fts (beers_fts, rowid, beer_name, brewery_name, style, description)
+            VALUES ('delete', old.beer_id, old.beer_name,
+                    (SELECT brewery_name FROM catalog_breweries WHERE brewery_id = old.brewery_id),
+                    (SELECT style FROM styles WHERE style_id = old.style_id), old.description);
+            INSERT INTO beers_fts (rowid, beer_name, brewery_name, style, description)
+            SELECT beer_id, beer_name, brewery_name, style, description FROM beer_details WHERE beer_id = new.beer_id;
+        END
+        ''',
+        "DELETE FROM catalog_meta WHERE key = 'csv_sha256'",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(db_path=None):
+    with connection(db_path) as conn:
+        if get_schema_version(conn) >= LATEST_VERSION:
+            return []
+
+    applied = []
+    for version, name, statements in MIGRATIONS:
+        # One transaction per migration; the version is re-checked under the
+        # write lock so concurrent starts don't apply the same step twice.
+        with transaction(db_path) as conn:
+            if get_schema_version(conn) >= version:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+        applied.append((version, name))
+    return applied
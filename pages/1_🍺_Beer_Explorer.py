@@ -5,57 +5,49 @@ from theme_utils import get_app_theme
 base, text_color, bg_color, card_color, plotly_template = get_app_theme()
 
 
-import sqlite3
-import pandas as pd
 import datetime
-import requests
-from PIL import Image
-from io import BytesIO
-from pathlib import Path
 
-# ------------------------------
-# Fallback Image Loader
-# ------------------------------
-def load_image_safe(url, fallback_filename="placeholder-1.png"):
-    fallback_path = Path("static/images") / fallback_filename
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        return Image.open(BytesIO(response.content))
-    except Exception:
-        return Image.open(fallback_path)
+from journal import get_journal_writer, get_session_journal
+from catalog import get_catalog_version, get_filter_options, count_beers, fetch_beer_page, fetch_descriptions, fetch_beer_labels
+from recommender import load_flavor_index, similar_beers, recommend_for_user
+from images import prefetch_thumbnails, THUMBNAIL_SIZE
+from storage import current_user_id
+from result_cache import canonical_filters, filter_key, cached_rows, cached_scalar
+from instrumentation import begin_rerun, end_rerun, span
+
+begin_rerun("Beer Explorer")
+
+USER_ID = current_user_id()
 
 # ------------------------------
-# Database connection
+# Database access
 # ------------------------------
-def get_connection():
-    return sqlite3.connect('craft_beer.db')
-
 @st.cache_data(show_spinner=False)
-def load_beers():
+def load_filter_options(catalog_version):
+    # catalog_version only keys the cache, so a refreshed catalog is reread
     try:
-        conn = get_connection()
-        df = pd.read_sql_query('SELECT * FROM beers_catalog', conn)
-        conn.close()
-        return df
+        return get_filter_options()
     except Exception as e:
         st.error(f"⚠️ Failed to load beers: {e}")
-        return pd.DataFrame()
+        return [], None, None
+
+# Shared by every session on the same filters until the catalog changes, so
+# a crowd on the default view runs these queries once
+def load_beer_count(filters):
+    return cached_scalar(("beer_count", *filter_key(filters)), lambda: count_beers(*filters))
+
+def load_beer_page(filters, limit, offset):
+    # The page's rows as dicts
+    return cached_rows(("beer_page", *filter_key(filters), limit, offset),
+                       lambda: fetch_beer_page(*filters, limit=limit, offset=offset))
 
 # ------------------------------
 # Save to Tasting Journal
 # ------------------------------
-def add_to_journal(user_id, beer_name, look, smell, taste, feel, overall, notes):
+def add_to_journal(user_id, entry):
+    # Queued for the background journal writer; returns immediately
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        avg_rating = (look + smell + taste + feel + overall) / 5
-        cursor.execute('''
-            INSERT INTO tasting_journal (user_id, beer_id, look, smell, taste, feel, overall, average_rating, user_notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, beer_name, look, smell, taste, feel, overall, avg_rating, notes))
-        conn.commit()
-        conn.close()
+        get_journal_writer().submit(user_id, entry)
     except Exception as e:
         st.error(f"❌ Failed to save journal entry: {e}")
 
@@ -65,11 +57,25 @@ def add_to_journal(user_id, beer_name, look, smell, taste, feel, overall, notes)
 st.markdown(f"<style>body {{ background-color: {bg_color}; color: {text_color}; }}</style>", unsafe_allow_html=True)
 st.markdown(f"<h1>🍻 Explore Beers</h1>", unsafe_allow_html=True)
 
-if "journal" not in st.session_state:
-    st.session_state["journal"] = []
+session_journal = get_session_journal(st.session_state)
+
+# Rating drafts outlive their widgets, which Streamlit drops once a card
+# scrolls off the current page
+if "beer_drafts" not in st.session_state:
+    st.session_state["beer_drafts"] = {}
+
+def remember_draft(widget_key):
+    st.session_state["beer_drafts"][widget_key] = st.session_state[widget_key]
+
+def draft(widget_key, default):
+    return st.session_state["beer_drafts"].get(widget_key, default)
 
-beers_df = load_beers()
-if beers_df.empty:
+def rating_slider(container, label, widget_key):
+    return container.slider(label, 0.0, 5.0, draft(widget_key, 2.5), 0.5, key=widget_key,
+                            on_change=remember_draft, args=(widget_key,))
+
+all_styles, abv_min, abv_max = load_filter_options(get_catalog_version())
+if not all_styles:
     st.warning("🚫 No beers found in the database.")
     st.stop()
 
@@ -78,78 +84,116 @@ if beers_df.empty:
 # -------------------------------
 with st.sidebar.expander("🎛️ Filter Beers", expanded=True):
     MAX_CHIPS = 15
-    all_styles = sorted(beers_df['style'].dropna().unique())
     show_all_styles = st.checkbox("Show all styles", value=False)
     default_styles = all_styles if show_all_styles else all_styles[:MAX_CHIPS]
     selected_styles = st.multiselect("Select Beer Style(s)", options=all_styles, default=default_styles)
 
-    abv_min = float(beers_df['abv'].min())
-    abv_max = float(beers_df['abv'].max())
-    selected_abv = st.slider("Select ABV Range (%)", abv_min, abv_max, (abv_min, abv_max))
+    selected_abv = st.slider("Select ABV Range (%)", float(abv_min), float(abv_max), (float(abv_min), float(abv_max)))
 
-    search_term = st.text_input("🔍 Search beer name...")
+    search_term = st.text_input("🔍 Search beers, breweries, styles...")
 
 # -------------------------------
 # Apply Filters
 # -------------------------------
-filtered_df = beers_df.copy()
-
-if selected_styles:
-    filtered_df = filtered_df[filtered_df['style'].isin(selected_styles)]
-
-filtered_df = filtered_df[
-    (filtered_df['abv'] >= selected_abv[0]) & (filtered_df['abv'] <= selected_abv[1])
-]
+filters = canonical_filters(selected_styles, selected_abv, search_term)
+total_matches = load_beer_count(filters)
 
-if search_term:
-    filtered_df = filtered_df[filtered_df['beer_name'].str.contains(search_term, case=False)]
-
-if filtered_df.empty:
+if total_matches == 0:
     st.warning("🚫 No beers match your criteria. Try adjusting the filters.")
     st.stop()
 
+# -------------------------------
+# Recommendations
+# -------------------------------
+# Served from the precomputed flavor index; cheap enough to run every rerun
+flavor_index = load_flavor_index()
+recommended = recommend_for_user(USER_ID, k=5, index=flavor_index) if flavor_index else []
+if recommended:
+    with st.expander("🎯 Recommended for you", expanded=False):
+        labels = fetch_beer_labels([beer_id for beer_id, _ in recommended])
+        for beer_id, _ in recommended:
+            name, brewery = labels.get(beer_id, ("", ""))
+            st.markdown(f"- **{name}** — {brewery}")
+
+# -------------------------------
+# Pagination
+# -------------------------------
+PAGE_SIZES = [10, 25, 50]
+
+# Jump back to the first page whenever the filters change
+if st.session_state.get("explorer_filters") != filters:
+    st.session_state["explorer_filters"] = filters
+    st.session_state["explorer_page"] = 1
+
+st.markdown(f"### Showing {total_matches} matching beers")
+
+col1, col2 = st.columns(2)
+with col1:
+    page_size = st.selectbox("🔢 Beers per page", PAGE_SIZES, index=0)
+total_pages = (total_matches - 1) // page_size + 1
+st.session_state["explorer_page"] = min(st.session_state.get("explorer_page", 1), total_pages)
+with col2:
+    page_num = st.number_input(f"📄 Page (of {total_pages})", min_value=1, max_value=total_pages, step=1, key="explorer_page")
+
+page_rows = load_beer_page(filters, page_size, (page_num - 1) * page_size)
+page_ids = [row['beer_id'] for row in page_rows]
+descriptions = fetch_descriptions(page_ids)
+# Every image on the page is fetched at once, from the thumbnail cache when possible
+thumbnails = prefetch_thumbnails([row['image_url'] for row in page_rows])
+similar = {beer_id: similar_beers(beer_id, k=3, index=flavor_index) for beer_id in page_ids} if flavor_index else {}
+similar_labels = fetch_beer_labels({other for matches in similar.values() for other, _ in matches})
+
 # -------------------------------
 # Display Beers
 # -------------------------------
-st.markdown(f"### Showing {len(filtered_df)} matching beers")
-
-for _, row in filtered_df.iterrows():
-    beer_id = row['beer_name']
-
-    with st.container():
-        st.subheader(f"🍺 {row['beer_name']}")
-        # st.image(load_image_safe(row.get("image_url", "")), use_column_width=True)
-        st.markdown(f"**Brewery:** {row['brewery_name']}")
-        st.markdown(f"**Style:** {row['style']}")
-        st.markdown(f"**ABV:** {row['abv']}% | **IBU:** {row['ibu']}")
-        st.markdown(f"**Description:** {row['description']}")
-
-        with st.expander("➕ Add to Tasting Journal"):
-            col1, col2, col3, col4, col5 = st.columns(5)
-            look = col1.slider("👀 Look", 0.0, 5.0, 2.5, 0.5, key=f"{beer_id}_look")
-            smell = col2.slider("👃 Smell", 0.0, 5.0, 2.5, 0.5, key=f"{beer_id}_smell")
-            taste = col3.slider("👅 Taste", 0.0, 5.0, 2.5, 0.5, key=f"{beer_id}_taste")
-            feel = col4.slider("🖐️ Feel", 0.0, 5.0, 2.5, 0.5, key=f"{beer_id}_feel")
-            overall = col5.slider("⭐ Overall", 0.0, 5.0, 2.5, 0.5, key=f"{beer_id}_overall")
-            notes = st.text_area("📝 Notes", key=f"{beer_id}_notes")
-
-            if st.button("💾 Save to Journal", key=f"{beer_id}_save"):
-                if beer_id not in [j["beer_id"] for j in st.session_state["journal"]]:
-                    st.session_state["journal"].append({
-                        "beer_id": beer_id,
-                        "brewery_name": row["brewery_name"],
-                        "style": row["style"],
-                        "abv": row["abv"],
-                        "look": look,
-                        "smell": smell,
-                        "taste": taste,
-                        "feel": feel,
-                        "overall": overall,
-                        "average_rating": round((look + smell + taste + feel + overall) / 5, 2),
-                        "user_notes": notes,
-                        "tasted_on": datetime.date.today().isoformat()
-                    })
-                    add_to_journal("guest", beer_id, look, smell, taste, feel, overall, notes)
-                    st.success(f"✅ '{beer_id}' saved to your tasting journal!")
-                else:
-                    st.info(f"ℹ️ '{beer_id}' is already in your journal.")
\ No newline at end of file
+with span("Beer cards", "render"):
+    for row in page_rows:
+        beer_id = int(row['beer_id'])
+
+        with st.container():
+            st.subheader(f"🍺 {row['beer_name']}")
+            st.image(thumbnails[row['image_url']], width=THUMBNAIL_SIZE[0])
+            st.markdown(f"**Brewery:** {row['brewery_name']}")
+            st.markdown(f"**Style:** {row['style']}")
+            st.markdown(f"**ABV:** {row['abv']}% | **IBU:** {row['ibu']}")
+            st.markdown(f"**Description:** {descriptions.get(beer_id, '')}")
+            if row['snippet'] and '**' in row['snippet']:
+                st.caption(f"🔎 {row['snippet']}")
+            # The index can name beers a newer catalog has since removed
+            alike = [similar_labels.get(other) for other, _ in similar.get(beer_id, [])]
+            alike = [f"{name} ({brewery})" for name, brewery in filter(None, alike)]
+            if alike:
+                st.caption("🍻 Beers like this: " + ", ".join(alike))
+
+            with st.expander("➕ Add to Tasting Journal"):
+                col1, col2, col3, col4, col5 = st.columns(5)
+                look = rating_slider(col1, "👀 Look", f"{beer_id}_look")
+                smell = rating_slider(col2, "👃 Smell", f"{beer_id}_smell")
+                taste = rating_slider(col3, "👅 Taste", f"{beer_id}_taste")
+                feel = rating_slider(col4, "🖐️ Feel", f"{beer_id}_feel")
+                overall = rating_slider(col5, "⭐ Overall", f"{beer_id}_overall")
+                notes_key = f"{beer_id}_notes"
+                notes = st.text_area("📝 Notes", draft(notes_key, ""), key=notes_key, on_change=remember_draft, args=(notes_key,))
+
+                if st.button("💾 Save to Journal", key=f"{beer_id}_save"):
+                    tasted_on = datetime.date.today().isoformat()
+                    if (beer_id, tasted_on) not in session_journal:
+                        entry = session_journal.add({
+                            "beer_id": beer_id,
+                            "style_id": int(row["style_id"]),
+                            "abv": row["abv"],
+                            "look": look,
+                            "smell": smell,
+                            "taste": taste,
+                            "feel": feel,
+                            "overall": overall,
+                            "average_rating": round((look + smell + taste + feel + overall) / 5, 2),
+                            "user_notes": notes,
+                            "tasted_on": tasted_on,
+                        })
+                        add_to_journal(USER_ID, entry)
+                        st.success(f"✅ '{row['beer_name']}' saved to your tasting journal!")
+                    else:
+                        st.info(f"ℹ️ '{row['beer_name']}' is already in your journal.")
+
+end_rerun()
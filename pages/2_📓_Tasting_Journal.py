@@ -6,86 +6,68 @@ from theme_utils import get_app_theme
 base, text_color, bg_color, card_color, plotly_template = get_app_theme()
 
 
-import sqlite3
-import pandas as pd
+from functools import partial
+
+from catalog import get_catalog_version, get_filter_options, fetch_beer_labels, fetch_style_names
+from exporters import FORMATS, read_export, export_file_name
+from journal import (
+    get_journal_writer, get_session_journal, write_journal_rows, fetch_journal_page, merge_into_window,
+)
+from storage import get_storage, current_user_id
+from instrumentation import begin_rerun, end_rerun, span
+
+begin_rerun("Tasting Journal")
+
+USER_ID = current_user_id()
 
 # -------------------------------
-# DB Connection + Loader
+# DB Loader
 # -------------------------------
-def get_connection():
-    return sqlite3.connect('craft_beer.db')
-
-def load_journal_from_db(user_id="guest"):
+def load_journal_page(after=None, limit=20, user_id=USER_ID):
     try:
-        conn = get_connection()
-        query = """
-        SELECT beer_id, brewery_name, style, abv, look, smell, taste, feel, overall,
-               average_rating, user_notes, tasted_on
-        FROM tasting_journal
-        WHERE user_id = ?
-        ORDER BY tasted_on DESC
-        """
-        df = pd.read_sql_query(query, conn, params=(user_id,))
-        conn.close()
-        return df
+        # Let queued saves land first so the page reads its own writes
+        get_journal_writer().flush(timeout=5)
+        return fetch_journal_page(user_id, after, limit)
     except Exception as e:
         st.error(f"❌ Failed to load journal: {e}")
-        return pd.DataFrame()
+        return [], None
+
+# catalog_version only keys the caches, so a refreshed catalog is reread
+@st.cache_data(show_spinner=False)
+def load_style_options(catalog_version):
+    return get_filter_options()[0]
+
+@st.cache_data(show_spinner=False)
+def load_style_names(catalog_version):
+    return fetch_style_names()
+
+def export_journal(fmt, date_range=None, styles=None, user_id=USER_ID):
+    # Runs only when the download button is clicked
+    get_journal_writer().flush(timeout=5)
+    return read_export("journal", user_id, fmt, date_range, styles)
 
-def sync_journal_to_db(session_journal, user_id="guest"):
-    if not session_journal:
+def sync_journal_to_db(session_journal, user_id=USER_ID):
+    if not session_journal.dirty:
         return 0
 
-    synced = 0
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        for entry in session_journal:
-            # Avoid duplicates
-            cursor.execute("""
-                SELECT COUNT(*) FROM tasting_journal
-                WHERE user_id = ? AND beer_id = ? AND tasted_on = ?
-            """, (user_id, entry["beer_id"], entry["tasted_on"]))
-            if cursor.fetchone()[0] == 0:
-                cursor.execute("""
-                    INSERT INTO tasting_journal (
-                        user_id, beer_id, brewery_name, style, abv,
-                        look, smell, taste, feel, overall, average_rating,
-                        user_notes, tasted_on
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    user_id,
-                    entry["beer_id"], entry["brewery_name"], entry["style"], entry["abv"],
-                    entry["look"], entry["smell"], entry["taste"], entry["feel"], entry["overall"],
-                    entry["average_rating"], entry["user_notes"], entry["tasted_on"]
-                ))
-                synced += 1
-
-        conn.commit()
-        conn.close()
+        # Only the unsynced entries, in one executemany and one commit
+        synced = write_journal_rows(session_journal.rows(user_id))
+        keys = list(session_journal.dirty)
+        session_journal.mark_saved(keys)
+        get_journal_writer().forget_dropped(user_id, keys)
         return synced
     except Exception as e:
         st.error(f"❌ Sync failed: {e}")
         return 0
 
-def delete_entry(beer_id, tasted_on, user_id="guest"):
+def delete_entry(beer_id, tasted_on, beer_name, user_id=USER_ID):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            DELETE FROM tasting_journal
-            WHERE user_id = ? AND beer_id = ? AND tasted_on = ?
-        """, (user_id, beer_id, tasted_on))
-        conn.commit()
-        conn.close()
+        get_storage().delete_journal_entry(user_id, beer_id, tasted_on)
 
         # Remove from session
-        st.session_state["journal"] = [
-            j for j in st.session_state.get("journal", [])
-            if not (j["beer_id"] == beer_id and j["tasted_on"] == tasted_on)
-        ]
-        st.success(f"🗑️ Deleted entry for '{beer_id}' on {tasted_on}.")
+        session_journal.discard(beer_id, tasted_on)
+        st.success(f"🗑️ Deleted entry for '{beer_name}' on {tasted_on}.")
     except Exception as e:
         st.error(f"❌ Delete failed: {e}")
 
@@ -96,51 +78,105 @@ st.markdown(f"<style>body {{ background-color: {bg_color}; color: {text_color};
 st.markdown(f"<h1>📔 My Tasting Journal</h1>", unsafe_allow_html=True)
 st.markdown(f"<p>All your rated beers and notes appear here.</p>", unsafe_allow_html=True)
 
-# -------------------------------
-# Load entries from DB and Session
-# -------------------------------
-session_entries = pd.DataFrame(st.session_state.get("journal", []))
-db_entries = load_journal_from_db()
-
-combined_df = pd.concat([db_entries, session_entries], ignore_index=True)
-if not combined_df.empty:
-    combined_df.drop_duplicates(subset=["beer_id", "tasted_on"], inplace=True)
+session_journal = get_session_journal(st.session_state)
 
 # -------------------------------
 # Sync Button
 # -------------------------------
 if st.button("💾 Sync Session Journal to Database"):
-    synced = sync_journal_to_db(st.session_state.get("journal", []), user_id="guest")
+    synced = sync_journal_to_db(session_journal)
     if synced > 0:
         st.success(f"✅ Synced {synced} new journal entry(ies) to the database.")
     else:
         st.info("All journal entries are already synced.")
 
+# -------------------------------
+# Load the visible page
+# -------------------------------
+# Keyset pagination: each page starts after the (tasted_on, journal_id) of
+# the previous page's last row, so a page costs the same however long the
+# journal is. The stack holds the start cursor of every page visited.
+PAGE_SIZES = [10, 20, 50]
+
+page_size = st.selectbox("🔢 Entries per page", PAGE_SIZES, index=1)
+if st.session_state.get("journal_page_size") != page_size:
+    st.session_state["journal_page_size"] = page_size
+    st.session_state["journal_cursors"] = [None]
+cursors = st.session_state["journal_cursors"]
+
+rows, next_cursor = load_journal_page(cursors[-1], page_size)
+# Only session entries that haven't reached the table yet are merged, and
+# only into the window they belong to
+pending = session_journal.refresh(USER_ID)
+
+# Saves the background writer gave up on are still pending in this session
+writer = get_journal_writer()
+dropped = writer.dropped_keys(USER_ID)
+if dropped:
+    failed = dropped & {entry.key for entry in pending}
+    writer.forget_dropped(USER_ID, dropped - failed)
+    if failed:
+        st.warning(f"⚠️ {len(failed)} journal entry(ies) couldn't be saved ({writer.last_error or 'database error'}). "
+                   "They're kept in this session; press 💾 Sync to try again.")
+entries = merge_into_window(rows, pending, first_page=len(cursors) == 1, last_page=next_cursor is None)
+
 # -------------------------------
 # Display Journal
 # -------------------------------
-if combined_df.empty:
+if not entries and len(cursors) == 1:
     st.info("📝 No entries in your tasting journal yet.")
 else:
-    csv = combined_df.to_csv(index=False)
-    st.download_button("⬇️ Download Journal CSV", csv, "tasting_journal.csv", "text/csv")
-
-    for idx, entry in combined_df.iterrows():
-        st.markdown("----")
-        st.subheader(f"🍺 {entry['beer_id']} — {entry['brewery_name']}")
-        st.caption(f"Tasted on: {entry['tasted_on']}")
-
-        col1, col2, col3, col4, col5 = st.columns(5)
-        col1.metric("👀 Look", f"{entry['look']}/5")
-        col2.metric("👃 Smell", f"{entry['smell']}/5")
-        col3.metric("👅 Taste", f"{entry['taste']}/5")
-        col4.metric("🖐️ Feel", f"{entry['feel']}/5")
-        col5.metric("⭐ Overall", f"{entry['overall']}/5")
-
-        st.markdown(f"**Avg Rating:** {entry['average_rating']}/5")
-        st.markdown(f"**Style:** {entry['style']} | **ABV:** {entry['abv']}%")
-        st.markdown(f"**Notes:** {entry['user_notes']}")
-
-        if st.button("🗑️ Delete Entry", key=f"delete_{entry['beer_id']}_{entry['tasted_on']}"):
-            delete_entry(entry['beer_id'], entry['tasted_on'])
-            st.experimental_rerun()
\ No newline at end of file
+    catalog_version = get_catalog_version()
+
+    # Exports stream from the database into a cached file when the button
+    # is clicked, never as part of a normal rerun
+    with st.expander("⬇️ Export Journal"):
+        col1, col2, col3 = st.columns(3)
+        export_format = col1.selectbox("Format", list(FORMATS), key="journal_export_format")
+        export_dates = col2.date_input("Tasted between", value=(), key="journal_export_dates")
+        export_styles = col3.multiselect("Styles", load_style_options(catalog_version), key="journal_export_styles")
+        st.download_button(
+            "⬇️ Download Journal",
+            partial(export_journal, export_format, tuple(export_dates) if len(export_dates) == 2 else None,
+                    export_styles),
+            export_file_name("journal", export_format), FORMATS[export_format][0],
+            on_click="ignore",
+        )
+
+    # Entries hold ids; names come from the catalog, one lookup per page
+    labels = fetch_beer_labels({entry['beer_id'] for entry in entries})
+    style_names = load_style_names(catalog_version)
+
+    with span("Journal entries", "render"):
+        for entry in entries:
+            beer_name, brewery_name = labels.get(entry['beer_id'], ("Unknown beer", ""))
+            st.markdown("----")
+            st.subheader(f"🍺 {beer_name} — {brewery_name}")
+            st.caption(f"Tasted on: {entry['tasted_on']}")
+
+            col1, col2, col3, col4, col5 = st.columns(5)
+            col1.metric("👀 Look", f"{entry['look']}/5")
+            col2.metric("👃 Smell", f"{entry['smell']}/5")
+            col3.metric("👅 Taste", f"{entry['taste']}/5")
+            col4.metric("🖐️ Feel", f"{entry['feel']}/5")
+            col5.metric("⭐ Overall", f"{entry['overall']}/5")
+
+            st.markdown(f"**Avg Rating:** {entry['average_rating']}/5")
+            st.markdown(f"**Style:** {style_names.get(entry['style_id'], 'Unknown')} | **ABV:** {entry['abv']}%")
+            st.markdown(f"**Notes:** {entry['user_notes']}")
+
+            if st.button("🗑️ Delete Entry", key=f"delete_{entry['beer_id']}_{entry['tasted_on']}"):
+                delete_entry(entry['beer_id'], entry['tasted_on'], beer_name)
+                st.rerun()
+
+    st.markdown("----")
+    col1, col2, col3 = st.columns([1, 2, 1])
+    if col1.button("⬅️ Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    col2.caption(f"Page {len(cursors)}")
+    if col3.button("Older ➡️", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+
+end_rerun()
@@ -7,26 +7,70 @@ base, text_color, bg_color, card_color, plotly_template = get_app_theme()
 
 
 
-import sqlite3
+import json
+
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import pyarrow as pa
+
+from catalog import get_catalog_version, get_filter_options, LIST_COLUMNS
+from catalog_cache import load_catalog_table, filter_catalog_table
+from result_cache import canonical_filters, filter_key, cached_table
+from charts import plotly_chart, top_categories, TOP_N
+from style_stats import load_style_stats, combine_style_stats, coarsen_histogram
+from instrumentation import begin_rerun, end_rerun, span
+
+begin_rerun("Styles Explorer")
 
 # ------------------------------
-# DB Connection
+# DB Access
 # ------------------------------
-def get_connection():
-    return sqlite3.connect("craft_beer.db")
-
 @st.cache_data
-def load_beers():
+def load_filter_options(catalog_version):
+    # catalog_version only keys the cache, so a refreshed catalog is reread
     try:
-        conn = get_connection()
-        df = pd.read_sql_query("SELECT * FROM beers_catalog", conn)
-        conn.close()
-        return df
+        return get_filter_options()
     except Exception as e:
         st.error(f"❌ Failed to load data: {e}")
-        return pd.DataFrame()
+        return [], None, None
+
+# Filters the memory-mapped columnar catalog shared by every session. The
+# filtered table is kept in the shared result cache, so only the conversion
+# to a DataFrame is paid per session.
+def load_beers(filters, columns=LIST_COLUMNS):
+    styles, abv_range, _ = filters
+    table = cached_table(("catalog_rows", *filter_key(filters)[:2], tuple(columns)),
+                         lambda: filter_catalog_table(load_catalog_table(), styles, abv_range, columns))
+    return table.to_pandas()
+
+def style_stats_table(styles, abv_range):
+    # The histogram edges travel in the schema metadata
+    stats, edges = load_style_stats(list(styles), abv_range)
+    table = pa.Table.from_pandas(stats, preserve_index=False)
+    return table.replace_schema_metadata({**table.schema.metadata, b"edges": json.dumps(edges.tolist())})
+
+# Keyed by the filter signature only, so switching chart type reuses it, and
+# shared by every session until the catalog changes. The summary and chart
+# frames are rebuilt from it on each rerun; they have a row per style.
+def load_aggregates(filters):
+    styles, abv_range, _ = filters
+    table = cached_table(("style_stats", *filter_key(filters)[:2]), lambda: style_stats_table(styles, abv_range))
+    stats = table.to_pandas()
+    edges = np.array(json.loads(table.schema.metadata[b"edges"]))
+    summary = combine_style_stats(stats)
+    bin_counts, bin_edges = coarsen_histogram(summary["abv_histogram"], edges)
+    style_df = pd.DataFrame({
+        "style": stats["style"],
+        "count": stats["beer_count"],
+        "average_abv": stats["abv_sum"] / stats["beer_count"],
+        "example_breweries": stats["sample_breweries"].map(", ".join),
+    }).sort_values("count", ascending=False, kind="stable")
+    histogram_df = pd.DataFrame({
+        "abv": (bin_edges[:-1] + bin_edges[1:]) / 2,
+        "count": bin_counts,
+    })
+    bin_width = float(bin_edges[1] - bin_edges[0]) if len(bin_edges) > 1 else 1.0
+    return summary, style_df, histogram_df, bin_width
 
 # ------------------------------
 # Header
@@ -34,8 +78,8 @@ def load_beers():
 st.markdown(f"<style>body {{ background-color: {bg_color}; color: {text_color}; }}</style>", unsafe_allow_html=True)
 st.markdown(f"<h1>📊 Style Explorer</h1>", unsafe_allow_html=True)
 
-beers_df = load_beers()
-if beers_df.empty:
+all_styles, abv_min, abv_max = load_filter_options(get_catalog_version())
+if not all_styles:
     st.warning("No beers found in the database.")
     st.stop()
 
@@ -44,126 +88,126 @@ if beers_df.empty:
 # -------------------------------
 with st.sidebar.expander("🎛️ Filters", expanded=True):
     MAX_CHIPS = 15
-    all_styles = sorted(beers_df["style"].dropna().unique())
     show_all_styles = st.checkbox("Show all styles", value=False)
     default_styles = all_styles if show_all_styles else all_styles[:MAX_CHIPS]
     selected_styles = st.multiselect("Select Beer Style(s)", options=all_styles, default=default_styles)
 
-    abv_min = float(beers_df["abv"].min())
-    abv_max = float(beers_df["abv"].max())
-    selected_abv = st.slider("ABV Range", abv_min, abv_max, (abv_min, abv_max))
+    selected_abv = st.slider("ABV Range", float(abv_min), float(abv_max), (float(abv_min), float(abv_max)))
 
 # -------------------------------
 # Apply Filter Logic
 # -------------------------------
-filtered_df = beers_df.copy()
+filters = canonical_filters(selected_styles, selected_abv)
+summary, style_counts, histogram_df, bin_width = load_aggregates(filters)
 
-if selected_styles:
-    filtered_df = filtered_df[filtered_df["style"].isin(selected_styles)]
-
-filtered_df = filtered_df[
-    (filtered_df["abv"] >= selected_abv[0]) & (filtered_df["abv"] <= selected_abv[1])
-]
-
-if filtered_df.empty:
+if summary["beer_count"] == 0:
     st.warning("No matching beers. Try relaxing your filters.")
     st.stop()
 
+# Plotly loads only once there is something to chart
+import plotly.express as px
+
 # -------------------------------
 # Summary Metrics
 # -------------------------------
 st.markdown("## 📋 Summary")
 col1, col2, col3 = st.columns(3)
-col1.metric("Number of Beers", len(filtered_df))
-col2.metric("Average ABV (%)", round(filtered_df["abv"].mean(), 2))
-col3.metric("Average IBU", round(filtered_df["ibu"].mean(), 2))
+col1.metric("Number of Beers", summary["beer_count"])
+col2.metric("Average ABV (%)", round(summary["abv_mean"], 2))
+col3.metric("Average IBU", round(summary["ibu_mean"], 2))
 
 st.markdown("---")
 
 # -------------------------------
 # Style Distribution Chart
 # -------------------------------
+# Figures are cached by chart, filters and template (see charts.py); the
+# aggregates behind them are shared by all of them
 st.markdown("### 🍺 Beer Style Distribution")
 view_mode = st.radio("Choose Chart Type:", ["Bar Chart", "Pie Chart"], horizontal=True)
+top_styles = top_categories(style_counts, "style", "count")
 
-style_counts = filtered_df["style"].value_counts().reset_index()
-style_counts.columns = ["style", "count"]
-
-if view_mode == "Bar Chart":
-    fig = px.bar(
-        style_counts,
+def style_bar(template):
+    return px.bar(
+        top_styles,
         x="style",
         y="count",
         title="Beer Styles - Number of Beers",
         labels={"style": "Beer Style", "count": "Count"},
         color="count",
         color_continuous_scale="viridis",
-        template=plotly_template
+        template=template
     )
-else:
-    fig = px.pie(
-        style_counts,
+
+def style_pie(template):
+    return px.pie(
+        top_styles,
         names="style",
         values="count",
         title="Beer Styles - Distribution",
         hole=0.4,
-        template=plotly_template
+        template=template
     )
 
-st.plotly_chart(fig, use_container_width=True)
+with span("Style distribution chart", "chart"):
+    if view_mode == "Bar Chart":
+        plotly_chart(("style_bar", *filter_key(filters)), style_bar, plotly_template, use_container_width=True)
+    else:
+        plotly_chart(("style_pie", *filter_key(filters)), style_pie, plotly_template, use_container_width=True)
 
 # -------------------------------
 # ABV Histogram
 # -------------------------------
 st.markdown("### 🍷 ABV Distribution")
-fig2 = px.histogram(
-    filtered_df,
-    x="abv",
-    nbins=20,
-    title="ABV (%) Distribution",
-    labels={"abv": "Alcohol By Volume (%)"},
-    template=plotly_template
-)
-st.plotly_chart(fig2, use_container_width=True)
+# Bins are pre-aggregated server side; only the bar heights are plotted
+def abv_histogram(template):
+    fig = px.bar(
+        histogram_df.round({"abv": 2}),
+        x="abv",
+        y="count",
+        title="ABV (%) Distribution",
+        labels={"abv": "Alcohol By Volume (%)", "count": "count"},
+        template=template
+    )
+    fig.update_traces(width=bin_width)
+    fig.update_layout(bargap=0)
+    return fig
+
+with span("ABV histogram chart", "chart"):
+    plotly_chart(("abv_histogram", *filter_key(filters)), abv_histogram, plotly_template, use_container_width=True)
 
 # -------------------------------
 # Bubble Chart: Avg ABV vs Count
 # -------------------------------
 st.markdown("### 🧪 Avg ABV by Style (Bubble Chart w/ Breweries)")
 
-brewery_samples = (
-    filtered_df.groupby("style")["brewery_name"]
-    .apply(lambda x: ", ".join(x.dropna().unique()[:3]))
-    .reset_index()
-    .rename(columns={"brewery_name": "example_breweries"})
-)
-
-bubble_df = (
-    filtered_df.groupby("style")
-    .agg(average_abv=("abv", "mean"), count=("style", "count"))
-    .reset_index()
-    .merge(brewery_samples, on="style", how="left")
-)
-
-fig3 = px.scatter(
-    bubble_df,
-    x="average_abv",
-    y="count",
-    size="count",
-    color="style",
-    hover_name="style",
-    hover_data={"average_abv": True, "count": True, "example_breweries": True},
-    title="Beer Styles: Avg ABV vs Frequency (with Brewery Examples)",
-    labels={"average_abv": "Avg ABV (%)", "count": "Beers"},
-    template=plotly_template
-)
-st.plotly_chart(fig3, use_container_width=True)
+# One trace per style, so only the most common ones are drawn
+def style_bubbles(template):
+    return px.scatter(
+        style_counts.head(TOP_N).round({"average_abv": 2}),
+        x="average_abv",
+        y="count",
+        size="count",
+        color="style",
+        hover_name="style",
+        hover_data={"average_abv": True, "count": True, "example_breweries": True},
+        title=f"Beer Styles: Avg ABV vs Frequency (top {TOP_N}, with Brewery Examples)",
+        labels={"average_abv": "Avg ABV (%)", "count": "Beers"},
+        template=template
+    )
+
+with span("Style bubble chart", "chart"):
+    plotly_chart(("style_bubbles", *filter_key(filters)), style_bubbles, plotly_template, use_container_width=True)
 
 # -------------------------------
 # Filtered Table
 # -------------------------------
 st.markdown("### 📚 Matching Beers")
-st.dataframe(
-    filtered_df[["beer_name", "brewery_name", "style", "abv", "ibu", "description"]],
-    use_container_width=True
-)
\ No newline at end of file
+table_columns = ["beer_name", "brewery_name", "style", "abv", "ibu"]
+if st.checkbox("Include descriptions", value=False):
+    table_columns.append("description")
+filtered_df = load_beers(filters, columns=table_columns)
+with span("Matching beers table", "render"):
+    st.dataframe(filtered_df, use_container_width=True)
+
+end_rerun()
@@ -5,61 +5,39 @@ from theme_utils import get_app_theme
 base, text_color, bg_color, card_color, plotly_template = get_app_theme()
 
 
-import pydeck as pdk
-import pandas as pd
-import sqlite3
-import requests
-import plotly.express as px
+import math
 
-# ------------------------------
-# DB Connection & Add to Favorites
-# ------------------------------
-def get_connection():
-    return sqlite3.connect('craft_beer.db')
+from breweries import (
+    list_brewery_options, count_breweries, fetch_brewery_page, fetch_map_points, cluster_breweries,
+    breweries_near, brewery_facets, viewport_bounds, radius_bounds, cluster_cell_degrees, MAX_MAP_POINTS,
+)
+from brewery_sync import start_background_sync, sync_status, REFRESH_TTL
+from storage import get_storage, current_user_id
+from charts import plotly_chart, top_categories, facet_key
+from instrumentation import begin_rerun, end_rerun, span
 
-def add_to_favorites(row, user_id="guest"):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT COUNT(*) FROM favorite_breweries
-        WHERE brewery_name = ? AND city = ? AND user_id = ?
-    """, (row["name"], row["city"], user_id))
+begin_rerun("Breweries Locator")
 
-    if cursor.fetchone()[0] == 0:
-        cursor.execute("""
-            INSERT INTO favorite_breweries (brewery_name, city, state, country, website_url, user_id)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (row["name"], row["city"], row["state"], row["country"], row["website_url"], user_id))
-        conn.commit()
+USER_ID = current_user_id()
+
+# ------------------------------
+# DB Access & Add to Favorites
+# ------------------------------
+def add_to_favorites(row, user_id=USER_ID):
+    if get_storage().add_favorite(user_id, row):
         st.success(f"✅ Added {row['name']} to favorites.")
     else:
         st.info(f"ℹ️ {row['name']} is already in your favorites.")
-    conn.close()
-
-# ------------------------------
-# API Fetch with Pagination
-# ------------------------------
-@st.cache_data
-def fetch_breweries(page=1, per_page=100):
-    url = f"https://api.openbrewerydb.org/v1/breweries?per_page={per_page}&page={page}"
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        breweries = response.json()
-        if isinstance(breweries, list):
-            df = pd.DataFrame(breweries)
-            cols = ["id", "name", "city", "state", "country", "latitude", "longitude", "website_url", "brewery_type"]
-            df = df[[col for col in cols if col in df.columns]]
-            df = df.dropna(subset=["latitude", "longitude"])
-            df["latitude"] = df["latitude"].astype(float)
-            df["longitude"] = df["longitude"].astype(float)
-            return df
-        else:
-            st.error("Unexpected format from OpenBreweryDB.")
-            return pd.DataFrame()
-    except Exception as e:
-        st.error(f"Failed to fetch data: {e}")
-        return pd.DataFrame()
+
+# ------------------------------
+# Local Brewery Store
+# ------------------------------
+# Refreshes the local breweries table off the script thread, at most once
+# per TTL per process
+@st.cache_resource(ttl=REFRESH_TTL)
+def ensure_brewery_sync():
+    start_background_sync()
+    return True
 
 # ------------------------------
 # UI Start
@@ -67,17 +45,20 @@ def fetch_breweries(page=1, per_page=100):
 st.markdown(f"<style>body {{ background-color: {bg_color}; color: {text_color}; }}</style>", unsafe_allow_html=True)
 st.markdown(f"<h1>🗺️ Brewery Locator</h1>", unsafe_allow_html=True)
 
-# Pagination Controls (inline)
-col1, col2 = st.columns(2)
-with col1:
-    per_page = st.selectbox("🔢 Breweries per page", [25, 50, 100], index=1)
-with col2:
-    page_num = st.number_input("📄 Page #", min_value=1, value=1, step=1)
-
-breweries_df = fetch_breweries(page=page_num, per_page=per_page)
-
-if breweries_df.empty:
-    st.warning("No brewery data found.")
+ensure_brewery_sync()
+status = sync_status()
+if st.sidebar.button("🔄 Refresh brewery data", disabled=status["running"]):
+    start_background_sync(force=True)
+    status = sync_status()
+if status["last_error"]:
+    st.sidebar.warning(f"Last brewery sync failed: {status['last_error']}")
+
+total_breweries = count_breweries()
+if total_breweries == 0:
+    if status["running"]:
+        st.info("⏳ Downloading breweries from OpenBreweryDB in the background. Check back in a moment.")
+    else:
+        st.warning("No brewery data found.")
     st.stop()
 
 # ------------------------------
@@ -87,78 +68,142 @@ st.sidebar.header("🔎 Filter Breweries")
 MAX_CHIPS = 12
 
 # State Filter
-all_states = sorted(breweries_df['state'].dropna().unique())
+all_states = list_brewery_options("state")
 show_all_states = st.sidebar.checkbox("Show all states", value=False)
 selected_states = st.sidebar.multiselect("Select State(s)", all_states, default=all_states if show_all_states else all_states[:MAX_CHIPS])
 
 # City Filter (dependent on state)
-filtered_by_state = breweries_df[breweries_df['state'].isin(selected_states)]
-all_cities = sorted(filtered_by_state['city'].dropna().unique())
+all_cities = list_brewery_options("city", states=selected_states)
 show_all_cities = st.sidebar.checkbox("Show all cities", value=False)
-selected_cities = st.sidebar.multiselect("Select City(s)", all_cities, default=all_cities if show_all_cities else all_cities[:MAX_CHIPS])
+selected_cities = st.sidebar.multiselect("Select City(s)", all_cities, default=all_cities if show_all_cities else [])
 
 # Brewery Type
-all_types = sorted(breweries_df['brewery_type'].dropna().unique())
+all_types = list_brewery_options("brewery_type")
 show_all_types = st.sidebar.checkbox("Show all brewery types", value=False)
 selected_types = st.sidebar.multiselect("Select Brewery Type(s)", all_types, default=all_types if show_all_types else all_types[:MAX_CHIPS])
 
-# Apply Filters
-filtered_df = breweries_df[
-    (breweries_df['state'].isin(selected_states)) &
-    (breweries_df['city'].isin(selected_cities)) &
-    (breweries_df['brewery_type'].isin(selected_types))
-]
+# Map Area
+st.sidebar.header("🧭 Map Area")
+area_mode = st.sidebar.radio("Show breweries", ["In map view", "Near a point"])
+center_lat = st.sidebar.number_input("Latitude", -90.0, 90.0, 39.5, 0.5)
+center_lon = st.sidebar.number_input("Longitude", -180.0, 180.0, -98.35, 0.5)
+if area_mode == "Near a point":
+    radius_km = st.sidebar.slider("Radius (km)", 5, 500, 50, 5)
+    zoom = max(2, min(14, round(math.log2(40000 / radius_km)) - 1))
+else:
+    zoom = st.sidebar.slider("Zoom", 2, 14, 3)
 
-st.markdown(f"### 🔍 Showing {len(filtered_df)} breweries")
+filters = dict(states=selected_states, cities=selected_cities, types=selected_types)
+
+# ------------------------------
+# Spatial Query
+# ------------------------------
+CLUSTER_BELOW_ZOOM = 8
+
+if area_mode == "Near a point":
+    nearby_df = breweries_near(center_lat, center_lon, radius_km, **filters)
+    area_filters = dict(filters, bbox=radius_bounds(center_lat, center_lon, radius_km))
+    match_count = len(nearby_df)
+    # Only the nearest MAX_MAP_POINTS are drawn; the count, charts and table
+    # cover every match
+    map_df = nearby_df.head(MAX_MAP_POINTS).assign(count=1)
+else:
+    nearby_df = None
+    area_filters = dict(filters, bbox=viewport_bounds(center_lat, center_lon, zoom))
+    match_count = count_breweries(**area_filters)
+    if zoom < CLUSTER_BELOW_ZOOM or match_count > MAX_MAP_POINTS:
+        # Server-side clusters keep the map payload bounded at any density
+        map_df = cluster_breweries(cluster_cell_degrees(zoom), **area_filters)
+    else:
+        map_df = fetch_map_points(**area_filters)
+
+st.markdown(f"### 🔍 Showing {match_count} breweries")
 
 # ------------------------------
 # Map
 # ------------------------------
-map_style = "mapbox://styles/mapbox/light-v10" if base == "light" else "mapbox://styles/mapbox/dark-v10"
-st.pydeck_chart(pdk.Deck(
-    map_style=map_style,
-    initial_view_state=pdk.ViewState(latitude=39.5, longitude=-98.35, zoom=3),
-    layers=[pdk.Layer(
-        "ScatterplotLayer",
-        data=filtered_df,
-        get_position='[longitude, latitude]',
-        get_color='[200, 30, 0, 160]',
-        get_radius=40000,
-    )],
-))
+with span("Brewery map", "chart"):
+    # pydeck loads only once there is a map to draw, like plotly below
+    import pydeck as pdk
+
+    map_style = "mapbox://styles/mapbox/light-v10" if base == "light" else "mapbox://styles/mapbox/dark-v10"
+    point_radius = 40000 / 2 ** max(zoom - 3, 0)
+    map_df = map_df.assign(radius=point_radius * map_df["count"].clip(lower=1) ** 0.5)
+    st.pydeck_chart(pdk.Deck(
+        map_style=map_style,
+        initial_view_state=pdk.ViewState(latitude=center_lat, longitude=center_lon, zoom=zoom),
+        layers=[pdk.Layer(
+            "ScatterplotLayer",
+            data=map_df[["latitude", "longitude", "count", "radius", "name"]],
+            get_position='[longitude, latitude]',
+            get_color='[200, 30, 0, 160]',
+            get_radius="radius",
+            pickable=True,
+        )],
+        tooltip={"text": "{name} ({count})"},
+    ))
+
+if match_count == 0:
+    st.info("No breweries in this area. Try zooming out or moving the map.")
+    st.stop()
 
 # ------------------------------
 # Charts
 # ------------------------------
+# Plotly loads only once there is something to chart
+import plotly.express as px
+
+if nearby_df is None:
+    type_counts, top_cities = brewery_facets(**area_filters)
+else:
+    type_counts = nearby_df['brewery_type'].value_counts().rename_axis('type').reset_index(name='count')
+    top_cities = nearby_df['city'].dropna().value_counts().head(10).rename_axis('city').reset_index(name='count')
+
+# Figures are keyed by the counts they draw, so a pan that leaves them
+# unchanged, a theme switch back or another session on the same area reuses
+# the cached figure (see charts.py)
+type_counts = top_categories(type_counts, 'type', 'count')
+
+def type_chart(template):
+    return px.bar(
+        type_counts, x='type', y='count', title='Distribution of Brewery Types',
+        template=template, color='type'
+    )
+
+def cities_chart(template):
+    return px.bar(top_cities, x='city', y='count', title='Top Cities by Brewery Count', color='count', template=template)
+
 st.markdown("### 📊 Brewery Type Breakdown")
-type_counts = filtered_df['brewery_type'].value_counts().reset_index()
-type_counts.columns = ['type', 'count']
-fig1 = px.bar(
-    type_counts, x='type', y='count', title='Distribution of Brewery Types',
-    template=plotly_template, color='type'
-)
-st.plotly_chart(fig1, use_container_width=True)
+with span("Brewery type chart", "chart"):
+    plotly_chart(("brewery_types", facet_key(type_counts)), type_chart, plotly_template, use_container_width=True)
 
 st.markdown("### 🏙️ Top Cities by Number of Breweries")
-top_cities = filtered_df['city'].dropna().value_counts().reset_index().rename(columns={'index': 'city', 'city': 'count'}).head(10)
-fig2 = px.bar(top_cities, x='city', y='count', title='Top Cities by Brewery Count', color='count', template=plotly_template)
-st.plotly_chart(fig2, use_container_width=True)
+with span("Top cities chart", "chart"):
+    plotly_chart(("top_cities", facet_key(top_cities)), cities_chart, plotly_template, use_container_width=True)
 
 # ------------------------------
 # Paginated Table with Favorites
 # ------------------------------
 st.markdown("### 🧾 Filtered Breweries Table")
 page_size = 10
-total_pages = (len(filtered_df) - 1) // page_size + 1
+total_pages = (match_count - 1) // page_size + 1
 table_page = st.number_input("Table Page", min_value=1, max_value=total_pages, value=1)
 start_idx = (table_page - 1) * page_size
 end_idx = start_idx + page_size
 
-paged_df = filtered_df.iloc[start_idx:end_idx]
-for i, row in paged_df.iterrows():
-    cols = st.columns([3, 3, 2, 2, 1])
-    cols[0].markdown(f"**{row['name']}**")
-    cols[1].markdown(f"{row['city']}, {row['state']}")
-    cols[2].markdown(f"[🌐 Website]({row['website_url']})" if row["website_url"] else "—")
-    if cols[4].button("❤️ Favorite", key=f"fav_{row['id']}"):
-        add_to_favorites(row)
+if nearby_df is None:
+    paged_df = fetch_brewery_page(page=table_page, per_page=page_size, **area_filters)
+else:
+    paged_df = nearby_df.iloc[start_idx:end_idx]
+with span("Brewery table", "render"):
+    for i, row in paged_df.iterrows():
+        cols = st.columns([3, 3, 2, 2, 1])
+        cols[0].markdown(f"**{row['name']}**")
+        cols[1].markdown(f"{row['city']}, {row['state']}")
+        cols[2].markdown(f"[🌐 Website]({row['website_url']})" if row["website_url"] else "—")
+        if nearby_df is not None:
+            cols[3].markdown(f"{row['distance_km']:.1f} km")
+        if cols[4].button("❤️ Favorite", key=f"fav_{row['id']}"):
+            add_to_favorites(row)
+
+end_rerun()
@@ -5,31 +5,35 @@ from theme_utils import get_app_theme
 base, text_color, bg_color, card_color, plotly_template = get_app_theme()
 
 
-import sqlite3
-import pandas as pd
+from functools import partial
+
+from exporters import FORMATS, read_export, export_file_name
+from storage import get_storage, current_user_id
+from instrumentation import begin_rerun, end_rerun, timed, span
+
+begin_rerun("Favorite Breweries")
+
+USER_ID = current_user_id()
 
 # ------------------------------
 # DB Access Functions
 # ------------------------------
-def get_connection():
-    return sqlite3.connect('craft_beer.db')
-
-def load_favorites(user_id="guest"):
-    conn = get_connection()
-    favorites = pd.read_sql_query("""
-        SELECT fav_id, brewery_name, city, state, country, website_url
-        FROM favorite_breweries
-        WHERE user_id = ?
-    """, conn, params=(user_id,))
-    conn.close()
-    return favorites
-
-def remove_favorite(fav_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM favorite_breweries WHERE fav_id = ?', (fav_id,))
-    conn.commit()
-    conn.close()
+# Plain rows instead of a DataFrame: the page only pages through them, and
+# skipping pandas keeps it quick to open after a restart
+def name_pattern(search_term):
+    escaped = search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+@timed("favorites.count_favorites", kind="loader")
+def count_favorites(search_term="", user_id=USER_ID):
+    return get_storage().count_favorites(user_id, name_pattern(search_term))
+
+@timed("favorites.load_favorites", kind="loader")
+def load_favorites(search_term="", page=1, page_size=5, user_id=USER_ID):
+    return get_storage().favorites_page(user_id, name_pattern(search_term), page_size, (page - 1) * page_size)
+
+def remove_favorite(fav_id, user_id=USER_ID):
+    get_storage().delete_favorite(user_id, fav_id)
 
 # ------------------------------
 # Page Layout
@@ -38,9 +42,7 @@ st.markdown(f"<style>body {{ background-color: {bg_color}; color: {text_color};
 st.markdown(f"<h1>📜 My Favorite Breweries</h1>", unsafe_allow_html=True)
 st.markdown(f"<p>Saved breweries you’ve added from the map view.</p>", unsafe_allow_html=True)
 
-favorites_df = load_favorites(user_id="guest")
-
-if favorites_df.empty:
+if count_favorites() == 0:
     st.info("You haven't saved any favorite breweries yet! 🍻")
     st.stop()
 
@@ -48,47 +50,49 @@ if favorites_df.empty:
 # Search + Filter
 # ------------------------------
 search_term = st.text_input("🔍 Search by Brewery Name...")
+match_count = count_favorites(search_term)
 
-if search_term:
-    favorites_df = favorites_df[favorites_df['brewery_name'].str.contains(search_term, case=False)]
-
-st.markdown(f"### Showing {len(favorites_df)} favorites")
+st.markdown(f"### Showing {match_count} favorites")
 
 # ------------------------------
 # Paginated Brewery Cards
 # ------------------------------
 page_size = 5
-total_pages = (len(favorites_df) - 1) // page_size + 1
+total_pages = max((match_count - 1) // page_size + 1, 1)
 page = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
-start = (page - 1) * page_size
-end = start + page_size
 
-paged_df = favorites_df.iloc[start:end]
+paged = load_favorites(search_term, page, page_size)
 
-for _, row in paged_df.iterrows():
-    st.markdown("---")
-    col1, col2 = st.columns([4, 1])
+with span("Favorite cards", "render"):
+    for row in paged:
+        st.markdown("---")
+        col1, col2 = st.columns([4, 1])
 
-    with col1:
-        st.subheader(f"🍺 {row['brewery_name']}")
-        st.markdown(f"**Location:** {row['city']}, {row['state']}, {row['country']}")
-        if row["website_url"]:
-            st.markdown(f"[🌐 Website]({row['website_url']})", unsafe_allow_html=True)
+        with col1:
+            st.subheader(f"🍺 {row['brewery_name']}")
+            st.markdown(f"**Location:** {row['city']}, {row['state']}, {row['country']}")
+            if row["website_url"]:
+                st.markdown(f"[🌐 Website]({row['website_url']})", unsafe_allow_html=True)
 
-    with col2:
-        if st.button("🗑️ Remove", key=f"remove_{row['fav_id']}"):
-            remove_favorite(row['fav_id'])
-            st.success(f"Removed {row['brewery_name']} from favorites.")
-            st.experimental_rerun()
+        with col2:
+            if st.button("🗑️ Remove", key=f"remove_{row['fav_id']}"):
+                remove_favorite(row['fav_id'])
+                st.success(f"Removed {row['brewery_name']} from favorites.")
+                st.rerun()
 
 # ------------------------------
-# CSV Download
+# Export
 # ------------------------------
+# Built from the database only when the button is clicked, and cached until
+# the favorites change
 st.markdown("---")
-csv = favorites_df.to_csv(index=False).encode('utf-8')
+export_format = st.selectbox("Export format", list(FORMATS), key="favorites_export_format")
 st.download_button(
-    label="⬇️ Download Favorites CSV",
-    data=csv,
-    file_name='favorite_breweries.csv',
-    mime='text/csv'
-)
\ No newline at end of file
+    label="⬇️ Download Favorites",
+    data=partial(read_export, "favorites", USER_ID, export_format),
+    file_name=export_file_name("favorites", export_format),
+    mime=FORMATS[export_format][0],
+    on_click="ignore",
+)
+
+end_rerun()
@@ -0,0 +1,161 @@
+import streamlit as st
+st.set_page_config(page_title="📈 Tasting Analytics", page_icon="📈", layout="wide")
+
+from theme_utils import get_app_theme
+base, text_color, bg_color, card_color, plotly_template = get_app_theme()
+
+
+from journal import get_journal_writer
+from analytics import (
+    load_style_profile, summarize_profile, load_monthly_trends, load_recent_rolling,
+    load_score_distribution, SCORE_COLUMNS, ROLLING_WINDOW, RECENT_ENTRIES, TREND_MONTHS,
+)
+from storage import current_user_id
+from instrumentation import begin_rerun, end_rerun, span
+
+begin_rerun("Tasting Analytics")
+
+USER_ID = current_user_id()
+TOP_STYLES = 8
+
+# ------------------------------
+# Header
+# ------------------------------
+st.markdown(f"<style>body {{ background-color: {bg_color}; color: {text_color}; }}</style>", unsafe_allow_html=True)
+st.markdown(f"<h1>📈 Tasting Analytics</h1>", unsafe_allow_html=True)
+st.markdown(f"<p>How your ratings add up across styles, months and score dimensions.</p>", unsafe_allow_html=True)
+
+# Queued saves land first; everything below reads the rollup tables or a
+# fixed slice of recent entries, so the page costs the same for any journal size
+try:
+    get_journal_writer().flush(timeout=5)
+    profile = load_style_profile(USER_ID)
+    trends = load_monthly_trends(USER_ID)
+    recent = load_recent_rolling(USER_ID)
+    scores = load_score_distribution(USER_ID)
+except Exception as e:
+    st.error(f"❌ Failed to load analytics: {e}")
+    st.stop()
+
+if profile.empty:
+    st.info("📝 Rate a few beers in the Beer Explorer to see your analytics here.")
+    st.stop()
+
+# Plotly loads only once there is something to chart
+import plotly.express as px
+
+# -------------------------------
+# Summary Metrics
+# -------------------------------
+summary = summarize_profile(profile)
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Beers Rated", summary["entries"])
+col2.metric("Styles Tried", summary["styles"])
+col3.metric("Average Rating", f"{summary['average_rating']:.2f}/5")
+col4.metric("Favorite Style", summary["top_style"])
+
+st.markdown("---")
+
+# -------------------------------
+# Rolling Average
+# -------------------------------
+st.markdown("### 📉 Recent Ratings")
+with span("Recent ratings chart", "chart"):
+    fig = px.line(
+        recent,
+        x=recent.index,
+        y=["average_rating", "rolling_rating"],
+        hover_data=["beer_name", "tasted_on"],
+        title=f"Last {RECENT_ENTRIES} Tastings with {ROLLING_WINDOW}-Entry Rolling Average",
+        labels={"x": "Tasting", "value": "Rating", "variable": ""},
+        template=plotly_template
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+# -------------------------------
+# Monthly Trends
+# -------------------------------
+st.markdown("### 🗓️ Monthly Trends")
+col1, col2 = st.columns(2)
+with span("Monthly ABV chart", "chart"):
+    fig2 = px.line(
+        trends,
+        x="month",
+        y=["average_abv", "rolling_abv"],
+        markers=True,
+        title=f"Average ABV (%) per Month, {TREND_MONTHS}-Month Rolling",
+        labels={"month": "Month", "value": "ABV (%)", "variable": ""},
+        template=plotly_template
+    )
+    col1.plotly_chart(fig2, use_container_width=True)
+with span("Monthly tastings chart", "chart"):
+    fig3 = px.bar(
+        trends,
+        x="month",
+        y="entry_count",
+        color="average_rating",
+        color_continuous_scale="viridis",
+        title="Tastings per Month",
+        labels={"month": "Month", "entry_count": "Tastings", "average_rating": "Avg Rating"},
+        template=plotly_template
+    )
+    col2.plotly_chart(fig3, use_container_width=True)
+
+# -------------------------------
+# Style Preference Profile
+# -------------------------------
+st.markdown("### 🍺 Style Preferences")
+top_styles = profile.head(TOP_STYLES)
+col1, col2 = st.columns(2)
+with span("Style preference chart", "chart"):
+    fig4 = px.bar(
+        top_styles,
+        x="preference",
+        y="style",
+        orientation="h",
+        color="entry_count",
+        color_continuous_scale="viridis",
+        hover_data={"average_rating": ":.2f", "rating_std": ":.2f", "abv": ":.1f"},
+        title="Top Styles (ratings shrunk toward your average)",
+        labels={"preference": "Preference", "style": "Style", "entry_count": "Tastings"},
+        template=plotly_template
+    )
+    fig4.update_layout(yaxis={"categoryorder": "total ascending"})
+    col1.plotly_chart(fig4, use_container_width=True)
+
+with span("Style radar chart", "chart"):
+    radar = top_styles.head(5).melt(id_vars="style", value_vars=SCORE_COLUMNS, var_name="dimension", value_name="score")
+    fig5 = px.line_polar(
+        radar,
+        r="score",
+        theta="dimension",
+        color="style",
+        line_close=True,
+        range_r=[0, 5],
+        title="Score Profile of Your Top Styles",
+        template=plotly_template
+    )
+    col2.plotly_chart(fig5, use_container_width=True)
+
+# -------------------------------
+# Score Distributions
+# -------------------------------
+st.markdown("### 🎯 Score Distributions")
+with span("Score distribution chart", "chart"):
+    fig6 = px.bar(
+        scores,
+        x="score",
+        y="entry_count",
+        facet_col="dimension",
+        facet_col_wrap=3,
+        title="How You Score Each Dimension",
+        labels={"score": "Score", "entry_count": "Tastings"},
+        template=plotly_template
+    )
+    st.plotly_chart(fig6, use_container_width=True)
+
+st.markdown("### 📚 Style Profile")
+with span("Style profile table", "render"):
+    st.dataframe(profile.round(2), use_container_width=True)
+
+end_rerun()
@@ -0,0 +1,8 @@
+import os
+
+# Default locations are next to the code rather than the working directory,
+# so init_db.py, the benchmarks and every app process agree on where files
+# live however they were started. The environment overrides are used as given.
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get("BEER_DIARY_CACHE_DIR", os.path.join(APP_DIR, ".cache"))
+IMAGE_DIR = os.path.join(APP_DIR, "static", "images")
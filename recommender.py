@@ -0,0 +1,162 @@
+import os
+import glob
+import threading
+import numpy as np
+
+from db_utils import connection, database_id
+from paths import CACHE_DIR
+from catalog import get_catalog_version
+from storage import get_storage
+from instrumentation import timed
+
+FLAVOR_COLUMNS = ["astringency", "body", "alcohol", "bitter", "sweet", "sour",
+                  "salty", "fruits", "hoppy", "spices", "malty"]
+NEIGHBORS = 20          # precomputed per beer
+BATCH_SIZE = 1024       # rows per similarity block
+TASTE_ENTRIES = 500     # newest journal entries behind a taste vector
+RATING_WEIGHT = 0.05    # nudge toward well-rated beers when recommending
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# ------------------------------
+# Building the index
+# ------------------------------
+def index_path(version, db_path=None):
+    # Named after the database too, like the columnar catalog
+    return os.path.join(CACHE_DIR, f"flavor_index-{database_id(db_path)}-v{version}.npz")
+
+def normalize_flavors(flavors):
+    # Columns are standardized so no single flavor dominates, then rows are
+    # unit length so a dot product is cosine similarity. Beers without a
+    # profile stay all-zero and match nothing.
+    flavors = np.nan_to_num(flavors.astype(np.float32))
+    present = flavors.any(axis=1)
+    mean = flavors[present].mean(axis=0) if present.any() else np.zeros(flavors.shape[1], np.float32)
+    std = flavors[present].std(axis=0) if present.any() else np.ones(flavors.shape[1], np.float32)
+    scaled = np.where(present[:, None], (flavors - mean) / np.where(std > 0, std, 1), 0).astype(np.float32)
+    norms = np.linalg.norm(scaled, axis=1, keepdims=True)
+    return np.divide(scaled, norms, out=np.zeros_like(scaled), where=norms > 0)
+
+def nearest_neighbors(matrix, k=NEIGHBORS, batch_size=BATCH_SIZE):
+    # Blocked matrix product keeps memory at batch_size x n; argpartition
+    # finds each row's top k without sorting the whole row
+    n = len(matrix)
+    k = min(k, max(n - 1, 0))
+    indices = np.zeros((n, k), dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+    for start in range(0, n, batch_size):
+        block = matrix[start:start + batch_size] @ matrix.T
+        rows = np.arange(len(block))
+        block[rows, start + rows] = -np.inf   # a beer isn't its own neighbour
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(top_scores, order, axis=1)
+    return indices, scores
+
+def build_flavor_index(conn, version, db_path=None):
+    rows = conn.execute(
+        f"SELECT beer_id, IFNULL(ave_rating, 0), {', '.join(FLAVOR_COLUMNS)} FROM beers_catalog ORDER BY beer_id"
+    ).fetchall()
+    if not rows:
+        return None
+    data = np.array(rows, dtype=np.float64)
+    matrix = normalize_flavors(data[:, 2:])
+    neighbors, scores = nearest_neighbors(matrix)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = index_path(version, db_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp_path, beer_ids=data[:, 0].astype(np.int64), ratings=data[:, 1].astype(np.float32),
+        matrix=matrix, neighbors=neighbors, scores=scores,
+    )
+    os.replace(tmp_path, path)
+    stale_paths = glob.glob(os.path.join(CACHE_DIR, f"flavor_index-{database_id(db_path)}-v*.npz"))
+    for stale in stale_paths + glob.glob(os.path.join(CACHE_DIR, "flavor_index-v*.npz")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+@timed(kind="loader")
+def load_flavor_index(version=None):
+    # One index per process, database and catalog version, like the columnar
+    # catalog
+    version = get_catalog_version() if version is None else version
+    path = index_path(version)
+    index = _indexes.get(path)
+    if index is not None:
+        return index
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            if not os.path.exists(path):
+                with connection() as conn:
+                    path = build_flavor_index(conn, version)
+            if path is None:
+                return None
+            with np.load(path) as data:
+                index = {name: data[name] for name in data.files}
+            index["positions"] = {int(beer_id): i for i, beer_id in enumerate(index["beer_ids"])}
+            ratings = index["ratings"]
+            spread = ratings.std() or 1.0
+            index["rating_boost"] = (RATING_WEIGHT * (ratings - ratings.mean()) / spread).astype(np.float32)
+            _indexes.clear()
+            _indexes[path] = index
+    return index
+
+# ------------------------------
+# Queries
+# ------------------------------
+@timed(kind="loader")
+def similar_beers(beer_id, k=5, index=None):
+    # Returns [(beer_id, similarity)] straight from the precomputed neighbours
+    index = index or load_flavor_index()
+    position = index["positions"].get(int(beer_id)) if index else None
+    if position is None:
+        return []
+    neighbors, scores = index["neighbors"][position, :k], index["scores"][position, :k]
+    return [(int(index["beer_ids"][n]), float(s)) for n, s in zip(neighbors, scores) if s > 0]
+
+def load_user_ratings(user_id):
+    # [(beer_id, rating)]; journal rows carry catalog ids, so no lookup is
+    # needed even when the journal lives in another database
+    return get_storage().recent_ratings(user_id, TASTE_ENTRIES)
+
+def taste_vector(ratings, index):
+    # Ratings above the user's own average pull toward a beer's profile,
+    # ratings below push away from it
+    positions = [index["positions"].get(int(beer_id)) for beer_id, _ in ratings]
+    pairs = [(p, r) for p, (_, r) in zip(positions, ratings) if p is not None and r is not None]
+    if not pairs:
+        return None
+    positions, values = np.array([p for p, _ in pairs]), np.array([r for _, r in pairs], dtype=np.float32)
+    weights = values - values.mean() if values.std() > 0 else values / 5.0
+    vector = weights @ index["matrix"][positions]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else None
+
+@timed(kind="loader")
+def recommend_for_user(user_id, k=5, index=None):
+    index = index or load_flavor_index()
+    if index is None:
+        return []
+    ratings = load_user_ratings(user_id)
+    vector = taste_vector(ratings, index)
+    if vector is None:
+        return []
+    scores = index["matrix"] @ vector + index["rating_boost"]
+    rated = [index["positions"][int(b)] for b, _ in ratings if int(b) in index["positions"]]
+    scores[rated] = -np.inf
+    k = min(k, len(scores) - len(set(rated)))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(index["beer_ids"][i]), float(scores[i])) for i in top]
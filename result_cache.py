@@ -0,0 +1,147 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import pyarrow as pa
+
+from catalog import get_catalog_version
+
+MAX_BYTES = int(float(os.environ.get("BEER_DIARY_RESULT_CACHE_MB", "256")) * 1024 * 1024)
+
+# ------------------------------
+# Canonical filters
+# ------------------------------
+# The same view reached by different routes (styles picked in another order,
+# a search typed with different case or spacing) shares one entry. Sorting
+# styles and normalising the search words doesn't change what they match, so
+# queries run with those canonical values. ABV bounds are only rounded in the
+# key; the query gets the range as picked.
+def canonical_filters(styles=None, abv_range=None, search_term=""):
+    styles = tuple(sorted(set(styles or ())))
+    abv_range = (float(abv_range[0]), float(abv_range[1])) if abv_range else None
+    # The same words build_match_query would search for
+    search_term = " ".join(re.findall(r"\w+", (search_term or "").lower()))
+    return styles, abv_range, search_term
+
+def filter_key(filters):
+    # canonical_filters() as part of a cache key
+    styles, abv_range, search_term = filters
+    abv_range = (round(abv_range[0], 3), round(abv_range[1], 3)) if abv_range else None
+    return styles, abv_range, search_term
+
+# ------------------------------
+# Shared cache
+# ------------------------------
+# One per process, shared by every session. Values are Arrow tables, which are
+# immutable, so a hit hands out the stored table itself instead of a copy.
+# Entries are evicted least recently used first once their buffers pass
+# max_bytes, and all of them are dropped when the catalog version moves on.
+# Concurrent misses on one key wait for a single computation.
+class ResultCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.version = None
+        self._entries = OrderedDict()   # key -> table, least recently used first
+        self._bytes = 0
+        self._pending = {}              # key -> Event set when its computation ends
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def _set_version(self, version):
+        # Returns False for a caller still on an older version than the cache
+        if self.version is None or version > self.version:
+            self._entries.clear()
+            self._bytes = 0
+            self.version = version
+        return version == self.version
+
+    def get(self, key, compute, version):
+        waited = False
+        while True:
+            with self._lock:
+                if not self._set_version(version):
+                    # A session still on the previous catalog; not cached
+                    leader = None
+                    break
+                table = self._entries.get(key)
+                if table is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return table
+                done = self._pending.get(key)
+                if done is None:
+                    leader = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+                if not waited:
+                    self.waits += 1
+                    waited = True
+            # Another session is computing it. Afterwards the entry is there,
+            # or, if that computation failed, this thread takes it over.
+            done.wait()
+
+        if leader is None:
+            return compute()
+        try:
+            table = compute()
+            self._put(key, table, version)
+            return table
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            leader.set()
+
+    def _put(self, key, table, version):
+        size = table.nbytes
+        with self._lock:
+            if version != self.version or size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[key] = table
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "evictions": self.evictions,
+            }
+
+_cache = ResultCache()
+
+def get_result_cache():
+    return _cache
+
+def cached_table(key, compute, version=None):
+    # compute() returns a pyarrow Table; key is a tuple starting with the
+    # result's name, followed by canonical filters and anything else it
+    # depends on besides the catalog
+    version = get_catalog_version() if version is None else version
+    return _cache.get(key, compute, version)
+
+def cached_rows(key, compute, version=None):
+    # For loaders that build small DataFrames, like a page of a listing. The
+    # frame is kept as an Arrow table and each caller gets its rows as dicts,
+    # so a hit costs only the rows handed out, with no DataFrame copy.
+    table = cached_table(key, lambda: pa.Table.from_pandas(compute(), preserve_index=False), version)
+    return table.to_pylist()
+
+def cached_scalar(key, compute, version=None):
+    table = cached_table(key, lambda: pa.table({"value": [compute()]}), version)
+    return table["value"][0].as_py()
@@ -0,0 +1,265 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import db_utils
+from db_utils import (
+    SELECT_JOURNAL_FIRST_PAGE, SELECT_JOURNAL_PAGE_AFTER, INSERT_JOURNAL_ENTRY, DELETE_JOURNAL_ENTRY,
+    COUNT_FAVORITES, SELECT_FAVORITES, INSERT_FAVORITE, DELETE_FAVORITE,
+)
+
+# "sqlite" keeps user data next to the catalog in the local database file;
+# "postgres" moves it to a shared server so several app processes (or hosts
+# behind a load balancer) see the same journals and favorites.
+BACKEND = os.environ.get("BEER_DIARY_STORAGE", "sqlite")
+POSTGRES_DSN = os.environ.get("BEER_DIARY_POSTGRES_DSN", "")
+DEFAULT_USER = os.environ.get("BEER_DIARY_DEFAULT_USER", "guest")
+
+# Columns of the journal as it was before beers had integer ids
+SELECT_LEGACY_JOURNAL = """
+    SELECT journal_id, user_id, beer_id, brewery_name, abv, look, smell, taste, feel, overall,
+           average_rating, user_notes, tasted_on
+    FROM tasting_journal_legacy
+    ORDER BY journal_id
+"""
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+# ------------------------------
+# Current user
+# ------------------------------
+def current_user_id():
+    # The signed-in account when st.login() is configured, otherwise one
+    # shared local user, as before
+    import streamlit as st
+
+    try:
+        if st.user.get("is_logged_in"):
+            return st.user.get("email") or st.user.get("sub") or DEFAULT_USER
+    except Exception:
+        pass
+    return DEFAULT_USER
+
+def preserve_legacy_journal(conn):
+    # Migration step, shared by both backends: keeps a copy of a journal that
+    # still names its beers, so the table can be recreated with integer ids
+    if conn.execute("SELECT 1 FROM tasting_journal LIMIT 1").fetchone() is not None:
+        conn.execute("CREATE TABLE tasting_journal_legacy AS SELECT * FROM tasting_journal")
+
+# ------------------------------
+# Storage interface
+# ------------------------------
+# Everything the pages read or write per user goes through a Storage. The SQL
+# is shared: statements are written with '?' placeholders and sql() adapts
+# them to the backend's paramstyle. Subclasses supply the pooled connection(),
+# transaction() and snapshot() context managers and ensure_schema().
+#
+# The beer catalog and the brewery store stay in the local SQLite file with
+# either backend: they are read-only reference data, rebuilt on each host by
+# init_db.py, and lean on FTS5 and R*Tree.
+class Storage:
+    name = "base"
+    # Whether its connections can also read the catalog tables
+    holds_catalog = False
+
+    def sql(self, query):
+        return query
+
+    def connection(self):
+        raise NotImplementedError
+
+    def transaction(self):
+        raise NotImplementedError
+
+    def snapshot(self):
+        # A read-only transaction, so several queries see the same data
+        raise NotImplementedError
+
+    def ensure_schema(self):
+        raise NotImplementedError
+
+    def table_exists(self, conn, name):
+        raise NotImplementedError
+
+    def rows(self, query, params=()):
+        # (column names, rows) for loaders that build their own frames
+        with self.connection() as conn:
+            cursor = conn.execute(self.sql(query), params)
+            return [column[0] for column in cursor.description], cursor.fetchall()
+
+    def dicts(self, query, params=()):
+        columns, rows = self.rows(query, params)
+        return [dict(zip(columns, row)) for row in rows]
+
+    # ------------------------------
+    # Journal
+    # ------------------------------
+    def add_journal_rows(self, rows):
+        # One transaction for the whole batch; duplicates on
+        # (user_id, beer_id, tasted_on) are skipped by the unique index
+        if not rows:
+            return 0
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(self.sql(INSERT_JOURNAL_ENTRY), rows)
+            return cursor.rowcount
+
+    def journal_page(self, user_id, after=None, limit=20):
+        if after is None:
+            return self.dicts(SELECT_JOURNAL_FIRST_PAGE, (user_id, limit))
+        return self.dicts(SELECT_JOURNAL_PAGE_AFTER, (user_id, *after, limit))
+
+    def stored_journal_keys(self, user_id, beer_ids):
+        # {(beer_id, tasted_on)} of the user's stored entries for these beers
+        if not beer_ids:
+            return set()
+        _, rows = self.rows(
+            f"SELECT beer_id, tasted_on FROM tasting_journal "
+            f"WHERE user_id = ? AND beer_id IN ({', '.join('?' * len(beer_ids))})",
+            (user_id, *beer_ids),
+        )
+        return {tuple(row) for row in rows}
+
+    def delete_journal_entry(self, user_id, beer_id, tasted_on):
+        with self.transaction() as conn:
+            return conn.execute(self.sql(DELETE_JOURNAL_ENTRY), (user_id, beer_id, tasted_on)).rowcount
+
+    def recent_ratings(self, user_id, limit):
+        # [(beer_id, average rating)], newest first
+        _, rows = self.rows('''
+            SELECT beer_id, average_rating FROM tasting_journal
+            WHERE user_id = ?
+            ORDER BY tasted_on DESC, journal_id DESC
+            LIMIT ?
+        ''', (user_id, limit))
+        return rows
+
+    # ------------------------------
+    # Favorites
+    # ------------------------------
+    def add_favorite(self, user_id, brewery):
+        # False when the brewery was already a favorite
+        with self.transaction() as conn:
+            cursor = conn.execute(self.sql(INSERT_FAVORITE), (
+                brewery["name"], brewery["city"], brewery["state"], brewery["country"],
+                brewery["website_url"], user_id,
+            ))
+            return cursor.rowcount > 0
+
+    def count_favorites(self, user_id, name_pattern="%"):
+        _, rows = self.rows(COUNT_FAVORITES, (user_id, name_pattern))
+        return rows[0][0]
+
+    def favorites_page(self, user_id, name_pattern="%", limit=5, offset=0):
+        return self.dicts(SELECT_FAVORITES, (user_id, name_pattern, limit, offset))
+
+    def delete_favorite(self, user_id, fav_id):
+        with self.transaction() as conn:
+            return conn.execute(self.sql(DELETE_FAVORITE), (user_id, fav_id)).rowcount
+
+    # ------------------------------
+    # Journals from before integer beer ids
+    # ------------------------------
+    def import_legacy_journal(self, resolve):
+        # Moves rows the schema migration set aside into tasting_journal once
+        # the catalog is loaded. resolve maps {(beer name, brewery name)} to
+        # {pair: (beer_id, style_id)}; rows it can't match stay behind for a
+        # later catalog. Returns (imported, unmatched).
+        with self.transaction() as conn:
+            if not self.table_exists(conn, "tasting_journal_legacy"):
+                return 0, 0
+            legacy = conn.execute(self.sql(SELECT_LEGACY_JOURNAL)).fetchall()
+            beers = resolve({(name, brewery or "") for _, _, name, brewery, *_ in legacy})
+            imported, matched = [], []
+            for journal_id, user_id, name, brewery, *values in legacy:
+                beer = beers.get((name, brewery or ""))
+                if beer is not None:
+                    imported.append((user_id or DEFAULT_USER, *beer, *values))
+                    matched.append((journal_id,))
+            cursor = conn.cursor()
+            cursor.executemany(self.sql(INSERT_JOURNAL_ENTRY), imported)
+            cursor.executemany(self.sql("DELETE FROM tasting_journal_legacy WHERE journal_id = ?"), matched)
+            unmatched = len(legacy) - len(matched)
+            if not unmatched:
+                conn.execute("DROP TABLE tasting_journal_legacy")
+        return len(imported), unmatched
+
+    def legacy_journal_leftovers(self):
+        # [(beer name, brewery name, entries)] still waiting in the legacy table
+        with self.connection() as conn:
+            if not self.table_exists(conn, "tasting_journal_legacy"):
+                return []
+            return conn.execute(self.sql("""
+                SELECT beer_id, COALESCE(brewery_name, ''), COUNT(*) FROM tasting_journal_legacy
+                GROUP BY beer_id, COALESCE(brewery_name, '')
+                ORDER BY beer_id
+            """)).fetchall()
+
+    # ------------------------------
+    # Revisions
+    # ------------------------------
+    def data_revision(self, conn, user_id, dataset):
+        # Maintained by triggers on every insert, update and delete
+        row = conn.execute(
+            self.sql("SELECT revision FROM user_data_changes WHERE user_id = ? AND dataset = ?"), (user_id, dataset)
+        ).fetchone()
+        return row[0] if row else 0
+
+# ------------------------------
+# SQLite
+# ------------------------------
+# The pooled WAL connections from db_utils. Safe for several processes on one
+# host; for more than one host use the Postgres backend.
+class SQLiteStorage(Storage):
+    name = "sqlite"
+    holds_catalog = True
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+
+    def connection(self):
+        return db_utils.connection(self.db_path)
+
+    def transaction(self):
+        return db_utils.transaction(self.db_path)
+
+    @contextmanager
+    def snapshot(self):
+        # A deferred BEGIN pins the WAL snapshot at the first read
+        with db_utils.connection(self.db_path) as conn:
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            finally:
+                conn.execute("COMMIT")
+
+    def ensure_schema(self):
+        from migrations import apply_migrations
+
+        return apply_migrations(self.db_path)
+
+    def table_exists(self, conn, name):
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def get_storage(backend=None, db_path=None):
+    # One storage (and so one pool) per backend per process, and per file for
+    # SQLite; db_path defaults to BEER_DIARY_DB. The schema is brought up to
+    # date by init_db.py, not here, so pages don't load the migration code.
+    backend = backend or BACKEND
+    key = (backend, db_path if backend == "sqlite" else None)
+    storage = _storages.get(key)
+    if storage is not None:
+        return storage
+    with _storages_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            if backend == "sqlite":
+                storage = SQLiteStorage(db_path)
+            elif backend == "postgres":
+                from storage_postgres import PostgresStorage
+                storage = PostgresStorage(POSTGRES_DSN)
+            else:
+                raise ValueError(f"Unknown storage backend: {backend}")
+            _storages[key] = storage
+    return storage
@@ -0,0 +1,330 @@
+import functools
+from contextlib import contextmanager
+
+from db_utils import ConnectionPool, POOL_SIZE
+from storage import Storage, preserve_legacy_journal
+from analytics import rollup_statements
+from migrations import journal_rollup_statements_v11
+
+# Key for pg_advisory_xact_lock, so app processes starting together apply the
+# schema one at a time
+SCHEMA_LOCK_ID = 7_202_020
+
+# ------------------------------
+# Schema
+# ------------------------------
+# Same tables, unique keys and trigger-maintained revisions and rollups as
+# the SQLite migrations, for the per-user data only. The applied version is
+# kept in storage_schema; append new migrations at the end. A step is a
+# statement or a callable taking the connection.
+def rollup_function():
+    # Migration 2's function. One row trigger for all three events; the
+    # statements are the SQLite trigger bodies from analytics.py
+    removed = ";\n".join(rollup_statements("old", -1))
+    added = ";\n".join(rollup_statements("new", 1))
+    return f'''
+        CREATE OR REPLACE FUNCTION tasting_journal_rollup() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                {removed};
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                {added};
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    '''
+
+def rollup_function_v1():
+    # Migration 1's function, by style name; the statements are frozen with
+    # SQLite migration 11, which shipped them too
+    removed = ";\n".join(journal_rollup_statements_v11("old", -1))
+    added = ";\n".join(journal_rollup_statements_v11("new", 1))
+    return f'''
+        CREATE OR REPLACE FUNCTION tasting_journal_rollup() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                {removed};
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                {added};
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    '''
+
+REVISION_FUNCTION = '''
+    CREATE OR REPLACE FUNCTION bump_user_data_revision() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO user_data_changes AS c (user_id, dataset, revision, modified_at)
+            VALUES (OLD.user_id, TG_ARGV[0], 1, extract(epoch FROM clock_timestamp()))
+            ON CONFLICT (user_id, dataset) DO UPDATE SET
+                revision = c.revision + 1, modified_at = excluded.modified_at;
+        END IF;
+        IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.user_id IS DISTINCT FROM OLD.user_id) THEN
+            INSERT INTO user_data_changes AS c (user_id, dataset, revision, modified_at)
+            VALUES (NEW.user_id, TG_ARGV[0], 1, extract(epoch FROM clock_timestamp()))
+            ON CONFLICT (user_id, dataset) DO UPDATE SET
+                revision = c.revision + 1, modified_at = excluded.modified_at;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+'''
+
+MIGRATIONS = [
+    (1, "user data tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS tasting_journal (
+            journal_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            beer_id TEXT,
+            style TEXT,
+            brewery_name TEXT,
+            abv DOUBLE PRECISION,
+            look DOUBLE PRECISION,
+            smell DOUBLE PRECISION,
+            taste DOUBLE PRECISION,
+            feel DOUBLE PRECISION,
+            overall DOUBLE PRECISION,
+            average_rating DOUBLE PRECISION,
+            user_notes TEXT,
+            tasted_on TEXT DEFAULT CURRENT_DATE::text
+        )
+        ''',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_tasting_journal_user_beer_date
+        ON tasting_journal (user_id, beer_id, tasted_on)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_tasting_journal_user_tasted_on
+        ON tasting_journal (user_id, tasted_on, journal_id)
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS favorite_breweries (
+            fav_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            brewery_name TEXT,
+            city TEXT,
+            state TEXT,
+            country TEXT,
+            website_url TEXT,
+            user_id TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_favorite_breweries_user_brewery_city
+        ON favorite_breweries (user_id, brewery_name, COALESCE(city, ''))
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_data_changes (
+            user_id TEXT NOT NULL,
+            dataset TEXT NOT NULL,
+            revision INTEGER NOT NULL,
+            modified_at DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (user_id, dataset)
+        )
+        ''',
+        REVISION_FUNCTION,
+        '''
+        CREATE TRIGGER tasting_journal_changes AFTER INSERT OR UPDATE OR DELETE ON tasting_journal
+        FOR EACH ROW EXECUTE FUNCTION bump_user_data_revision('journal')
+        ''',
+        '''
+        CREATE TRIGGER favorite_breweries_changes AFTER INSERT OR UPDATE OR DELETE ON favorite_breweries
+        FOR EACH ROW EXECUTE FUNCTION bump_user_data_revision('favorites')
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS journal_style_stats (
+            user_id TEXT NOT NULL,
+            style TEXT NOT NULL,
+            entry_count INTEGER NOT NULL,
+            look_sum DOUBLE PRECISION NOT NULL,
+            smell_sum DOUBLE PRECISION NOT NULL,
+            taste_sum DOUBLE PRECISION NOT NULL,
+            feel_sum DOUBLE PRECISION NOT NULL,
+            overall_sum DOUBLE PRECISION NOT NULL,
+            rating_sum DOUBLE PRECISION NOT NULL,
+            rating_sq_sum DOUBLE PRECISION NOT NULL,
+            abv_sum DOUBLE PRECISION NOT NULL,
+            abv_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, style)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS journal_monthly_stats (
+            user_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            entry_count INTEGER NOT NULL,
+            rating_sum DOUBLE PRECISION NOT NULL,
+            abv_sum DOUBLE PRECISION NOT NULL,
+            abv_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, month)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS journal_score_counts (
+            user_id TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            score DOUBLE PRECISION NOT NULL,
+            entry_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, dimension, score)
+        )
+        ''',
+        rollup_function_v1(),
+        '''
+        CREATE TRIGGER tasting_journal_rollup AFTER INSERT OR UPDATE OR DELETE ON tasting_journal
+        FOR EACH ROW EXECUTE FUNCTION tasting_journal_rollup()
+        ''',
+    ]),
+    # Beers and styles by catalog id; rows are moved back from
+    # tasting_journal_legacy by init_db.py once the catalog is loaded
+    (2, "journal keyed by catalog ids", [
+        preserve_legacy_journal,
+        "DROP TABLE tasting_journal",
+        '''
+        CREATE TABLE tasting_journal (
+            journal_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            beer_id BIGINT NOT NULL,
+            style_id INTEGER NOT NULL,
+            abv DOUBLE PRECISION,
+            look DOUBLE PRECISION,
+            smell DOUBLE PRECISION,
+            taste DOUBLE PRECISION,
+            feel DOUBLE PRECISION,
+            overall DOUBLE PRECISION,
+            average_rating DOUBLE PRECISION,
+            user_notes TEXT,
+            tasted_on TEXT DEFAULT CURRENT_DATE::text
+        )
+        ''',
+        '''
+        CREATE UNIQUE INDEX idx_tasting_journal_user_beer_date
+        ON tasting_journal (user_id, beer_id, tasted_on)
+        ''',
+        '''
+        CREATE INDEX idx_tasting_journal_user_tasted_on
+        ON tasting_journal (user_id, tasted_on, journal_id)
+        ''',
+        '''
+        CREATE TRIGGER tasting_journal_changes AFTER INSERT OR UPDATE OR DELETE ON tasting_journal
+        FOR EACH ROW EXECUTE FUNCTION bump_user_data_revision('journal')
+        ''',
+        "DROP TABLE journal_style_stats",
+        '''
+        CREATE TABLE journal_style_stats (
+            user_id TEXT NOT NULL,
+            style_id INTEGER NOT NULL,
+            entry_count INTEGER NOT NULL,
+            look_sum DOUBLE PRECISION NOT NULL,
+            smell_sum DOUBLE PRECISION NOT NULL,
+            taste_sum DOUBLE PRECISION NOT NULL,
+            feel_sum DOUBLE PRECISION NOT NULL,
+            overall_sum DOUBLE PRECISION NOT NULL,
+            rating_sum DOUBLE PRECISION NOT NULL,
+            rating_sq_sum DOUBLE PRECISION NOT NULL,
+            abv_sum DOUBLE PRECISION NOT NULL,
+            abv_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, style_id)
+        )
+        ''',
+        "DELETE FROM journal_monthly_stats",
+        "DELETE FROM journal_score_counts",
+        rollup_function(),
+        '''
+        CREATE TRIGGER tasting_journal_rollup AFTER INSERT OR UPDATE OR DELETE ON tasting_journal
+        FOR EACH ROW EXECUTE FUNCTION tasting_journal_rollup()
+        ''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# ------------------------------
+# Connection pool
+# ------------------------------
+# The db_utils pool with psycopg connections; db_path holds the DSN. psycopg
+# prepares a statement server-side once it has run a few times on a
+# connection, much like sqlite3's statement cache.
+class PostgresPool(ConnectionPool):
+    def _connect(self):
+        # Optional dependency, only needed with BEER_DIARY_STORAGE=postgres
+        import psycopg
+
+        return psycopg.connect(self.db_path, autocommit=True, application_name="beer-diary")
+
+    def release(self, conn):
+        from psycopg.pq import TransactionStatus
+
+        if conn.broken or conn.closed:
+            # Dropped by the server; the pool opens a new one when needed
+            with self._lock:
+                self._created -= 1
+            return
+        if conn.info.transaction_status != TransactionStatus.IDLE:
+            conn.rollback()
+        self._idle.put(conn)
+
+@functools.lru_cache(maxsize=256)
+def to_pyformat(query):
+    # The shared statements use '?' and never put one inside a literal
+    return query.replace("%", "%%").replace("?", "%s")
+
+# ------------------------------
+# Storage
+# ------------------------------
+class PostgresStorage(Storage):
+    name = "postgres"
+
+    def __init__(self, dsn, size=POOL_SIZE):
+        if not dsn:
+            raise ValueError("BEER_DIARY_POSTGRES_DSN must be set for the postgres storage backend")
+        self.pool = PostgresPool(dsn, size)
+
+    def sql(self, query):
+        return to_pyformat(query)
+
+    @contextmanager
+    def connection(self):
+        conn = self.pool.acquire()
+        try:
+            yield conn
+        finally:
+            self.pool.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            with conn.transaction():
+                yield conn
+
+    @contextmanager
+    def snapshot(self):
+        with self.connection() as conn:
+            with conn.transaction():
+                conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                yield conn
+
+    def table_exists(self, conn, name):
+        return conn.execute("SELECT to_regclass(%s) IS NOT NULL", (name,)).fetchone()[0]
+
+    def ensure_schema(self):
+        applied = []
+        with self.transaction() as conn:
+            conn.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+            conn.execute("CREATE TABLE IF NOT EXISTS storage_schema (version INTEGER PRIMARY KEY)")
+            current = conn.execute("SELECT COALESCE(MAX(version), 0) FROM storage_schema").fetchone()[0]
+            for version, name, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.execute(statement)
+                conn.execute("INSERT INTO storage_schema (version) VALUES (%s)", (version,))
+                applied.append((version, name))
+        return applied
@@ -0,0 +1,154 @@
+import json
+import numpy as np
+import pandas as pd
+
+from db_utils import connection, get_meta, set_meta
+from catalog import build_beer_filter
+from instrumentation import timed
+
+HISTOGRAM_BINS = 200
+DISPLAY_BINS = 20
+SAMPLE_BREWERIES = 3
+
+STAT_COLUMNS = ["style", "beer_count", "abv_sum", "abv_min", "abv_max", "ibu_sum", "ibu_min", "ibu_max"]
+
+# ------------------------------
+# Aggregation
+# ------------------------------
+# Every histogram uses the same fine-grained, catalog-wide bin edges, so
+# per-style bins can be summed for any selection of styles and then coarsened
+# to the range that selection actually covers.
+def histogram_edges(cursor):
+    edges = get_meta(cursor, 'abv_histogram_edges')
+    return np.array(json.loads(edges)) if edges else None
+
+def compute_histogram_edges(cursor):
+    cursor.execute("SELECT MIN(abv), MAX(abv) FROM beers_catalog")
+    lo, hi = cursor.fetchone()
+    lo, hi = lo or 0.0, hi or 0.0
+    if hi <= lo:
+        hi = lo + 1.0
+    return np.linspace(lo, hi, HISTOGRAM_BINS + 1)
+
+def aggregate_style_stats(conn, edges, styles=None, abv_range=None):
+    # Grouped on the integer style_id; the name comes along from the view
+    source, style_filter, params, _ = build_beer_filter(styles, abv_range, table="beer_details")
+
+    stats = pd.read_sql_query(f"""
+        SELECT b.style, COUNT(*) AS beer_count,
+               SUM(b.abv) AS abv_sum, MIN(b.abv) AS abv_min, MAX(b.abv) AS abv_max,
+               SUM(b.ibu) AS ibu_sum, MIN(b.ibu) AS ibu_min, MAX(b.ibu) AS ibu_max
+        FROM {source} {style_filter}
+        GROUP BY b.style_id
+        ORDER BY b.style
+    """, conn, params=params)
+
+    lo, width = float(edges[0]), float(edges[1] - edges[0])
+    bins = conn.execute(f"""
+        SELECT b.style, MIN(MAX(CAST((b.abv - ?) / ? AS INTEGER), 0), ?) AS bin, COUNT(*)
+        FROM {source} {style_filter}
+        GROUP BY b.style_id, bin
+    """, (lo, width, HISTOGRAM_BINS - 1, *params)).fetchall()
+    histograms = {style: [0] * HISTOGRAM_BINS for style in stats["style"]}
+    for style, bin_index, count in bins:
+        histograms[style][bin_index] = count
+
+    # First few distinct breweries per style, in catalog order
+    samples = conn.execute(f"""
+        SELECT style, brewery_name FROM (
+            SELECT b.style, b.brewery_name,
+                   ROW_NUMBER() OVER (PARTITION BY b.style_id ORDER BY MIN(b.beer_id)) AS rank
+            FROM {source} {f"{style_filter} AND" if style_filter else "WHERE"} b.brewery_name != ''
+            GROUP BY b.style_id, b.brewery_id
+        )
+        WHERE rank <= ?
+        ORDER BY style, rank
+    """, (*params, SAMPLE_BREWERIES)).fetchall()
+    breweries = {style: [] for style in stats["style"]}
+    for style, brewery_name in samples:
+        breweries[style].append(brewery_name)
+
+    stats["abv_histogram"] = stats["style"].map(histograms)
+    stats["sample_breweries"] = stats["style"].map(breweries)
+    return stats
+
+def refresh_style_stats(conn, styles=None):
+    # Called inside the catalog load transaction. Given style names, only
+    # their rows are rebuilt, provided the catalog-wide ABV range (and so
+    # every histogram's bin edges) hasn't moved.
+    cursor = conn.cursor()
+    edges = compute_histogram_edges(cursor)
+    stored = histogram_edges(cursor)
+    if styles is not None and stored is not None and np.array_equal(edges, stored):
+        if not styles:
+            return
+        stats = aggregate_style_stats(conn, edges, styles)
+        cursor.execute(f"DELETE FROM style_stats WHERE style IN ({', '.join('?' * len(styles))})", list(styles))
+    else:
+        stats = aggregate_style_stats(conn, edges)
+        cursor.execute("DELETE FROM style_stats")
+    set_meta(cursor, 'abv_histogram_edges', json.dumps(edges.tolist()))
+    cursor.executemany("""
+        INSERT INTO style_stats (
+            style, beer_count, abv_sum, abv_min, abv_max, ibu_sum, ibu_min, ibu_max,
+            abv_histogram, sample_breweries
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (*row[:len(STAT_COLUMNS)], json.dumps(row.abv_histogram), json.dumps(row.sample_breweries))
+        for row in stats.itertuples(index=False)
+    ])
+
+# ------------------------------
+# Reading stats for a filter
+# ------------------------------
+@timed(kind="loader")
+def load_style_stats(styles=None, abv_range=None):
+    with connection() as conn:
+        edges = histogram_edges(conn.cursor())
+        full_abv_range = (
+            edges is not None and abv_range is not None
+            and abv_range[0] <= edges[0] and abv_range[1] >= edges[-1]
+        )
+        if edges is not None and (abv_range is None or full_abv_range):
+            # Style-only filters are served straight from the materialized table
+            query = "SELECT * FROM style_stats"
+            params = []
+            if styles:
+                query += f" WHERE style IN ({', '.join('?' * len(styles))})"
+                params = list(styles)
+            stats = pd.read_sql_query(query + " ORDER BY style", conn, params=params)
+            stats["abv_histogram"] = stats["abv_histogram"].map(json.loads)
+            stats["sample_breweries"] = stats["sample_breweries"].map(json.loads)
+        else:
+            # A narrowed ABV range cuts across styles; aggregate just that slice
+            edges = edges if edges is not None else compute_histogram_edges(conn.cursor())
+            stats = aggregate_style_stats(conn, edges, styles, abv_range)
+    return stats, edges
+
+def combine_style_stats(stats):
+    beer_count = int(stats["beer_count"].sum())
+    histogram = np.sum(np.array(stats["abv_histogram"].tolist()), axis=0) if beer_count else np.zeros(HISTOGRAM_BINS)
+    return {
+        "beer_count": beer_count,
+        "abv_mean": stats["abv_sum"].sum() / beer_count if beer_count else 0.0,
+        "ibu_mean": stats["ibu_sum"].sum() / beer_count if beer_count else 0.0,
+        "abv_min": stats["abv_min"].min(),
+        "abv_max": stats["abv_max"].max(),
+        "ibu_min": stats["ibu_min"].min(),
+        "ibu_max": stats["ibu_max"].max(),
+        "abv_histogram": histogram.astype(int),
+    }
+
+def coarsen_histogram(histogram, edges, bins=DISPLAY_BINS):
+    # Trim empty tails, then merge neighbouring fine bins into ~`bins` groups
+    occupied = np.flatnonzero(histogram)
+    if len(occupied) == 0:
+        return np.array([], dtype=int), np.array([])
+    histogram = histogram[occupied[0]:occupied[-1] + 1]
+    edges = edges[occupied[0]:occupied[-1] + 2]
+    group = -(-len(histogram) // bins)
+    padded = np.pad(histogram, (0, -len(histogram) % group))
+    counts = padded.reshape(-1, group).sum(axis=1)
+    lower = edges[:-1][::group]
+    width = (edges[1] - edges[0]) * group
+    return counts, np.append(lower, lower[-1] + width)
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+# The app is a flat set of top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_utils
+from migrations import apply_migrations
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    # A migrated, empty database that code opening the default path uses too
+    path = str(tmp_path / "craft_beer.db")
+    monkeypatch.setattr(db_utils, "DB_PATH", path)
+    apply_migrations(path)
+    yield path
+    db_utils.get_pool(path).close_all()
+
+# (key, name, style key, style, brewery, abv); flavors and ratings are filled in
+BEERS = [
+    (251, "Amber", 8, "Altbier", "Alaskan Brewing Co.", 5.3),
+    (252, "Double Bag", 8, "Altbier", "Long Trail Brewing Co.", 7.2),
+    (253, "Long Trail Ale", 8, "Altbier", "Long Trail Brewing Co.", 5.0),
+    (301, "Pale Ale", 12, "Pale Ale - American", "Sierra Nevada Brewing Co.", 5.6),
+    (302, "Pale Ale", 12, "Pale Ale - American", "Deschutes Brewery", 5.2),
+]
+
+def write_catalog_csv(path, beers=BEERS):
+    import csv
+
+    flavors = ["Astringency", "Body", "Alcohol", "Bitter", "Sweet", "Sour", "Salty", "Fruits", "Hoppy",
+               "Spices", "Malty"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "key", "Style", "Style Key", "Brewery", "Description", "ABV", "Ave Rating",
+                         "Min IBU", "Max IBU", *flavors])
+        for key, name, style_key, style, brewery, abv in beers:
+            writer.writerow([name, key, style, style_key, brewery, f"{name} description", abv, 3.8, 20, 40,
+                             *range(10, 10 + len(flavors))])
+    return path
+
+@pytest.fixture
+def catalog_db(db_path, tmp_path):
+    # db_path with BEERS loaded as catalog version 1
+    from catalog_ingest import refresh_catalog
+
+    refresh_catalog(db_path, write_catalog_csv(str(tmp_path / "beers.csv")))
+    return db_path
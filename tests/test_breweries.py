@@ -0,0 +1,21 @@
+import breweries
+from db_utils import transaction
+
+def add_breweries(db_path, points):
+    with transaction(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO breweries (id, name, brewery_type, city, state, country, latitude, longitude) "
+            "VALUES (?, ?, 'micro', 'Portland', 'Oregon', 'United States', ?, ?)",
+            [(f"b{n}", f"Brewery {n}", latitude, longitude) for n, (latitude, longitude) in enumerate(points)],
+        )
+
+def test_breweries_near_returns_every_match_nearest_first(db_path):
+    # A 0.01° grid around Portland, plus one brewery outside the radius
+    add_breweries(db_path, [(45.5 + i * 0.01, -122.6 + j * 0.01) for i in range(5) for j in range(5)] + [(47.6, -122.3)])
+    nearby = breweries.breweries_near(45.5, -122.6, 50)
+    assert len(nearby) == 25
+    assert nearby["distance_km"].is_monotonic_increasing
+    assert nearby.iloc[0]["id"] == "b0"
+    # The radius is exact, not the bounding box
+    assert len(breweries.breweries_near(45.5, -122.6, 1.2)) == 3
+    assert len(breweries.breweries_near(45.5, -122.6, 1.2, states=["Washington"])) == 0
@@ -0,0 +1,137 @@
+import json
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+import requests
+
+import brewery_sync
+from db_utils import connection
+
+# ------------------------------
+# Stub OpenBreweryDB
+# ------------------------------
+class StubAPI:
+    def __init__(self, breweries):
+        self.breweries = list(breweries)
+        self.failures = {}      # page -> (status, responses left to fail)
+        self.requests = []      # (page or "meta", status sent)
+        self.lock = threading.Lock()
+
+    def respond(self, path, query, headers):
+        if path.endswith("/breweries/meta"):
+            return "meta", 200, {"total": len(self.breweries)}, None
+        page, per_page = int(query["page"][0]), int(query["per_page"][0])
+        with self.lock:
+            status, left = self.failures.get(page, (None, 0))
+            if left:
+                self.failures[page] = (status, left - 1)
+                return page, status, {"message": "try again"}, None
+        rows = self.breweries[(page - 1) * per_page:page * per_page]
+        etag = '"%s"' % hashlib.sha256(json.dumps(rows).encode()).hexdigest()[:16]
+        if headers.get("If-None-Match") == etag:
+            return page, 304, None, etag
+        return page, 200, rows, etag
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                page, status, body, etag = api.respond(url.path, parse_qs(url.query), self.headers)
+                with api.lock:
+                    api.requests.append((page, status))
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                payload = b"" if body is None else json.dumps(body).encode()
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+def brewery(n):
+    return {"id": f"b{n}", "name": f"Brewery {n}", "brewery_type": "micro", "city": "Portland",
+            "state": "Oregon", "country": "United States", "latitude": "45.5", "longitude": "-122.6",
+            "website_url": None}
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(brewery_sync, "BACKOFF_SECONDS", 0)
+    stub = StubAPI(brewery(n) for n in range(5))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub.handler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stub.url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    yield stub
+    server.shutdown()
+    server.server_close()
+
+def sync(api, db_path, **kwargs):
+    return brewery_sync.sync_breweries(api.url, per_page=2, max_workers=2, db_path=db_path, **kwargs)
+
+def stored_ids(db_path):
+    with connection(db_path) as conn:
+        return sorted(row[0] for row in conn.execute("SELECT id FROM breweries"))
+
+def page_statuses(api, page):
+    return [status for requested, status in api.requests if requested == page]
+
+# ------------------------------
+# Tests
+# ------------------------------
+def test_fetches_every_page(api, db_path):
+    assert sync(api, db_path) == 3
+    assert stored_ids(db_path) == [f"b{n}" for n in range(5)]
+    assert sorted(page for page, _ in api.requests if page != "meta") == [1, 2, 3]
+
+def test_retries_server_errors_and_rate_limits(api, db_path):
+    api.failures = {2: (503, 2), 3: (429, 1)}
+    sync(api, db_path)
+    assert page_statuses(api, 2) == [503, 503, 200]
+    assert page_statuses(api, 3) == [429, 200]
+    assert len(stored_ids(db_path)) == 5
+
+def test_gives_up_after_max_retries(api, db_path, monkeypatch):
+    monkeypatch.setattr(brewery_sync, "MAX_RETRIES", 1)
+    api.failures = {1: (500, 10)}
+    with pytest.raises(requests.HTTPError):
+        sync(api, db_path)
+    assert page_statuses(api, 1) == [500, 500]
+
+def test_unchanged_pages_answer_304(api, db_path):
+    sync(api, db_path)
+    api.requests.clear()
+    api.breweries[4]["name"] = "Renamed Brewery"
+    sync(api, db_path, force=True)
+    assert page_statuses(api, 1) == [304]
+    assert page_statuses(api, 2) == [304]
+    assert page_statuses(api, 3) == [200]
+    with connection(db_path) as conn:
+        assert conn.execute("SELECT name FROM breweries WHERE id = 'b4'").fetchone()[0] == "Renamed Brewery"
+    # Rows behind a 304 are kept, not treated as gone
+    assert len(stored_ids(db_path)) == 5
+
+def test_fresh_pages_are_skipped(api, db_path):
+    sync(api, db_path)
+    api.requests.clear()
+    assert sync(api, db_path) == 0
+    assert api.requests == [("meta", 200)]
+
+def test_deletes_breweries_the_api_no_longer_lists(api, db_path):
+    sync(api, db_path)
+    del api.breweries[1]
+    sync(api, db_path, force=True)
+    assert stored_ids(db_path) == ["b0", "b2", "b3", "b4"]
+    with connection(db_path) as conn:
+        # Pages past the new end are forgotten as well
+        assert [row[0] for row in conn.execute("SELECT page FROM brewery_sync_pages ORDER BY page")] == [1, 2]
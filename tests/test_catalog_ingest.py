@@ -0,0 +1,101 @@
+import pytest
+
+import catalog_ingest
+from conftest import BEERS, write_catalog_csv
+from catalog import count_beers
+from catalog_ingest import refresh_catalog, describe_changes
+from db_utils import connection, get_meta
+
+# Chunks of two rows, so every change below crosses a batch boundary
+CHUNK = 2
+
+def catalog(path):
+    with connection(path) as conn:
+        return {beer_id: (name, style, abv, row_hash) for beer_id, name, style, abv, row_hash in conn.execute(
+            "SELECT b.beer_id, b.beer_name, s.style, b.abv, b.row_hash "
+            "FROM beers_catalog b JOIN styles s USING (style_id)"
+        )}
+
+def meta(path, key):
+    with connection(path) as conn:
+        return get_meta(conn.cursor(), key)
+
+def style_counts(path):
+    with connection(path) as conn:
+        return dict(conn.execute("SELECT style, beer_count FROM style_stats"))
+
+@pytest.fixture
+def load(db_path, tmp_path):
+    def run(beers, name="beers.csv"):
+        return refresh_catalog(db_path, write_catalog_csv(str(tmp_path / name), beers), chunk_size=CHUNK)
+    return run
+
+# ------------------------------
+# Tests
+# ------------------------------
+def test_first_load_inserts_everything(load, db_path):
+    version, changes = load(BEERS)
+    assert (version, changes) == (1, {"inserted": 5, "updated": 0, "deleted": 0})
+    assert describe_changes(changes) == "5 new, 0 updated, 0 removed"
+    assert len(catalog(db_path)) == 5
+    assert style_counts(db_path) == {"Altbier": 3, "Pale Ale - American": 2}
+    assert meta(db_path, "catalog_refresh_pending") == "0"
+
+def test_an_unchanged_file_is_skipped(load):
+    load(BEERS)
+    assert load(BEERS, "copy.csv") == (1, None)
+
+def test_only_changed_rows_are_written(load, db_path):
+    load(BEERS)
+    before = catalog(db_path)
+    beers = [beer for beer in BEERS if beer[0] != 253]
+    beers[1] = (252, "Double Bag", 8, "Altbier", "Long Trail Brewing Co.", 7.5)
+    beers.append((254, "Hazy Double", 12, "Pale Ale - American", "Long Trail Brewing Co.", 8.0))
+    version, changes = load(beers, "changed.csv")
+    assert (version, changes) == (2, {"inserted": 1, "updated": 1, "deleted": 1})
+
+    after = catalog(db_path)
+    assert set(after) == {251, 252, 254, 301, 302}
+    assert after[252][2] == 7.5 and after[252][3] != before[252][3]
+    for beer_id in (251, 301, 302):
+        assert after[beer_id] == before[beer_id]
+    # Stats and the search index follow the changed rows
+    assert style_counts(db_path) == {"Altbier": 2, "Pale Ale - American": 3}
+    assert count_beers(search_term="hazy") == 1
+    assert count_beers(search_term="double") == 2
+
+def test_a_renamed_style_reaches_its_beers(load, db_path):
+    load(BEERS)
+    beers = [(*beer[:3], "Altbier - German" if beer[2] == 8 else beer[3], *beer[4:]) for beer in BEERS]
+    version, changes = load(beers, "renamed.csv")
+    assert (version, changes) == (2, {"inserted": 0, "updated": 3, "deleted": 0})
+    assert {style for _, style, _, _ in catalog(db_path).values()} == {"Altbier - German", "Pale Ale - American"}
+    assert style_counts(db_path) == {"Altbier - German": 3, "Pale Ale - American": 2}
+    assert count_beers(search_term="german") == 3
+
+def test_an_interrupted_refresh_is_finished_by_the_next(load, db_path, monkeypatch):
+    load(BEERS)
+    beers = [(*beer[:5], beer[5] + 1) for beer in BEERS]
+    apply_chunk = catalog_ingest.apply_chunk
+    calls = []
+
+    def fail_second_chunk(conn, df, touched_styles):
+        calls.append(len(df))
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        return apply_chunk(conn, df, touched_styles)
+
+    monkeypatch.setattr(catalog_ingest, "apply_chunk", fail_second_chunk)
+    with pytest.raises(RuntimeError):
+        load(beers, "changed.csv")
+    # The first batch committed, but the version and stats didn't move
+    assert meta(db_path, "catalog_refresh_pending") == "1"
+    assert meta(db_path, "catalog_version") == "1"
+
+    monkeypatch.setattr(catalog_ingest, "apply_chunk", apply_chunk)
+    version, changes = load(beers, "changed.csv")
+    assert (version, changes) == (2, {"inserted": 0, "updated": 3, "deleted": 0})
+    assert meta(db_path, "catalog_refresh_pending") == "0"
+    assert sorted(abv for _, _, abv, _ in catalog(db_path).values()) == sorted(beer[5] + 1 for beer in BEERS)
+    with connection(db_path) as conn:
+        assert conn.execute("SELECT abv_max FROM style_stats WHERE style = 'Altbier'").fetchone() == (8.2,)
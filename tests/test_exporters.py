@@ -0,0 +1,59 @@
+import csv
+import os
+
+import pytest
+
+import exporters
+from db_utils import transaction, set_meta
+from storage import get_storage
+
+USER = "taster@example.com"
+
+@pytest.fixture
+def journal(catalog_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(exporters, "EXPORT_DIR", str(tmp_path / "exports"))
+    # beer_id, style_id, abv, look, smell, taste, feel, overall, average, notes, tasted_on
+    get_storage().add_journal_rows([
+        (USER, 252, 8, 7.2, 4, 4, 4.5, 4, 4, 4.1, "malty", "2026-01-02"),
+        (USER, 301, 12, 5.6, 3, 3.5, 3.5, 3, 3.5, 3.3, "", "2026-01-03"),
+    ])
+    return catalog_db
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def test_journal_export_names_beers_and_styles(journal):
+    rows = read_rows(exporters.export_dataset("journal", USER, "csv"))
+    assert [(row["beer_name"], row["brewery_name"], row["style"]) for row in rows] == [
+        ("Pale Ale", "Sierra Nevada Brewing Co.", "Pale Ale - American"),
+        ("Double Bag", "Long Trail Brewing Co.", "Altbier"),
+    ]
+
+def test_export_is_reused_until_data_changes(journal):
+    first = exporters.export_dataset("journal", USER, "csv")
+    assert exporters.export_dataset("journal", USER, "csv") == first
+    get_storage().delete_journal_entry(USER, 301, "2026-01-03")
+    second = exporters.export_dataset("journal", USER, "csv")
+    assert second != first and not os.path.exists(first)
+    assert len(read_rows(second)) == 1
+
+def test_catalog_refresh_retires_cached_exports(journal):
+    first = exporters.export_dataset("journal", USER, "csv")
+    with transaction() as conn:
+        conn.execute("UPDATE beers_catalog SET beer_name = 'Double Bag Alt' WHERE beer_id = 252")
+        set_meta(conn.cursor(), "catalog_version", 2)
+    second = exporters.export_dataset("journal", USER, "csv")
+    assert second != first and not os.path.exists(first)
+    assert read_rows(second)[1]["beer_name"] == "Double Bag Alt"
+
+def test_export_fits_in_a_single_connection_pool(journal, monkeypatch):
+    # The names are read through the snapshot's connection, not a second one
+    import db_utils
+
+    pool = db_utils.get_pool()
+    monkeypatch.setattr(pool, "size", 1)
+    monkeypatch.setattr(pool, "timeout", 1)
+    pool.close_all()
+    for fmt in exporters.FORMATS:
+        assert os.path.exists(exporters.export_dataset("journal", USER, fmt))
@@ -0,0 +1,36 @@
+from collections import OrderedDict
+
+import pytest
+
+import images
+
+@pytest.fixture
+def failures(monkeypatch):
+    monkeypatch.setattr(images, "_failures", OrderedDict())
+    return images._failures
+
+def test_broken_sources_are_remembered_for_a_while(failures, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(images.time, "time", lambda: now[0])
+    images.record_failure("a")
+    assert images.failed_recently("a")
+    now[0] += images.FAILURE_TTL
+    assert not images.failed_recently("a")
+    # Expired entries go as soon as anything else fails
+    images.record_failure("b")
+    assert list(failures) == ["b"]
+
+def test_broken_sources_are_capped(failures, monkeypatch):
+    monkeypatch.setattr(images, "MAX_FAILURES", 3)
+    for key in "abcde":
+        images.record_failure(key)
+    assert list(failures) == ["c", "d", "e"]
+
+def test_prefetch_reuses_one_pool(failures, tmp_path, monkeypatch):
+    monkeypatch.setattr(images, "THUMBNAIL_DIR", str(tmp_path / "thumbnails"))
+    missing = str(tmp_path / "missing.png")
+    first = images.prefetch_thumbnails([missing, images.PLACEHOLDER])
+    executor = images.get_executor()
+    second = images.prefetch_thumbnails([missing])
+    assert images.get_executor() is executor
+    assert first[missing] == first[images.PLACEHOLDER] == second[missing] == images.placeholder()
@@ -0,0 +1,152 @@
+import os
+import sqlite3
+
+import pytest
+
+import catalog_cache
+import db_utils
+import recommender
+from conftest import BEERS, write_catalog_csv
+from db_utils import connection, get_pool
+from init_db import initialize_database_if_needed
+from migrations import apply_migrations
+
+# ------------------------------
+# A database from before migrations
+# ------------------------------
+# The schema the first init_db.py created, with journal rows written the way
+# the first Tasting Journal page did: the beer's name in beer_id and no
+# brewery, style or ABV.
+BASELINE_SCHEMA = '''
+    CREATE TABLE beers_catalog (
+        beer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        beer_name TEXT, brewery_name TEXT, style TEXT, abv REAL, ibu REAL, description TEXT
+    );
+    CREATE TABLE tasting_journal (
+        journal_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT, beer_id TEXT, style TEXT, brewery_name TEXT, abv REAL,
+        look REAL, smell REAL, taste REAL, feel REAL, overall REAL, average_rating REAL,
+        user_notes TEXT, tasted_on DATE DEFAULT CURRENT_DATE
+    );
+    CREATE TABLE favorite_breweries (
+        fav_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        brewery_name TEXT, city TEXT, state TEXT, country TEXT, website_url TEXT, user_id TEXT
+    );
+'''
+
+def baseline_db(path, tasted):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO beers_catalog (beer_name, brewery_name, style, abv, ibu, description) VALUES (?, ?, ?, ?, ?, ?)",
+        [("Amber", "Alaskan Brewing Co.", "Altbier", 5.3, 30.0, ""),
+         ("Double Bag", "Long Trail Brewing Co.", "Altbier", 7.2, 30.0, "")],
+    )
+    conn.executemany('''
+        INSERT INTO tasting_journal (user_id, beer_id, look, smell, taste, feel, overall, average_rating, user_notes)
+        VALUES ('guest', ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(name, score, score, score, score, score, float(score), f"{name} notes") for name, score in tasted])
+    conn.commit()
+    conn.close()
+    return path
+
+@pytest.fixture
+def upgrade(tmp_path, monkeypatch):
+    # Nothing may fall back to the default database
+    monkeypatch.setattr(db_utils, "DB_PATH", str(tmp_path / "default.db"))
+    monkeypatch.setattr(catalog_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(recommender, "CACHE_DIR", str(tmp_path / "cache"))
+    path = str(tmp_path / "craft_beer.db")
+    csv_path = write_catalog_csv(str(tmp_path / "beers.csv"))
+
+    def run(tasted):
+        baseline_db(path, tasted)
+        initialize_database_if_needed(path, csv_path)
+        return path
+
+    yield run
+    get_pool(path).close_all()
+    assert not os.path.exists(db_utils.DB_PATH)
+
+def journal(path):
+    with connection(path) as conn:
+        return conn.execute(
+            "SELECT user_id, beer_id, style_id, overall, user_notes FROM tasting_journal ORDER BY beer_id"
+        ).fetchall()
+
+def legacy(path):
+    with connection(path) as conn:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'tasting_journal_legacy'").fetchone() is None:
+            return None
+        return conn.execute("SELECT beer_id, brewery_name FROM tasting_journal_legacy").fetchall()
+
+# ------------------------------
+# Tests
+# ------------------------------
+def test_baseline_journal_is_imported_by_name(upgrade):
+    path = upgrade([("Double Bag", 4), ("Long Trail Ale", 3)])
+    assert journal(path) == [
+        ("guest", 252, 8, 4.0, "Double Bag notes"),
+        ("guest", 253, 8, 3.0, "Long Trail Ale notes"),
+    ]
+    assert legacy(path) is None
+    # Migration 11's rollups were rebuilt by style id as the rows came in
+    with connection(path) as conn:
+        assert conn.execute("SELECT user_id, style_id, entry_count, rating_sum FROM journal_style_stats").fetchall() == [
+            ("guest", 8, 2, 7.0),
+        ]
+
+def test_ambiguous_names_are_kept_aside_until_they_name_a_brewery(upgrade, tmp_path, capsys):
+    path = upgrade([("Double Bag", 4), ("Pale Ale", 5), ("Mystery Ale", 2)])
+    assert journal(path) == [("guest", 252, 8, 4.0, "Double Bag notes")]
+    assert sorted(legacy(path)) == [("Mystery Ale", None), ("Pale Ale", None)]
+    out = capsys.readouterr().out
+    assert "Pale Ale (1): brewed by Deschutes Brewery, Sierra Nevada Brewing Co." in out
+    assert "Mystery Ale (1): not in the catalog" in out
+
+    # The recovery init_db.py prints
+    with connection(path) as conn:
+        conn.execute("UPDATE tasting_journal_legacy SET brewery_name = 'Deschutes Brewery' WHERE beer_id = 'Pale Ale'")
+        conn.commit()
+    initialize_database_if_needed(path, str(tmp_path / "beers.csv"))
+    assert journal(path)[-1] == ("guest", 302, 12, 5.0, "Pale Ale notes")
+    assert legacy(path) == [("Mystery Ale", None)]
+
+def schema(path):
+    # Columns of every table and the text of every trigger and index
+    with connection(path) as conn:
+        objects = conn.execute(
+            "SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' AND name != 'tasting_journal_legacy'"
+        ).fetchall()
+        return {
+            name: [row[1:3] for row in conn.execute(f"PRAGMA table_info('{name}')")] if kind == "table"
+            else " ".join((sql or "").split())
+            for kind, name, sql in objects
+        }
+
+def test_upgraded_schema_matches_a_fresh_one(upgrade, tmp_path):
+    path = upgrade([("Double Bag", 4)])
+    fresh = str(tmp_path / "fresh.db")
+    apply_migrations(fresh)
+    try:
+        assert schema(path) == schema(fresh)
+    finally:
+        get_pool(fresh).close_all()
+
+def test_databases_sharing_a_cache_keep_their_own_files(upgrade, tmp_path, monkeypatch):
+    path = upgrade([])
+    other = str(tmp_path / "other.db")
+    initialize_database_if_needed(other, write_catalog_csv(str(tmp_path / "other.csv"), BEERS[:2]))
+    try:
+        # Both start at catalog version 1
+        for version_path in (catalog_cache.catalog_path, recommender.index_path):
+            assert version_path(1, path) != version_path(1, other)
+            assert os.path.exists(version_path(1, path)) and os.path.exists(version_path(1, other))
+        # Loading for one database doesn't hand out the other's
+        for db, beers in ((path, len(BEERS)), (other, 2), (path, len(BEERS))):
+            with monkeypatch.context() as patch:
+                patch.setattr(db_utils, "DB_PATH", db)
+                assert catalog_cache.load_catalog_table(1).num_rows == beers
+                assert len(recommender.load_flavor_index(1)["beer_ids"]) == beers
+    finally:
+        get_pool(other).close_all()
@@ -0,0 +1,102 @@
+import logging
+import threading
+
+import pytest
+
+import journal
+from journal import JournalWriter, SessionJournal
+from storage import SQLiteStorage
+
+USER = "taster@example.com"
+
+def entry(beer_id, tasted_on="2026-01-02", rating=4.0):
+    return {
+        "beer_id": beer_id, "style_id": 8, "abv": 5.5, "look": rating, "smell": rating, "taste": rating,
+        "feel": rating, "overall": rating, "average_rating": rating, "user_notes": "", "tasted_on": tasted_on,
+    }
+
+class FlakyStorage:
+    # Fails the first `failures` writes, then writes through
+    def __init__(self, storage, failures=0, gate=None):
+        self.storage = storage
+        self.failures = failures
+        self.gate = gate
+        self.calls = 0
+
+    def add_journal_rows(self, rows):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait()
+        if self.calls <= self.failures:
+            raise RuntimeError("database is locked")
+        return self.storage.add_journal_rows(rows)
+
+@pytest.fixture
+def storage(db_path, monkeypatch):
+    monkeypatch.setattr(journal, "BACKOFF_SECONDS", 0)
+    return SQLiteStorage(db_path)
+
+def stored(storage):
+    return storage.stored_journal_keys(USER, list(range(200, 400)))
+
+# ------------------------------
+# Write-behind writer
+# ------------------------------
+def test_flush_waits_for_every_submitted_entry(storage):
+    writer = JournalWriter(FlakyStorage(storage), flush_interval=0.05)
+    for beer_id in range(300, 350):
+        writer.submit(USER, entry(beer_id))
+    assert writer.flush(timeout=10)
+    assert len(stored(storage)) == 50
+    # Gathered into a few batches, not a commit per entry
+    assert writer.written == 50 and writer.commits < 10
+
+def test_failed_writes_are_retried(storage):
+    flaky = FlakyStorage(storage, failures=2)
+    writer = JournalWriter(flaky, flush_interval=0)
+    writer.submit(USER, entry(301))
+    assert writer.flush(timeout=10)
+    assert flaky.calls == 3
+    assert stored(storage) == {(301, "2026-01-02")}
+    assert writer.last_error is None
+
+def test_dropped_entries_are_logged_and_stay_in_the_session(storage, monkeypatch, caplog):
+    monkeypatch.setattr(journal, "MAX_RETRIES", 1)
+    writer = JournalWriter(FlakyStorage(storage, failures=10), flush_interval=0)
+    session = SessionJournal()
+    session.add(entry(301))
+    with caplog.at_level(logging.ERROR, logger="journal"):
+        writer.submit(USER, entry(301))
+        assert writer.flush(timeout=10)
+    assert "Dropped 1 journal entries after 2 attempts" in caplog.text
+    assert writer.dropped_keys(USER) == {(301, "2026-01-02")}
+    assert writer.last_error == "database is locked"
+
+    # Still unsynced, so the Journal page can offer to retry it
+    assert [pending.key for pending in session.refresh(USER, storage)] == [(301, "2026-01-02")]
+    storage.add_journal_rows(session.rows(USER))
+    writer.forget_dropped(USER, list(session.dirty))
+    assert writer.dropped_keys(USER) == set()
+    assert session.refresh(USER, storage) == []
+
+def test_flush_times_out(storage):
+    gate = threading.Event()
+    writer = JournalWriter(FlakyStorage(storage, gate=gate), flush_interval=0)
+    writer.submit(USER, entry(301))
+    assert not writer.flush(timeout=0.2)
+    gate.set()
+    assert writer.flush(timeout=10)
+
+# ------------------------------
+# Session journal
+# ------------------------------
+def test_session_journal_keeps_only_unsynced_entries(storage):
+    session = SessionJournal()
+    assert session.add(entry(301)) is not None
+    assert session.add(entry(301)) is None
+    session.add(entry(302))
+    storage.add_journal_rows([journal.journal_row(USER, entry(301))])
+    assert [pending.key for pending in session.refresh(USER, storage)] == [(302, "2026-01-02")]
+    assert (301, "2026-01-02") in session and len(session) == 2
+    session.discard(302, "2026-01-02")
+    assert session.refresh(USER, storage) == []
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import recommender
+from db_utils import connection, transaction
+from recommender import FLAVOR_COLUMNS, nearest_neighbors, normalize_flavors, similar_beers, recommend_for_user
+from storage import SQLiteStorage
+
+USER = "taster@example.com"
+
+# Two malty beers, two hoppy ones and a sour one
+PROFILES = {
+    251: [1, 6, 2, 1, 7, 0, 0, 2, 1, 1, 9],
+    252: [1, 7, 3, 1, 6, 0, 0, 1, 1, 2, 8],
+    253: [0, 2, 1, 0, 2, 9, 3, 8, 0, 6, 1],
+    301: [4, 3, 2, 8, 1, 1, 0, 5, 9, 1, 2],
+    302: [4, 3, 3, 7, 1, 2, 0, 6, 8, 0, 2],
+}
+
+@pytest.fixture
+def index(catalog_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(recommender, "CACHE_DIR", str(tmp_path / "cache"))
+    with transaction() as conn:
+        conn.executemany(
+            f"UPDATE beers_catalog SET {', '.join(f'{name} = ?' for name in FLAVOR_COLUMNS)} WHERE beer_id = ?",
+            [(*profile, beer_id) for beer_id, profile in PROFILES.items()],
+        )
+    with connection() as conn:
+        recommender.build_flavor_index(conn, 1)
+    return recommender.load_flavor_index(1)
+
+def rate(catalog_db, ratings):
+    SQLiteStorage(catalog_db).add_journal_rows([
+        (USER, beer_id, 8, 5.0, rating, rating, rating, rating, rating, float(rating), "", "2026-01-02")
+        for beer_id, rating in ratings
+    ])
+
+# ------------------------------
+# Index
+# ------------------------------
+def test_blocked_neighbors_match_a_full_search():
+    matrix = normalize_flavors(np.random.default_rng(0).random((50, len(FLAVOR_COLUMNS))))
+    indices, scores = nearest_neighbors(matrix, k=4, batch_size=7)
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, -np.inf)
+    expected = np.argsort(-similarity, axis=1)[:, :4]
+    assert (indices == expected).all()
+    assert np.allclose(scores, np.take_along_axis(similarity, expected, axis=1))
+
+def test_beers_without_a_profile_match_nothing():
+    matrix = normalize_flavors(np.array([[1, 2, 3], [0, 0, 0], [3, 2, 1]], dtype=np.float64))
+    assert not matrix[1].any()
+    assert np.allclose(np.linalg.norm(matrix[[0, 2]], axis=1), 1)
+
+def test_similar_beers_share_a_profile(index):
+    assert [beer_id for beer_id, _ in similar_beers(251, k=1, index=index)] == [252]
+    assert [beer_id for beer_id, _ in similar_beers(301, k=1, index=index)] == [302]
+    assert similar_beers(999, index=index) == []
+
+# ------------------------------
+# Recommendations
+# ------------------------------
+def test_recommendations_follow_the_users_ratings(index, catalog_db):
+    assert recommend_for_user(USER, index=index) == []
+    rate(catalog_db, [(251, 5), (301, 1)])
+    recommended = [beer_id for beer_id, _ in recommend_for_user(USER, k=3, index=index)]
+    # Rated beers are left out; the malty one comes first, the hoppy one last
+    assert recommended[0] == 252 and recommended[-1] == 302
+    assert not {251, 301} & set(recommended)
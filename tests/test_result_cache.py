@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+import result_cache
+from result_cache import ResultCache, canonical_filters, filter_key, cached_rows
+
+def table(n, rows=1000):
+    return pa.table({"value": [n] * rows})
+
+# ------------------------------
+# ResultCache
+# ------------------------------
+def test_least_recently_used_entries_are_evicted():
+    size = table(0).nbytes
+    cache = ResultCache(max_bytes=size * 2)
+    cache.get("a", lambda: table(1), 1)
+    cache.get("b", lambda: table(2), 1)
+    cache.get("a", lambda: table(9), 1)          # "a" is now the most recent
+    cache.get("c", lambda: table(3), 1)
+    assert cache.get("a", lambda: table(9), 1)["value"][0].as_py() == 1
+    assert cache.get("b", lambda: table(7), 1)["value"][0].as_py() == 7
+    stats = cache.stats()
+    assert stats["evictions"] == 2 and stats["bytes"] <= size * 2
+
+def test_tables_larger_than_the_cache_are_not_kept():
+    cache = ResultCache(max_bytes=10)
+    assert cache.get("a", lambda: table(1), 1)["value"][0].as_py() == 1
+    assert cache.stats()["entries"] == 0
+
+def test_concurrent_misses_compute_once():
+    cache = ResultCache()
+    calls, started = [], threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return table(1)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("a", compute, 1))) for _ in range(8)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.stats()["waits"] == 7
+
+def test_a_failed_computation_is_taken_over():
+    cache = ResultCache()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    try:
+        cache.get("a", fail, 1)
+    except RuntimeError:
+        pass
+    assert cache.get("a", lambda: table(2), 1)["value"][0].as_py() == 2
+
+def test_a_new_catalog_version_flushes_everything():
+    cache = ResultCache()
+    cache.get("a", lambda: table(1), 1)
+    assert cache.get("a", lambda: table(2), 2)["value"][0].as_py() == 2
+    # A session still on the old version is answered but not cached
+    assert cache.get("a", lambda: table(3), 1)["value"][0].as_py() == 3
+    assert cache.get("a", lambda: table(4), 2)["value"][0].as_py() == 2
+
+def test_cached_rows_hands_out_dicts(monkeypatch):
+    monkeypatch.setattr(result_cache, "_cache", ResultCache())
+    frame = pd.DataFrame({"beer_id": [252, 253], "beer_name": ["Double Bag", "Long Trail Ale"]})
+    rows = cached_rows(("page",), lambda: frame, version=1)
+    assert rows == [{"beer_id": 252, "beer_name": "Double Bag"}, {"beer_id": 253, "beer_name": "Long Trail Ale"}]
+    rows[0]["beer_name"] = "changed"
+    assert cached_rows(("page",), lambda: None, version=1)[0]["beer_name"] == "Double Bag"
+
+# ------------------------------
+# Filters
+# ------------------------------
+def test_canonical_filters_keep_the_exact_abv_range():
+    filters = canonical_filters(["Pale Ale", "Altbier", "Altbier"], (4.00049, 6.5), "  Double   BAG! ")
+    assert filters == (("Altbier", "Pale Ale"), (4.00049, 6.5), "double bag")
+    assert filter_key(filters) == (("Altbier", "Pale Ale"), (4.0, 6.5), "double bag")
+    assert filter_key(canonical_filters(["Altbier", "Pale Ale"], (4.0001, 6.5), "double bag")) == filter_key(filters)
+    assert filter_key(canonical_filters()) == ((), None, "")
+
+def test_queries_see_the_range_as_picked(catalog_db):
+    from catalog import count_beers
+
+    # Amber (5.3%) is in the range rounded to 3 places but not in the one picked
+    filters = canonical_filters(abv_range=(5.3004, 6.0))
+    assert filter_key(filters)[1] == (5.3, 6.0)
+    assert count_beers(*filters) == 1
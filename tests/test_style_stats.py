@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from style_stats import HISTOGRAM_BINS, load_style_stats, combine_style_stats, coarsen_histogram
+
+def histogram(**bins):
+    counts = [0] * HISTOGRAM_BINS
+    for index, count in bins.items():
+        counts[int(index[1:])] = count
+    return counts
+
+# ------------------------------
+# Combining and coarsening
+# ------------------------------
+def test_combined_stats_sum_each_style():
+    stats = pd.DataFrame([
+        {"style": "Altbier", "beer_count": 2, "abv_sum": 10.0, "abv_min": 4.0, "abv_max": 6.0,
+         "ibu_sum": 60.0, "ibu_min": 20.0, "ibu_max": 40.0, "abv_histogram": histogram(b3=1, b5=1)},
+        {"style": "Pale Ale", "beer_count": 3, "abv_sum": 18.0, "abv_min": 5.0, "abv_max": 7.0,
+         "ibu_sum": 150.0, "ibu_min": 30.0, "ibu_max": 70.0, "abv_histogram": histogram(b5=2, b9=1)},
+    ])
+    summary = combine_style_stats(stats)
+    assert summary["beer_count"] == 5
+    assert summary["abv_mean"] == 28.0 / 5 and summary["ibu_mean"] == 42.0
+    assert (summary["abv_min"], summary["abv_max"], summary["ibu_min"], summary["ibu_max"]) == (4.0, 7.0, 20.0, 70.0)
+    assert summary["abv_histogram"].tolist() == histogram(b3=1, b5=3, b9=1)
+
+def test_combining_nothing():
+    summary = combine_style_stats(pd.DataFrame(columns=["beer_count", "abv_sum", "ibu_sum", "abv_histogram",
+                                                        "abv_min", "abv_max", "ibu_min", "ibu_max"]))
+    assert summary["beer_count"] == 0 and summary["abv_mean"] == 0.0
+    assert not summary["abv_histogram"].any()
+
+def test_coarsening_trims_empty_tails_and_merges_bins():
+    edges = np.linspace(0.0, 20.0, HISTOGRAM_BINS + 1)   # 0.1% wide
+    counts, coarse_edges = coarsen_histogram(np.array(histogram(b40=1, b41=2, b79=3)), edges, bins=20)
+    # Bins 40 to 79 are kept, two to a group
+    assert counts[0] == 3 and counts[-1] == 3 and counts.sum() == 6
+    assert len(counts) == 20 and len(coarse_edges) == 21
+    assert np.allclose(coarse_edges[[0, -1]], [4.0, 8.0])
+
+def test_coarsening_pads_a_ragged_last_group():
+    edges = np.arange(HISTOGRAM_BINS + 1, dtype=float)
+    counts, coarse_edges = coarsen_histogram(np.array(histogram(b0=1, b4=1)), edges, bins=2)
+    # Bins 0 to 4 are kept, three to a group; the last is padded with an empty bin
+    assert counts.tolist() == [1, 1]
+    assert coarse_edges.tolist() == [0.0, 3.0, 6.0]
+
+def test_coarsening_an_empty_histogram():
+    counts, coarse_edges = coarsen_histogram(np.zeros(HISTOGRAM_BINS), np.arange(HISTOGRAM_BINS + 1.0))
+    assert len(counts) == 0 and len(coarse_edges) == 0
+
+# ------------------------------
+# Loading
+# ------------------------------
+def test_a_narrowed_range_agrees_with_the_stored_stats(catalog_db):
+    stored, edges = load_style_stats(["Altbier"])
+    full, _ = load_style_stats(["Altbier"], (0.0, 100.0))
+    narrowed, narrowed_edges = load_style_stats(["Altbier"], (5.0, 6.0))
+    assert stored[["style", "beer_count"]].values.tolist() == [["Altbier", 3]]
+    assert full["beer_count"].tolist() == [3]
+    # Amber (5.3%) and Long Trail Ale (5.0%); Double Bag (7.2%) is cut
+    assert narrowed["beer_count"].tolist() == [2] and narrowed["abv_max"].tolist() == [5.3]
+    assert np.array_equal(narrowed_edges, edges)
+    assert sum(narrowed["abv_histogram"][0]) == 2
+    assert sorted(stored["sample_breweries"][0]) == ["Alaskan Brewing Co.", "Long Trail Brewing Co."]
@@ -1,14 +1,18 @@
 import streamlit as st
 
-# Theme toggle (visible in sidebar)
-if "theme_mode" not in st.session_state:
-    st.session_state["theme_mode"] = "light"
+def theme_toggle():
+    # Theme toggle (visible in sidebar). Rendered on every call: module code
+    # only runs on the first import in a process, so a toggle there would
+    # vanish from later reruns.
+    if "theme_mode" not in st.session_state:
+        st.session_state["theme_mode"] = "light"
 
-selected_theme = st.sidebar.radio("🌗 Theme", ["light", "dark"], index=0 if st.session_state["theme_mode"] == "light" else 1)
-st.session_state["theme_mode"] = selected_theme
+    selected_theme = st.sidebar.radio("🌗 Theme", ["light", "dark"], index=0 if st.session_state["theme_mode"] == "light" else 1)
+    st.session_state["theme_mode"] = selected_theme
+    return selected_theme
 
 def get_app_theme():
-    theme_mode = st.session_state.get("theme_mode", "light")
+    theme_mode = theme_toggle()
 
     if theme_mode == "dark":
         bg_color = "#0e1117"